@@ -3,17 +3,42 @@ Main Flask Application
 Read-only backend API for AI chat functionality
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import os
-from dotenv import load_dotenv
+import hashlib
+import json
+import time
+from contextlib import ExitStack
+from datetime import datetime
+
+# Load environment variables (once, before any service reads its configuration)
+import config.env  # noqa: F401
 
 from services.firebase_service import FirebaseService
-from services.llm_service import LLMService
+from services.llm_service import LLMService, failure_stats
 from services.prompt_builder import PromptBuilder
-
-# Load environment variables
-load_dotenv()
+from services.profile_cache import profile_cache
+from services.session_cache import session_cache
+from services.response_cache import response_cache
+from services.persistence_executor import PersistenceExecutor
+from services.token_counter import count_tokens, record_injection, record_skipped_injection, injection_stats
+from services.conversation_summary import (
+    SUMMARY_WINDOW_MESSAGES, messages_to_fetch, summary_due,
+    start_refresh, finish_refresh, record_refresh, record_refresh_failure, summary_stats
+)
+from services.http_clients import get_stripe_client, http_pool_stats
+from services.request_coalescer import ChatCoalescer
+from services.chat_turn import (
+    ChatContext, build_injection, context_is_current, llm_request, needs_new_thread, new_thread_request,
+    thread_after_turn, chat_response_data
+)
+from services.metrics import registry as metrics_registry, request_latency, span
+from services.logger import configure_logging, get_logger, logging_stats, new_request_id, request_id_var, SAMPLED
+
+# Structured logging: queued, written by a background thread (see services/logger.py)
+configure_logging()
+logger = get_logger('app')
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -22,17 +47,78 @@ CORS(app)
 # Initialize services
 firebase_service = FirebaseService()
 llm_service = LLMService()
-prompt_builder = PromptBuilder()
+persistence_executor = PersistenceExecutor()
+chat_coalescer = ChatCoalescer()
+
+# Existing service counters, exported as gauges at GET /metrics
+metrics_registry.register_collector('persistence', persistence_executor.stats)
+metrics_registry.register_collector('session_cache', session_cache.stats)
+metrics_registry.register_collector('profile_cache', profile_cache.stats)
+metrics_registry.register_collector('response_cache', response_cache.stats)
+metrics_registry.register_collector('prompt_render', PromptBuilder.render_stats)
+metrics_registry.register_collector('context_injection', injection_stats)
+metrics_registry.register_collector('http_pool', http_pool_stats)
+metrics_registry.register_collector('llm_failures', failure_stats)
+metrics_registry.register_collector('chat_coalescer', chat_coalescer.stats)
+metrics_registry.register_collector('logging', logging_stats)
+metrics_registry.register_collector('conversation_summary', summary_stats)
 
 # Get API key from environment
 API_KEY ="321"
 
+# Page size for GET /api/messages/<session_id> (?limit= is capped at MESSAGES_MAX_PAGE_SIZE)
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "50"))
+MESSAGES_MAX_PAGE_SIZE = int(os.getenv("MESSAGES_MAX_PAGE_SIZE", "200"))
+
 def validate_api_key():
     """Validate API key from request headers"""
-    api_key = request.headers.get('X-API-Key')
-    if not api_key or api_key != API_KEY:
-        return False
-    return True
+    with span('api_key_check'):
+        api_key = request.headers.get('X-API-Key')
+        if not api_key or api_key != API_KEY:
+            return False
+        return True
+
+@app.before_request
+def _start_request():
+    g.request_started = time.perf_counter()
+    # Tags every log line of this request (and its background writes)
+    new_request_id(request.headers.get('X-Request-ID'))
+
+@app.after_request
+def _observe_request(response):
+    """Request latency per route (for streams: until the response starts)"""
+    started = g.get('request_started')
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_latency.observe(time.perf_counter() - started, endpoint=endpoint,
+                                method=request.method, status=response.status_code)
+    response.headers['X-Request-ID'] = request_id_var.get() or ''
+    return response
+
+def _conditional_json(cache_key, version, build):
+    """
+    200 JSON response for build() with an ETag derived from (cache_key, version),
+    or 304 when the client's If-None-Match already has it. The serialized body
+    is cached per version, so unchanged polls skip JSON encoding too.
+    version None (unknown) serves build() without an ETag.
+    """
+    if version is None:
+        return jsonify(build()), 200
+    
+    etag = hashlib.sha1(repr((cache_key, version)).encode('utf-8')).hexdigest()[:24]
+    if request.if_none_match.contains_weak(etag):
+        response_cache.record_not_modified()
+        response = Response(status=304)
+    else:
+        body = response_cache.get(cache_key, etag)
+        if body is None:
+            body = app.json.dumps(build()).encode('utf-8')
+            response_cache.set(cache_key, etag, body)
+        response = Response(body, mimetype=app.json.mimetype)
+    response.set_etag(etag)
+    # Clients may keep the response but must revalidate on every poll
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -45,13 +131,15 @@ def health_check():
 
 @app.route('/api/user/<user_id>', methods=['GET'])
 def get_user(user_id):
-    """Get user data"""
+    """Get user data (supports If-None-Match)"""
     try:
-        user_data = firebase_service.get_user(user_id)
+        # Always read Firestore: this worker's cached profile may predate a change
+        # made through another worker. The ETag is the update_time of that same read.
+        user_data, version = firebase_service.read_profile('user', user_id)
         if not user_data:
             return jsonify({'success': False, 'error': 'User not found'}), 404
         
-        return jsonify({
+        return _conditional_json(('user', user_id), version, lambda: {
             'success': True,
             'data': {
                 'name': user_data.get('name'),
@@ -59,19 +147,19 @@ def get_user(user_id):
                 'email': user_data.get('email'),
                 'created_at': str(user_data.get('created_at', ''))
             }
-        }), 200
+        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/preferences/<user_id>', methods=['GET'])
 def get_preferences(user_id):
-    """Get user preferences"""
+    """Get user preferences (supports If-None-Match)"""
     try:
-        preferences = firebase_service.get_user_preferences(user_id)
+        preferences, version = firebase_service.read_profile('preferences', user_id)
         if not preferences:
             return jsonify({'success': False, 'error': 'Preferences not found'}), 404
         
-        return jsonify({
+        return _conditional_json(('preferences', user_id), version, lambda: {
             'success': True,
             'data': {
                 'support_type': preferences.get('supportType') or preferences.get('support_type'),
@@ -88,35 +176,97 @@ def get_preferences(user_id):
                 'sexual_orientation': preferences.get('sexualOrientation') or preferences.get('sexual_orientation'),
                 'time_dedication': preferences.get('timeDedication') or preferences.get('time_dedication')
             }
-        }), 200
+        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _parse_message_cursor(value):
+    """Timestamp cursor from a query parameter (ISO 8601, as returned in 'cursors')"""
+    if not value:
+        return None
+    value = value.strip().replace('Z', '+00:00')
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        # An unencoded '+' in the UTC offset arrives as a space
+        head, _, offset = value.rpartition(' ')
+        return datetime.fromisoformat(f"{head}+{offset}")
+
 @app.route('/api/messages/<session_id>', methods=['GET'])
 def get_messages(session_id):
-    """Get message history for a session"""
+    """
+    Get message history for a session, oldest first (supports If-None-Match).
+    ?limit=N page size; ?before=<timestamp> older page; ?after=<timestamp>
+    (or ?since=) only messages newer than the cursor. Without a cursor the
+    latest page is returned.
+    """
     try:
-        messages = firebase_service.get_session_messages(session_id, limit=50)
+        before_arg = request.args.get('before')
+        after_arg = request.args.get('after') or request.args.get('since')
+        try:
+            limit = min(max(int(request.args.get('limit', MESSAGES_PAGE_SIZE)), 1), MESSAGES_MAX_PAGE_SIZE)
+            before = _parse_message_cursor(before_arg)
+            after = _parse_message_cursor(after_arg)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'limit must be an integer, before/after ISO 8601 timestamps'}), 400
+        if before is not None and after is not None:
+            return jsonify({'success': False, 'error': 'Use either before or after, not both'}), 400
         
-        formatted_messages = []
-        for msg in messages:
-            formatted_messages.append({
-                'message': msg.get('message'),
-                'type': msg.get('type'),
-                'timestamp': str(msg.get('timestamp', ''))
-            })
+        def build():
+            # One extra message tells whether there is another page
+            messages = firebase_service.get_session_messages(session_id, limit=limit + 1, before=before, after=after)
+            has_more = len(messages) > limit
+            if has_more:
+                # The extra one is the newest when paging forwards, the oldest otherwise
+                messages = messages[:limit] if after is not None else messages[1:]
         
-        return jsonify({
-            'success': True,
-            'data': {
-                'messages': formatted_messages,
-                'count': len(formatted_messages)
+            formatted_messages = []
+            for msg in messages:
+                formatted_messages.append({
+                    'message': msg.get('message'),
+                    'type': msg.get('type'),
+                    'timestamp': str(msg.get('timestamp', ''))
+                })
+        
+            return {
+                'success': True,
+                'data': {
+                    'messages': formatted_messages,
+                    'count': len(formatted_messages),
+                    'has_more': has_more,
+                    'cursors': {
+                        # Pass 'before' back to page further into history, 'after' to poll for new messages
+                        'before': formatted_messages[0]['timestamp'] if formatted_messages else before_arg,
+                        'after': formatted_messages[-1]['timestamp'] if formatted_messages else after_arg
+                    }
+                }
             }
-        }), 200
+        
+        # Pages only change when a message is added (which moves the newest timestamp):
+        # one single-document read decides between 304, the cached body and the page query
+        version = firebase_service.get_session_version(session_id)
+        return _conditional_json(('messages', session_id, limit, before_arg, after_arg), version, build)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-import stripe
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint: stage latency histograms and service counters for this worker"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/stats/http-pools', methods=['GET'])
+def get_http_pool_stats():
+    """Outbound HTTP connection pool utilization for this worker"""
+    if not validate_api_key():
+        return jsonify({'success': False, 'error': 'Invalid API key'}), 401
+    return jsonify({'success': True, 'data': http_pool_stats()}), 200
+
+@app.route('/api/stats/llm-failures', methods=['GET'])
+def get_llm_failure_stats():
+    """LLM failure counters per class, retries, cancelled runs and new-thread fallbacks"""
+    if not validate_api_key():
+        return jsonify({'success': False, 'error': 'Invalid API key'}), 401
+    return jsonify({'success': True, 'data': failure_stats()}), 200
 
 @app.route('/api/create-payment-intent', methods=['POST'])
 def create_payment_intent():
@@ -136,12 +286,10 @@ def create_payment_intent():
         if not validate_api_key():
             return jsonify({'success': False, 'error': 'Invalid API key'}), 401
 
-        # Configure Stripe
-        stripe_api_key = os.getenv('STRIPE_SECRET_KEY')
-        if not stripe_api_key:
+        # Shared Stripe client (pooled connections, configured once per worker)
+        stripe_client = get_stripe_client()
+        if not stripe_client:
             return jsonify({'success': False, 'error': 'Stripe backend not configured'}), 500
-            
-        stripe.api_key = stripe_api_key
 
         data = request.json
         amount = data.get('amount')
@@ -152,15 +300,15 @@ def create_payment_intent():
             return jsonify({'success': False, 'error': 'Amount is required'}), 400
 
         # Create a PaymentIntent with the order amount and currency
-        intent = stripe.PaymentIntent.create(
-            amount=amount,
-            currency=currency,
-            automatic_payment_methods={'enabled': True},
-            metadata={
+        intent = stripe_client.payment_intents.create(params={
+            'amount': amount,
+            'currency': currency,
+            'automatic_payment_methods': {'enabled': True},
+            'metadata': {
                 'user_id': user_id,
                 'integration_check': 'accept_a_payment',
             }
-        )
+        })
 
         return jsonify({
             'success': True,
@@ -169,7 +317,7 @@ def create_payment_intent():
         }), 200
 
     except Exception as e:
-        print(f"Stripe Error: {str(e)}")
+        logger.error("Stripe Error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/update-context', methods=['POST'])
@@ -188,31 +336,209 @@ def update_context():
         if not user_id:
             return jsonify({'success': False, 'error': 'user_id required'}), 400
             
-        # 1. Get Thread ID
-        thread_id = firebase_service.get_thread_id(user_id)
+        # Preferences changed: never serve the old profile from cache
+        firebase_service.invalidate_user_cache(user_id)
+            
+        # 1. Get Thread ID, User & New Preferences (one batched read)
+        chat_data = firebase_service.get_chat_context(user_id, include_preferences=True) or {}
+        thread_data = chat_data.get('thread') or {}
+        thread_id = thread_data.get('thread_id')
         if not thread_id:
             return jsonify({'success': True, 'message': 'No active thread. Context will be injected on next chat.'}), 200
             
-        # 2. Fetch User & New Preferences
-        user_data = firebase_service.get_user(user_id)
-        preferences = firebase_service.get_user_preferences(user_id)
+        # 2. User & Preferences (query preferences only if not already fetched)
+        user_data = chat_data.get('user')
+        if 'preferences' in chat_data:
+            preferences = chat_data['preferences']
+        else:
+            preferences = firebase_service.get_user_preferences(user_id)
         
-        # 3. Build Prompt
-        system_prompt = prompt_builder.build_system_prompt(user_data, preferences)
+        # 3. Build Prompt (skip the injection if the thread already has this exact context)
+        system_prompt, context_record = build_injection(user_data, preferences, None, thread_data.get('msg_count', 0))
+        if context_is_current(thread_data, context_record['hash'], llm_service.stateless):
+            record_skipped_injection()
+            return jsonify({'success': True, 'message': 'Context unchanged in active thread'}), 200
         
         # 4. Inject into Thread directly
-        print(f"💉 Manual Context Injection for thread {thread_id}")
+        logger.info("Manual Context Injection for thread %s", thread_id)
         llm_service.add_message(
             thread_id=thread_id,
             role="user", # We usually inject context as a user message or system message if supported
             content=f"SYSTEM_UPDATE: The user has updated their preferences. Please align with: \n\n{system_prompt}"
         )
+        record_injection(context_record['tokens'])
+        firebase_service.record_context_injection(user_id, context_record)
         
         return jsonify({'success': True, 'message': 'Context updated in active thread'}), 200
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _load_chat_context(user_id, recent_thread=None):
+    """
+    Fetch everything a chat turn needs before calling the LLM (see
+    services/chat_turn.ChatContext). Returns None if the user does not exist.
+    """
+    # Version of the cached profile docs, read BEFORE the docs themselves
+    prompt_version = firebase_service.profile_version(user_id)
+    
+    # Get user data, Thread ID / Message Count and (if its doc ID is known)
+    # preferences in ONE batched Firestore round-trip
+    with span('get_chat_context'):
+        chat_data = firebase_service.get_chat_context(user_id, include_preferences=True)
+    turn = ChatContext(chat_data, recent_thread, prompt_version, llm_service.stateless)
+    if not turn.user_data:
+        return None
+    
+    # 1. Try Cache, 2. Fetch from DB
+    with span('cache_lookup'):
+        history = session_cache.get_history(user_id)
+    if turn.needs_history(history):
+        with span('history_fetch'):
+            history = firebase_service.get_user_messages(user_id, limit=10)
+        session_cache.update_history(user_id, history)
+    
+    preferences = None
+    if turn.needs_preferences:
+        with span('preference_fetch'):
+            preferences = firebase_service.get_user_preferences(user_id)
+    return turn.build(history, preferences)
+
+def _finish_chat_turn(user_id, chat_session_id, user_messages, ai_response, thread_id, active_thread_id, context_record=None):
+    """
+    Post-response bookkeeping shared by chat() and chat_stream():
+    persist the turn to Firestore in the background and update the session cache.
+    user_messages are stored one by one (several when the turn answered merged messages).
+    context_record describes the context injected this turn (None if nothing was injected).
+    """
+    # 3. BACKGROUND TASK: Save to Firestore (Fire and Forget)
+    def save_to_firestore_background(uid, session_id, user_text, ai_text, thread_id_val, active_thread, context_val):
+        try:
+            # One batched write: all messages of the turn + thread metadata
+            # A changed Thread ID (New Thread Created) resets msg_count to 0,
+            # otherwise the count is incremented once per interaction
+            new_thread_id = active_thread if active_thread != thread_id_val else None
+            if new_thread_id:
+                logger.info("[Background] Saving new Thread ID: %s", active_thread)
+            with span('firestore_commit_turn'):
+                committed = firebase_service.commit_turn(uid, session_id, user_text, ai_text, new_thread_id, context=context_val)
+            if not committed:
+                raise Exception("Chat turn batch commit failed")
+            logger.debug("[Background] Chat turn saved")
+            
+            # Update Session Metadata
+            with span('firestore_session_metadata'):
+                firebase_service.update_session_metadata(session_id)
+        except Exception as bg_e:
+            logger.error("[Background] Error saving to Firestore: %s", bg_e)
+            raise
+
+    # Queue on the bounded persistence pool (no thread per request)
+    persistence_executor.submit(
+        save_to_firestore_background,
+        user_id, chat_session_id, list(user_messages), ai_response, thread_id, active_thread_id, context_record
+    )
+    logger.debug("Background save task queued")
+    
+    # Update Cache with User Message(s)
+    for user_message in user_messages:
+        user_msg_obj = {
+            'type': 'user',
+            'message': user_message,
+            'timestamp': datetime.now()
+        }
+        session_cache.append_message(user_id, user_msg_obj)
+
+    # Update Cache with AI Message
+    ai_msg_obj = {
+        'type': 'ai', 
+        'message': ai_response,
+        'timestamp': datetime.now()
+    }
+    session_cache.append_message(user_id, ai_msg_obj)
+
+def _refresh_conversation_summary(user_id, previous_summary, summarized_through, msg_count, through_at=None):
+    """
+    Background task: fold the messages that left the run window into the
+    summary. Only messages after through_at (the last one already folded in)
+    are read.
+    """
+    try:
+        with span('summary_refresh'):
+            messages = firebase_service.get_user_messages(
+                user_id, limit=messages_to_fetch(summarized_through, msg_count, through_at), after=through_at
+            )
+            # The newest messages are still inside the window of the next run
+            older = messages[:-SUMMARY_WINDOW_MESSAGES]
+            if not older:
+                return
+            summary = llm_service.summarize_conversation(previous_summary, older)
+            if not summary or not firebase_service.save_conversation_summary(user_id, summary, msg_count, older[-1]['timestamp']):
+                raise Exception("Conversation summary was not saved")
+        record_refresh(len(older), count_tokens(summary))
+        logger.info("[Background] Conversation summary refreshed (%d messages folded in)", len(older), extra=SAMPLED)
+    except Exception as e:
+        record_refresh_failure()
+        logger.error("[Background] Error refreshing conversation summary: %s", e)
+        raise
+    finally:
+        finish_refresh(user_id)
+
+def _schedule_summary_refresh(user_id, thread_data):
+    """
+    Queue a summary refresh when one is due after this turn (see
+    services/conversation_summary.py). thread_data is the lane's post-turn
+    state; it is marked as summarized so queued turns do not queue it again.
+    Turns that read the thread from Firestore before the refresh has saved
+    find it in flight and skip.
+    """
+    if not summary_due(thread_data) or not start_refresh(user_id):
+        return
+    summarized_through = thread_data.get('summary_msg_count') or 0
+    thread_data['summary_msg_count'] = thread_data['msg_count']
+    queued = persistence_executor.submit(
+        _refresh_conversation_summary,
+        user_id, thread_data.get('summary'), summarized_through, thread_data['msg_count'],
+        thread_data.get('summary_through_at')
+    )
+    if not queued:
+        finish_refresh(user_id)
+
+def _persist_turn(user_id, chat_session_id, user_messages, ai_response, context, active_thread_id, lane_state):
+    """Queue persistence of a finished turn and hand its thread state to the next turn in the lane"""
+    _finish_chat_turn(user_id, chat_session_id, user_messages, ai_response, context['thread_id'], active_thread_id, context['context_record'])
+    lane_state['thread'] = thread_after_turn(context, active_thread_id)
+    _schedule_summary_refresh(user_id, lane_state['thread'])
+
+def _run_chat_turn(user_id, chat_session_id, user_messages, lane_state):
+    """
+    Load context, get the AI response and queue persistence for one turn.
+    Runs inside chat_coalescer, so turns of one user never overlap;
+    user_messages are the messages it answers (see ChatCoalescer.submit).
+    Returns (context, ai_response, active_thread_id), or None if the user does not exist.
+    """
+    context = _load_chat_context(user_id, recent_thread=lane_state.get('thread'))
+    
+    if not context:
+        return None
+
+    #  Get AI response (using Threads)
+    try:
+        with span('llm_response'):
+            ai_response, active_thread_id = llm_service.get_ai_response(**llm_request(context, user_messages))
+    except Exception as e:
+        # Transient failures were already retried on the same thread;
+        # only a thread that no longer exists justifies starting over
+        if not needs_new_thread(e, context['thread_id']):
+            raise
+        with span('llm_response_new_thread'):
+            ai_response, active_thread_id = llm_service.get_ai_response(**new_thread_request(context, user_messages))
+
+    logger.info("AI response received (%d chars)", len(ai_response), extra=SAMPLED)
+    
+    _persist_turn(user_id, chat_session_id, user_messages, ai_response, context, active_thread_id, lane_state)
+    return context, ai_response, active_thread_id
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """
@@ -233,6 +559,11 @@ def chat():
                 "message": "AI response text"
             }
         }
+    
+    Messages a user sends while one of their turns is still running
+    (CHAT_COALESCE_MODE=merge, the default) are answered together: the next
+    turn sends them to the LLM as one message, every one of those requests
+    gets the same reply, and each message is still stored separately.
     """
     try:
         # Validate API key
@@ -242,8 +573,7 @@ def chat():
                 'error': 'Invalid or missing API key'
             }), 401
         
-        print("\n" + "="*60)
-        print("New chat request received")
+        logger.info("New chat request received", extra=SAMPLED)
         
         # Get request data
         data = request.json
@@ -257,184 +587,134 @@ def chat():
         
         # Validate input
         if not user_id or not user_message:
-            print(" Missing required fields")
+            logger.info("Missing required fields")
             return jsonify({
                 'success': False,
                 'error': 'user_id and message are required'
             }), 400
         
-        # Get user data
-        # print(" Fetching user data from Firebase...")
-        user_data = firebase_service.get_user(user_id)
+        # One turn at a time per user; messages sent while a turn is in
+        # flight are merged into the next one (see services/request_coalescer.py)
+        turn = chat_coalescer.submit(
+            user_id, user_message,
+            lambda messages, lane_state: _run_chat_turn(user_id, chat_session_id, messages, lane_state),
+            merge_key=chat_session_id
+        )
         
-        if not user_data:
-            print(f" User not found: {user_id}")
+        if not turn:
+            logger.info("User not found: %s", user_id)
             return jsonify({
                 'success': False,
                 'error': 'User not found'
             }), 404
-        
-        # NOTE: We NO LONGER fetch preferences here on every request.
-        # They are only fetched if 'should_inject_context' becomes True below.
-        
-        #  Get conversation history
-        # Try cache first
-        from services.session_cache import session_cache
-
-        # Check for existing Thread ID and Message Count
-        # print(" Fetching OpenAI Thread Data...")
-        thread_data = firebase_service.get_thread_data(user_id)
-        
-        # print(" Fetching conversation history...")
-        # 1. Try Cache
-        cached_history = session_cache.get_history(user_id)
-        thread_id = None
-        msg_count = 0
-        
-        if cached_history is not None:
-             # print(f"✅ Cache HIT for user {user_id}. Using cached history.")
-             messages = cached_history
-
-        if thread_data:
-            thread_id = thread_data.get('thread_id')
-            msg_count = thread_data.get('msg_count', 0)
-        
-        # LOGIC: When to inject System Context?
-        # 1. Start of Thread (thread_id is None)
-        # 2. Limit Hit (msg_count > 0 and multiple of 50)
-        
-        should_inject_context = False
-        if not thread_id:
-             print(" No active thread found. Context injection REQUIRED.")
-             should_inject_context = True
-        elif msg_count > 0 and msg_count % 50 == 0:
-             print(f" Message limit hit ({msg_count}). Context refresh REQUIRED.")
-             should_inject_context = True
-        else:
-             # print(f"⚠️ Cache MISS for user {user_id}. Fetching from Firebase...")
-             # 2. Fetch from DB
-             if cached_history is None:
-                messages = firebase_service.get_user_messages(user_id, limit=10)
-                session_cache.update_history(user_id, messages)
-        
-        system_prompt = None
-        preferences = {} # Default empty
-        
-        if should_inject_context:
-            print(" Fetching user preferences (Context Refresh)...")
-            preferences = firebase_service.get_user_preferences(user_id)
-            if not preferences:
-                 preferences = {
-                    'support_type': 'Supportive Friend',
-                    'relationship_status': 'Unknown',
-                    'topics_to_avoid': ''
-                 }
-            print(f"✅ Preferences retrieved: {preferences.get('supportType')}")
-            
-            print(" Building System Prompt (Context)...")
-            system_prompt = prompt_builder.build_system_prompt(user_data, preferences)
-
-        #  Get AI response (using Threads)
-        # print(" Calling OpenAI Assistant (Threads)...")
-        
-        try:
-            ai_response, active_thread_id = llm_service.get_ai_response(
-                user_message=user_message,
-                thread_id=thread_id,
-                system_prompt=system_prompt 
-            )
-        except Exception as e:
-            # Fallback for invalid thread
-            print(f"⚠️ Run failed. Retrying with NEW thread...")
-            # If run failed, force new thread creation which implicitly injects context
-            system_prompt = prompt_builder.build_system_prompt(user_data, preferences)
-            ai_response, active_thread_id = llm_service.get_ai_response(
-                user_message=user_message,
-                thread_id=None,
-                system_prompt=system_prompt
-            )
-
-        print(f"AI response received ({len(ai_response)} chars)")
-        
-        # 3. BACKGROUND TASK: Save to Firestore (Fire and Forget)
-        def save_to_firestore_background(uid, session_id, user_text, ai_text, thread_id_val, active_thread):
-            try:
-                # Save Thread ID if changed (New Thread Created)
-                # save_thread_id will initialize msg_count to 0
-                if active_thread != thread_id_val:
-                    print(f" [Background] Saving new Thread ID: {active_thread}")
-                    firebase_service.save_thread_id(uid, active_thread)
-                else:
-                    # If same thread, increment the count
-                    # We increment once per interaction (User + AI turn)
-                    firebase_service.increment_thread_count(uid)
-                
-                # Save User Message
-                firebase_service.save_message(uid, session_id, user_text, 'user')
-                print(" [Background] User message saved")
-                
-                # Save AI Message
-                firebase_service.save_message(uid, session_id, ai_text, 'ai')
-                print(" [Background] AI message saved")
-                
-                # Update Session Metadata
-                firebase_service.update_session_metadata(session_id)
-            except Exception as bg_e:
-                print(f" [Background] Error saving to Firestore: {bg_e}")
-
-        # Start the background thread
-        import threading
-        save_thread = threading.Thread(
-            target=save_to_firestore_background,
-            args=(user_id, chat_session_id, user_message, ai_response, thread_id, active_thread_id)
-        )
-        save_thread.start()
-        print(" Background save task started")
-        
-        # Update Cache with User Message
-        from datetime import datetime
-        user_msg_obj = {
-            'type': 'user',
-            'message': user_message,
-            'timestamp': datetime.now()
-        }
-        session_cache.append_message(user_id, user_msg_obj)
-
-        # Update Cache with AI Message
-        ai_msg_obj = {
-            'type': 'ai', 
-            'message': ai_response,
-            'timestamp': datetime.now()
-        }
-        session_cache.append_message(user_id, ai_msg_obj)
-        
-        print("="*60 + "\n")
+        context, ai_response, active_thread_id = turn
         
         # 4. Return simplified response INSTANTLY
         return jsonify({
             'success': True,
-            'data': {
-                'user_id': user_id,
-                'user_name': user_data.get('name'),
-                'message': ai_response,
-                'preferences': preferences,
-                'thread_id': active_thread_id 
-            }
+            'data': chat_response_data(user_id, context, ai_response, active_thread_id)
         }), 200
         
     except Exception as e:
-        print("\n" + "="*60)
-        print(f" ERROR: {type(e).__name__}")
-        print(f" Message: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        print("="*60 + "\n")
+        logger.exception("Chat request failed: %s: %s", type(e).__name__, e)
         
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+def _sse_event(event, payload):
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming chat endpoint (Server-Sent Events)
+    
+    Request Body: same as /api/chat
+    
+    Events:
+        event: delta   data: {"text": "partial AI response text"}
+        event: done    data: same JSON body as /api/chat
+        event: error   data: {"success": false, "error": "..."}
+    """
+    # Holds this user's coalescer lane until the stream has been fully sent
+    lane = ExitStack()
+    try:
+        if not validate_api_key():
+            return jsonify({
+                'success': False,
+                'error': 'Invalid or missing API key'
+            }), 401
+        
+        data = request.json
+        user_id = data.get('user_id')
+        chat_session_id = data.get('chat_session_id')  # Optional
+        user_message = data.get('message')
+        
+        if not user_id or not user_message:
+            return jsonify({
+                'success': False,
+                'error': 'user_id and message are required'
+            }), 400
+        
+        # Streamed turns cannot be merged: wait for this user's previous turn
+        lane_state = lane.enter_context(chat_coalescer.exclusive(user_id))
+        context = _load_chat_context(user_id, recent_thread=lane_state.get('thread'))
+        
+        if not context:
+            lane.close()
+            return jsonify({
+                'success': False,
+                'error': 'User not found'
+            }), 404
+    except Exception as e:
+        lane.close()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    def generate():
+        ai_response = None
+        active_thread_id = None
+        sent_delta = False
+        try:
+            try:
+                for kind, value in llm_service.stream_ai_response(**llm_request(context, [user_message])):
+                    if kind == 'delta':
+                        sent_delta = True
+                        yield _sse_event('delta', {'text': value})
+                    else:
+                        ai_response, active_thread_id = value
+            except Exception as e:
+                # Text already reached the client: a retry would duplicate it
+                if sent_delta or not needs_new_thread(e, context['thread_id']):
+                    raise
+                # Same fallback as chat(): force a new thread with fresh context
+                for kind, value in llm_service.stream_ai_response(**new_thread_request(context, [user_message])):
+                    if kind == 'delta':
+                        yield _sse_event('delta', {'text': value})
+                    else:
+                        ai_response, active_thread_id = value
+
+            _persist_turn(user_id, chat_session_id, [user_message], ai_response, context, active_thread_id, lane_state)
+            
+            yield _sse_event('done', {
+                'success': True,
+                'data': chat_response_data(user_id, context, ai_response, active_thread_id)
+            })
+        except Exception as e:
+            logger.error("Streaming chat error: %s: %s", type(e).__name__, e)
+            yield _sse_event('error', {'success': False, 'error': str(e)})
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Runs even if the client disconnects before the generator starts
+    response.call_on_close(lane.close)
+    return response
+
 @app.errorhandler(404)
 def not_found(error):
     
@@ -456,5 +736,6 @@ if __name__ == '__main__':
     print(" Starting AI Chat Backend API...")
     print(f"Server running at: http://localhost:{port}")
     print(" API Endpoint: POST /api/chat")
+    print(" Streaming Endpoint: POST /api/chat/stream")
     print(" Health Check: GET /health")
     app.run(debug=True, host='0.0.0.0', port=port)
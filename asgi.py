@@ -0,0 +1,174 @@
+"""
+ASGI Application
+Async serving mode for the chat backend.
+
+POST /api/chat is served natively with the async OpenAI and Firestore
+clients, so a single worker process can hold hundreds of in-flight chats.
+Every other route is delegated to the Flask app unchanged.
+
+Run with:
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+"""
+
+import time
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+import app as flask_app_module
+from app import API_KEY, _persist_turn, llm_service
+from services.chat_turn import ChatContext, llm_request, needs_new_thread, new_thread_request, chat_response_data
+from services.firebase_service import AsyncFirebaseService
+from services.llm_service import AsyncLLMService
+from services.logger import get_logger, new_request_id
+from services.metrics import request_latency, span
+from services.request_coalescer import AsyncChatCoalescer
+from services.session_cache import session_cache
+
+async_firebase_service = AsyncFirebaseService()
+# Shares the sync service's Assistant, resolved on first use (not at import)
+async_llm_service = AsyncLLMService(assistant_provider=lambda: llm_service.assistant_id)
+async_chat_coalescer = AsyncChatCoalescer()
+
+logger = get_logger('asgi')
+
+
+def _cors_headers(request):
+    """Match flask-cors defaults for the natively served route"""
+    headers = {'Access-Control-Allow-Origin': '*'}
+    if request.method == 'OPTIONS':
+        headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
+        requested = request.headers.get('access-control-request-headers')
+        if requested:
+            headers['Access-Control-Allow-Headers'] = requested
+    return headers
+
+
+async def _session_cache_call(fn, *args):
+    """Session cache call, in a thread when the backend does network I/O (Redis)"""
+    if session_cache.blocking:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+
+async def _load_chat_context(user_id, recent_thread=None):
+    """Async I/O shell over services/chat_turn.ChatContext (see app._load_chat_context)"""
+    prompt_version = flask_app_module.firebase_service.profile_version(user_id)
+    with span('get_chat_context'):
+        chat_data = await async_firebase_service.get_chat_context(user_id, include_preferences=True)
+    turn = ChatContext(chat_data, recent_thread, prompt_version, async_llm_service.stateless)
+    if not turn.user_data:
+        return None
+
+    with span('cache_lookup'):
+        history = await _session_cache_call(session_cache.get_history, user_id)
+    if turn.needs_history(history):
+        with span('history_fetch'):
+            history = await async_firebase_service.get_user_messages(user_id, limit=10)
+        await _session_cache_call(session_cache.update_history, user_id, history)
+
+    preferences = None
+    if turn.needs_preferences:
+        with span('preference_fetch'):
+            preferences = await async_firebase_service.get_user_preferences(user_id)
+    return turn.build(history, preferences)
+
+
+async def _run_chat_turn(user_id, chat_session_id, user_messages, lane_state):
+    """Async version of app._run_chat_turn"""
+    context = await _load_chat_context(user_id, recent_thread=lane_state.get('thread'))
+    if not context:
+        return None
+
+    try:
+        with span('llm_response'):
+            ai_response, active_thread_id = await async_llm_service.get_ai_response(**llm_request(context, user_messages))
+    except Exception as e:
+        # Fallback for invalid thread only (transient errors were retried)
+        if not needs_new_thread(e, context['thread_id']):
+            raise
+        with span('llm_response_new_thread'):
+            ai_response, active_thread_id = await async_llm_service.get_ai_response(**new_thread_request(context, user_messages))
+
+    # Queueing the write can block (PERSIST_OVERFLOW=block) or commit inline,
+    # and the session cache may be Redis: none of it may run on the event loop
+    await run_in_threadpool(_persist_turn, user_id, chat_session_id, user_messages, ai_response,
+                            context, active_thread_id, lane_state)
+    return context, ai_response, active_thread_id
+
+
+async def chat(request):
+    """Async /api/chat with the same request/response contract as app.chat() (including merged turns)"""
+    started = time.perf_counter()
+    # Each request runs in its own task, so the ID stays scoped to it
+    request_id = new_request_id(request.headers.get('X-Request-ID'))
+    response = await _chat(request)
+    request_latency.observe(time.perf_counter() - started, endpoint='/api/chat',
+                            method=request.method, status=response.status_code)
+    response.headers['X-Request-ID'] = request_id
+    return response
+
+
+async def _chat(request):
+    cors = _cors_headers(request)
+    if request.method == 'OPTIONS':
+        return Response(status_code=200, headers=cors)
+
+    try:
+        with span('api_key_check'):
+            authorized = request.headers.get('X-API-Key') == API_KEY
+        if not authorized:
+            return JSONResponse({
+                'success': False,
+                'error': 'Invalid or missing API key'
+            }, status_code=401, headers=cors)
+
+        data = await request.json()
+        user_id = data.get('user_id')
+        chat_session_id = data.get('chat_session_id')  # Optional
+        user_message = data.get('message')
+
+        if not user_id or not user_message:
+            return JSONResponse({
+                'success': False,
+                'error': 'user_id and message are required'
+            }, status_code=400, headers=cors)
+
+        turn = await async_chat_coalescer.submit(
+            user_id, user_message,
+            lambda messages, lane_state: _run_chat_turn(user_id, chat_session_id, messages, lane_state),
+            merge_key=chat_session_id
+        )
+        if not turn:
+            return JSONResponse({
+                'success': False,
+                'error': 'User not found'
+            }, status_code=404, headers=cors)
+        context, ai_response, active_thread_id = turn
+
+        # Serialize with Flask's JSON provider so the body is byte-identical to jsonify()
+        return Response(
+            flask_app_module.app.json.dumps({
+                'success': True,
+                'data': chat_response_data(user_id, context, ai_response, active_thread_id)
+            }),
+            status_code=200,
+            media_type='application/json',
+            headers=cors
+        )
+
+    except Exception as e:
+        logger.exception("Chat request failed: %s: %s", type(e).__name__, e)
+        return JSONResponse({
+            'success': False,
+            'error': str(e)
+        }, status_code=500, headers=cors)
+
+
+app = Starlette(routes=[
+    Route('/api/chat', chat, methods=['POST', 'OPTIONS']),
+    Mount('/', app=WSGIMiddleware(flask_app_module.app)),
+])
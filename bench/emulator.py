@@ -0,0 +1,90 @@
+"""
+Firestore emulator wiring for benchmarks.
+Runs the real FirebaseService against the local emulator instead of the
+in-memory fakes, so query shapes, batching and serialization are measured too.
+
+Start the emulator first (Firebase CLI):
+    firebase emulators:start --only firestore --project ammora-bench
+    export FIRESTORE_EMULATOR_HOST=127.0.0.1:8080
+"""
+
+import os
+import sys
+import types
+from datetime import datetime, timedelta
+
+EMULATOR_PROJECT = os.getenv('BENCH_EMULATOR_PROJECT', 'ammora-bench')
+
+
+def _require_emulator():
+    if not os.getenv('FIRESTORE_EMULATOR_HOST'):
+        raise RuntimeError("FIRESTORE_EMULATOR_HOST is not set (e.g. 127.0.0.1:8080)")
+
+
+def emulator_client():
+    """Sync Firestore client for the emulator (no credentials needed)"""
+    _require_emulator()
+    from google.cloud import firestore
+    return firestore.Client(project=EMULATOR_PROJECT)
+
+
+def install_emulator_firebase_config():
+    """
+    Register a config.firebase_config backed by the emulator, so the services
+    never initialize the Firebase Admin SDK. Must run before importing app.
+    """
+    module = types.ModuleType('config.firebase_config')
+    module.db = emulator_client()
+    module.get_db = lambda: module.db
+    module.initialize_firebase = lambda: None
+    module._async_db = None
+
+    def get_async_db():
+        if module._async_db is None:
+            from google.cloud import firestore
+            module._async_db = firestore.AsyncClient(project=EMULATOR_PROJECT)
+        return module._async_db
+
+    module.get_async_db = get_async_db
+    sys.modules['config.firebase_config'] = module
+    return module
+
+
+def seed_users(count, history=10):
+    """
+    Write users user-0..user-N-1 with preferences and `history` messages each
+    (session-<i>), in the layouts the services read. Idempotent.
+    """
+    db = emulator_client()
+    now = datetime.now()
+    batch = db.batch()
+    writes = 0
+
+    def add(ref, data):
+        nonlocal batch, writes
+        batch.set(ref, data)
+        writes += 1
+        if writes % 400 == 0:
+            batch.commit()
+            batch = db.batch()
+
+    for i in range(count):
+        user_id = f"user-{i}"
+        user_ref = db.collection('users').document(user_id)
+        add(user_ref, {'name': f"User {i}", 'age': 30, 'email': f"user{i}@example.com", 'created_at': now})
+        add(user_ref.collection('preferences').document('onboarding'),
+            {'supportType': 'Supportive Friend', 'conversationTone': 'Gentle'})
+        history_ref = db.collection('messages').document(user_id).collection('history')
+        # Per-session copies too, so SESSION_MESSAGES_LAYOUT=session reads the same data
+        session_ref = db.collection('chat_sessions').document(f"session-{i}").collection('messages')
+        for n in range(history):
+            msg_type = 'user' if n % 2 == 0 else 'ai'
+            message = {
+                'id': f"seed-{n}", 'user_id': user_id, 'message': f"Seed {msg_type} message {n}",
+                'type': msg_type, 'timestamp': now - timedelta(seconds=history - n)
+            }
+            add(history_ref.document(f"seed-{n}"), dict(message, is_typing=False, metadata={},
+                                                         chat_session_id=f"session-{i}"))
+            add(session_ref.document(f"seed-{n}"), message)
+    batch.commit()
+    return [f"user-{i}" for i in range(count)]
@@ -0,0 +1,299 @@
+"""
+Fake OpenAI Server
+Minimal local stand-in for the OpenAI Assistants and Chat Completions APIs
+used by LLMService. Runs (and chat completions) finish after a configurable
+latency so request handling overhead (polling, streaming, extra round-trips)
+can be measured offline.
+
+Usage:
+    python -m bench.fake_openai --port 8089 --run-latency 1.5
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake ...
+"""
+
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+_ids = itertools.count(1)
+
+
+def _new_id(prefix):
+    return f"{prefix}_{next(_ids):08d}"
+
+
+class FakeOpenAIState:
+    """In-memory threads, messages and runs"""
+
+    def __init__(self, run_latency=1.0, stream_chunks=8, reply="Thanks for sharing that with me. How are you feeling now?",
+                 api_latency=0.0):
+        self.run_latency = run_latency
+        self.api_latency = api_latency  # added to every API call (network round-trip stand-in)
+        self.stream_chunks = stream_chunks
+        self.reply = reply
+        self.threads = {}   # thread_id -> [message, ...] (oldest first)
+        self.runs = {}      # run_id -> run dict
+        self.run_deadlines = {}  # run_id -> monotonic completion time
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.bytes_sent = 0
+
+    def message(self, thread_id, role, text, run_id=None):
+        return {
+            'id': _new_id('msg'),
+            'object': 'thread.message',
+            'created_at': int(time.time()),
+            'thread_id': thread_id,
+            'role': role,
+            'run_id': run_id,
+            'status': 'completed',
+            'assistant_id': 'asst_fake' if role == 'assistant' else None,
+            'attachments': [],
+            'metadata': {},
+            'content': [{'type': 'text', 'text': {'value': text, 'annotations': []}}]
+        }
+
+    def run(self, thread_id, status='queued'):
+        return {
+            'id': _new_id('run'),
+            'object': 'thread.run',
+            'created_at': int(time.time()),
+            'thread_id': thread_id,
+            'assistant_id': 'asst_fake',
+            'status': status,
+            'model': 'fake-model',
+            'instructions': '',
+            'tools': [],
+            'metadata': {},
+            'last_error': None,
+            'truncation_strategy': {'type': 'last_messages', 'last_messages': 50},
+            'parallel_tool_calls': False,
+        }
+
+    def complete_run(self, run):
+        """Append the assistant reply for a run (once)"""
+        with self.lock:
+            if run['status'] == 'completed':
+                return
+            run['status'] = 'completed'
+            self.threads.setdefault(run['thread_id'], []).append(
+                self.message(run['thread_id'], 'assistant', self.reply, run['id'])
+            )
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+        def _json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            state.bytes_sent += len(body)
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _sse(self, event, data):
+            payload = data if isinstance(data, str) else json.dumps(data)
+            chunk = f"event: {event}\ndata: {payload}\n\n".encode()
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+
+        def _stream_run(self, run):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self._sse('thread.run.created', run)
+            run['status'] = 'in_progress'
+            self._sse('thread.run.in_progress', run)
+
+            # First token arrives after a share of the latency, the rest trickles in
+            chunks = self._reply_chunks()
+            time.sleep(state.run_latency / 2)
+            msg_id = _new_id('msg')
+            for i, text in enumerate(chunks):
+                delta = text if i == 0 else ' ' + text
+                self._sse('thread.message.delta', {
+                    'id': msg_id, 'object': 'thread.message.delta',
+                    'delta': {'content': [{'index': 0, 'type': 'text', 'text': {'value': delta, 'annotations': []}}]}
+                })
+                time.sleep(state.run_latency / 2 / len(chunks))
+
+            state.complete_run(run)
+            self._sse('thread.message.completed', state.threads[run['thread_id']][-1])
+            self._sse('thread.run.completed', run)
+            self._sse('done', '[DONE]')
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _reply_chunks(self):
+            words = state.reply.split(' ')
+            per_chunk = max(1, len(words) // max(1, state.stream_chunks))
+            return [' '.join(words[i:i + per_chunk]) for i in range(0, len(words), per_chunk)]
+
+        def _chat_completion(self, body):
+            completion_id = _new_id('chatcmpl')
+            base = {'id': completion_id, 'created': int(time.time()), 'model': body.get('model')}
+            if not body.get('stream'):
+                time.sleep(state.run_latency)
+                return self._json({**base, 'object': 'chat.completion', 'choices': [{
+                    'index': 0, 'finish_reason': 'stop',
+                    'message': {'role': 'assistant', 'content': state.reply}
+                }]})
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            chunks = self._reply_chunks()
+            time.sleep(state.run_latency / 2)
+            for i, text in enumerate(chunks):
+                self._sse_data({**base, 'object': 'chat.completion.chunk', 'choices': [{
+                    'index': 0, 'finish_reason': None,
+                    'delta': {'role': 'assistant', 'content': text if i == 0 else ' ' + text}
+                }]})
+                time.sleep(state.run_latency / 2 / len(chunks))
+            self._sse_data({**base, 'object': 'chat.completion.chunk', 'choices': [{
+                'index': 0, 'finish_reason': 'stop', 'delta': {}
+            }]})
+            self._sse_data('[DONE]')
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _sse_data(self, data):
+            payload = data if isinstance(data, str) else json.dumps(data)
+            chunk = f"data: {payload}\n\n".encode()
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            state.request_count += 1
+            if state.api_latency:
+                time.sleep(state.api_latency)
+            body = self._body()
+            path = self.path.split('?')[0]
+
+            if path == '/v1/chat/completions':
+                return self._chat_completion(body)
+            if path == '/v1/assistants':
+                return self._json({'id': 'asst_fake', 'object': 'assistant', 'created_at': int(time.time()),
+                                   'model': body.get('model'), 'name': body.get('name'), 'tools': [], 'metadata': {}})
+            if path == '/v1/threads':
+                thread_id = _new_id('thread')
+                state.threads[thread_id] = []
+                return self._json({'id': thread_id, 'object': 'thread', 'created_at': int(time.time()), 'metadata': {}})
+
+            m = re.fullmatch(r'/v1/threads/([^/]+)/messages', path)
+            if m:
+                msg = state.message(m.group(1), body.get('role', 'user'), body.get('content', ''))
+                with state.lock:
+                    state.threads.setdefault(m.group(1), []).append(msg)
+                return self._json(msg)
+
+            m = re.fullmatch(r'/v1/threads/([^/]+)/runs', path)
+            if m:
+                run = state.run(m.group(1))
+                state.run_deadlines[run['id']] = time.monotonic() + state.run_latency
+                state.runs[run['id']] = run
+                if body.get('stream'):
+                    return self._stream_run(run)
+                return self._json(run)
+
+            return self._json({'error': {'message': f'Unknown path {path}'}}, 404)
+
+        def _list(self, data, limit=20):
+            page = data[:limit]
+            return self._json({'object': 'list', 'data': page, 'has_more': len(data) > limit,
+                               'first_id': page[0]['id'] if page else None,
+                               'last_id': page[-1]['id'] if page else None})
+
+        def do_GET(self):
+            state.request_count += 1
+            if state.api_latency:
+                time.sleep(state.api_latency)
+            path, _, query = self.path.partition('?')
+
+            m = re.fullmatch(r'/v1/threads/([^/]+)/runs/([^/]+)', path)
+            if m:
+                run = state.runs.get(m.group(2))
+                if not run:
+                    return self._json({'error': {'message': 'No run found'}}, 404)
+                if run['status'] != 'completed':
+                    if time.monotonic() >= state.run_deadlines[run['id']]:
+                        state.complete_run(run)
+                    else:
+                        run['status'] = 'in_progress'
+                return self._json(run)
+
+            m = re.fullmatch(r'/v1/threads/([^/]+)/runs/([^/]+)/steps', path)
+            if m:
+                run = state.runs.get(m.group(2))
+                messages = [msg for msg in state.threads.get(m.group(1), []) if run and msg['run_id'] == run['id']]
+                data = [{
+                    'id': _new_id('step'), 'object': 'thread.run.step', 'created_at': msg['created_at'],
+                    'run_id': run['id'], 'thread_id': m.group(1), 'assistant_id': 'asst_fake',
+                    'type': 'message_creation', 'status': 'completed',
+                    'step_details': {'type': 'message_creation', 'message_creation': {'message_id': msg['id']}}
+                } for msg in reversed(messages)]
+                return self._list(data)
+
+            m = re.fullmatch(r'/v1/threads/([^/]+)/messages/([^/]+)', path)
+            if m:
+                for msg in state.threads.get(m.group(1), []):
+                    if msg['id'] == m.group(2):
+                        return self._json(msg)
+                return self._json({'error': {'message': 'No message found'}}, 404)
+
+            m = re.fullmatch(r'/v1/threads/([^/]+)/messages', path)
+            if m:
+                params = {k: v[0] for k, v in parse_qs(query).items()}
+                data = state.threads.get(m.group(1), [])
+                if params.get('run_id'):
+                    data = [msg for msg in data if msg['run_id'] == params['run_id']]
+                if params.get('order', 'desc') == 'desc':
+                    data = list(reversed(data))
+                return self._list(data, int(params.get('limit', 20)))
+
+            return self._json({'error': {'message': f'Unknown path {path}'}}, 404)
+
+    return Handler
+
+
+def start_server(port=0, **state_kwargs):
+    """Start the fake server in a background thread. Returns (server, state, base_url)."""
+    state = FakeOpenAIState(**state_kwargs)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    return server, state, base_url
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--run-latency', type=float, default=1.0, help='Seconds until a run completes')
+    parser.add_argument('--stream-chunks', type=int, default=8)
+    parser.add_argument('--api-latency', type=float, default=0.0, help='Seconds added to every API call')
+    args = parser.parse_args()
+
+    server, _, base_url = start_server(args.port, run_latency=args.run_latency, stream_chunks=args.stream_chunks,
+                                       api_latency=args.api_latency)
+    print(f"Fake OpenAI server running at: {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
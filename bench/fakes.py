@@ -0,0 +1,526 @@
+"""
+In-memory stand-ins for Firestore-backed services.
+Lets app.py / asgi.py run without Firebase credentials for benchmarking.
+"""
+
+import asyncio
+import itertools
+import sys
+import threading
+import time
+import types
+from datetime import datetime, timedelta, timezone
+
+_ids = itertools.count(1)
+
+
+def install_fake_firebase_config():
+    """
+    Register a stand-in for config.firebase_config so importing the services
+    does not initialize the Firebase Admin SDK. Must run before importing app.
+    """
+    module = types.ModuleType('config.firebase_config')
+    module.db = None
+    module.get_db = lambda: None
+    module.get_async_db = lambda: None
+    module.initialize_firebase = lambda: None
+    sys.modules['config.firebase_config'] = module
+    return module
+
+
+class FakeFirebaseService:
+    """Dict-backed FirebaseService with a fixed per-call latency"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.users = {}
+        self.preferences = {}
+        self.threads = {}
+        self.messages = {}   # user_id -> [message, ...]
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _wait(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def seed_users(self, count, preferences=None, history=0):
+        """Users user-0..user-N-1, each with `history` messages in session-<i>"""
+        now = datetime.now()
+        for i in range(count):
+            user_id = f"user-{i}"
+            self.users[user_id] = {'name': f"User {i}", 'age': 30, 'email': f"user{i}@example.com",
+                                   'created_at': now}
+            self.preferences[user_id] = dict(preferences or {'supportType': 'Supportive Friend',
+                                                             'conversationTone': 'Gentle'})
+            self.messages[user_id] = [{
+                'id': f"msg-{next(_ids)}", 'user_id': user_id, 'message': f"Seed message {n}",
+                'type': 'user' if n % 2 == 0 else 'ai', 'timestamp': now - timedelta(seconds=history - n),
+                'chat_session_id': f"session-{i}"
+            } for n in range(history)]
+        return [f"user-{i}" for i in range(count)]
+
+    def get_user(self, user_id):
+        self._wait()
+        return dict(self.users[user_id]) if user_id in self.users else None
+
+    def read_profile(self, kind, user_id):
+        data = self.get_user(user_id) if kind == 'user' else self.get_user_preferences(user_id)
+        return data, None
+
+    def invalidate_user_cache(self, user_id):
+        pass
+
+    def profile_version(self, user_id):
+        return None
+
+    def get_thread_id(self, user_id):
+        self._wait()
+        return self.threads.get(user_id, {}).get('thread_id')
+
+    def save_thread_id(self, user_id, thread_id):
+        self._wait()
+        self.threads[user_id] = {'thread_id': thread_id, 'msg_count': 0}
+        return True
+
+    def get_thread_data(self, user_id):
+        self._wait()
+        data = self.threads.get(user_id)
+        return dict(data) if data else None
+
+    def save_conversation_summary(self, user_id, summary, msg_count, through_at=None):
+        self._wait()
+        with self.lock:
+            self.threads.setdefault(user_id, {'thread_id': None, 'msg_count': 0}).update(
+                {'summary': summary, 'summary_msg_count': msg_count, 'summary_through_at': through_at})
+        return True
+
+    def increment_thread_count(self, user_id):
+        self._wait()
+        with self.lock:
+            if user_id in self.threads:
+                self.threads[user_id]['msg_count'] += 1
+
+    def get_user_preferences(self, user_id):
+        self._wait()
+        prefs = self.preferences.get(user_id)
+        return dict(prefs) if prefs else None
+
+    def get_chat_context(self, user_id, include_preferences=False):
+        self._wait()
+        context = {
+            'user': dict(self.users[user_id]) if user_id in self.users else None,
+            'thread': dict(self.threads[user_id]) if user_id in self.threads else None
+        }
+        if include_preferences and user_id in self.preferences:
+            context['preferences'] = dict(self.preferences[user_id])
+        return context
+
+    def get_user_messages(self, user_id, limit=10, after=None):
+        self._wait()
+        messages = [m for m in self.messages.get(user_id, []) if after is None or m['timestamp'] > after]
+        return [dict(m) for m in messages[-limit:]]
+
+    def get_chat_session(self, session_id):
+        self._wait()
+        return None
+
+    def save_message(self, user_id, chat_session_id, message_text, message_type='user'):
+        self._wait()
+        message = {
+            'id': f"msg-{next(_ids)}",
+            'user_id': user_id,
+            'message': message_text,
+            'type': message_type,
+            'timestamp': datetime.now(),
+            'chat_session_id': chat_session_id
+        }
+        with self.lock:
+            self.messages.setdefault(user_id, []).append(message)
+        return message['id']
+
+    def record_context_injection(self, user_id, context):
+        from services.firebase_service import context_fields
+        self._wait()
+        with self.lock:
+            if user_id in self.threads:
+                self.threads[user_id].update(context_fields(context))
+        return True
+
+    def commit_turn(self, user_id, chat_session_id, user_text, ai_text, new_thread_id=None, context=None):
+        from services.firebase_service import context_fields
+        self._wait()
+        now = datetime.now()
+        with self.lock:
+            if new_thread_id:
+                previous = self.threads.get(user_id, {})
+                self.threads[user_id] = {'thread_id': new_thread_id, 'msg_count': 0, 'summary': previous.get('summary'),
+                                         'summary_msg_count': 0, 'summary_through_at': previous.get('summary_through_at'),
+                                         **context_fields(context)}
+            elif user_id in self.threads:
+                self.threads[user_id]['msg_count'] += 1
+                if context:
+                    self.threads[user_id].update(context_fields(context))
+            ids = []
+            # One document per message, AI reply last, as in FirebaseService.commit_turn
+            user_texts = [user_text] if isinstance(user_text, str) else list(user_text)
+            turn = [(text, 'user') for text in user_texts] + [(ai_text, 'ai')]
+            for offset, (text, msg_type) in enumerate(turn):
+                ids.append(f"msg-{next(_ids)}")
+                self.messages.setdefault(user_id, []).append({
+                    'id': ids[-1], 'user_id': user_id, 'message': text, 'type': msg_type,
+                    'timestamp': now + timedelta(microseconds=offset), 'chat_session_id': chat_session_id
+                })
+        return tuple(ids)
+
+    def get_session_messages(self, session_id, limit=50, before=None, after=None):
+        self._wait()
+        with self.lock:
+            found = [{'id': m['id'], 'message': m['message'], 'type': m['type'], 'timestamp': m['timestamp']}
+                     for msgs in self.messages.values() for m in msgs
+                     if m.get('chat_session_id') == session_id
+                     and (before is None or m['timestamp'] < before)
+                     and (after is None or m['timestamp'] > after)]
+        found.sort(key=lambda m: m['timestamp'])
+        return found[:limit] if after is not None else found[-limit:]
+
+    def get_session_version(self, session_id):
+        self._wait()
+        with self.lock:
+            newest = max((m['timestamp'] for msgs in self.messages.values() for m in msgs
+                          if m.get('chat_session_id') == session_id), default=None)
+        return str(newest) if newest is not None else None
+
+    def update_session_metadata(self, chat_session_id):
+        self._wait()
+
+
+class AsyncFakeFirebaseService:
+    """Async reads over a FakeFirebaseService's data, sleeping with asyncio instead of time"""
+
+    def __init__(self, backing):
+        self.backing = backing
+
+    async def _wait(self):
+        self.backing.calls += 1
+        if self.backing.latency:
+            await asyncio.sleep(self.backing.latency)
+
+    async def get_user(self, user_id):
+        await self._wait()
+        user = self.backing.users.get(user_id)
+        return dict(user) if user else None
+
+    async def get_thread_data(self, user_id):
+        await self._wait()
+        data = self.backing.threads.get(user_id)
+        return dict(data) if data else None
+
+    async def get_chat_context(self, user_id, include_preferences=False):
+        await self._wait()
+        context = {
+            'user': dict(self.backing.users[user_id]) if user_id in self.backing.users else None,
+            'thread': dict(self.backing.threads[user_id]) if user_id in self.backing.threads else None
+        }
+        if include_preferences and user_id in self.backing.preferences:
+            context['preferences'] = dict(self.backing.preferences[user_id])
+        return context
+
+    async def get_user_preferences(self, user_id):
+        await self._wait()
+        prefs = self.backing.preferences.get(user_id)
+        return dict(prefs) if prefs else None
+
+    async def get_user_messages(self, user_id, limit=10, after=None):
+        await self._wait()
+        messages = [m for m in self.backing.messages.get(user_id, []) if after is None or m['timestamp'] > after]
+        return [dict(m) for m in messages[-limit:]]
+
+
+class FakeRedis:
+    """
+    In-process stand-in for the subset of the redis-py API used by
+    RedisSessionBackend. Values are bytes, like a real Redis client returns.
+    A single FakeRedis can be shared by several SessionCache instances to
+    model multiple workers talking to one Redis.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.RLock()
+
+    def _alive(self, key):
+        deadline = self._expires.get(key)
+        if deadline is not None and time.monotonic() >= deadline:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    @staticmethod
+    def _bytes(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._alive(key))
+
+    def set(self, key, value, px=None):
+        with self._lock:
+            self._data[key] = self._bytes(value)
+            self._expires.pop(key, None)
+            if px:
+                self._expires[key] = time.monotonic() + px / 1000
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._alive(key):
+                    removed += 1
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+
+    def pexpire(self, key, ms):
+        with self._lock:
+            if not self._alive(key):
+                return False
+            self._expires[key] = time.monotonic() + ms / 1000
+            return True
+
+    def rpush(self, key, *values):
+        with self._lock:
+            if not self._alive(key):
+                self._data[key] = []
+            self._data[key].extend(self._bytes(v) for v in values)
+            return len(self._data[key])
+
+    def lrange(self, key, start, end):
+        with self._lock:
+            if not self._alive(key):
+                return []
+            items = self._data[key]
+            end = len(items) if end == -1 else end + 1
+            return list(items[start:end])
+
+    def ltrim(self, key, start, end):
+        with self._lock:
+            if self._alive(key):
+                items = self._data[key]
+                end = len(items) if end == -1 else end + 1
+                self._data[key] = items[start:end] if start >= 0 else items[max(0, len(items) + start):end]
+            return True
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._calls = []
+
+    def __getattr__(self, name):
+        def queue_call(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+        return queue_call
+
+    def execute(self):
+        with self._redis._lock:
+            results = [getattr(self._redis, name)(*args, **kwargs) for name, args, kwargs in self._calls]
+        self._calls = []
+        return results
+
+
+class FakeFirestore:
+    """
+    In-process stand-in for the subset of the google-cloud-firestore client
+    used by FirebaseService: documents, collection (group) queries, get_all,
+    WriteBatch with merge and Increment. Documents live in `docs`, keyed by
+    path ('users/u1/preferences/p1'). Set fail_commits to make the next N
+    batch commits raise before anything is applied.
+    """
+
+    def __init__(self):
+        self.docs = {}          # path -> data
+        self.update_times = {}  # path -> datetime (UTC), bumped by every write
+        self.commits = []       # paths written by each successful batch commit
+        self.fail_commits = 0
+        self._lock = threading.RLock()
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def document(self, path):
+        return FakeDocumentRef(self, path)
+
+    def collection_group(self, name):
+        return FakeQuery(self, lambda path: path.split('/')[-2] == name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+    def put(self, path, data):
+        """Write a document directly (a change made by another process)"""
+        with self._lock:
+            self._write(path, dict(data))
+
+    def _write(self, path, data):
+        self.docs[path] = data
+        previous = self.update_times.get(path)
+        now = datetime.now(timezone.utc)
+        self.update_times[path] = now if previous is None or now > previous else previous + timedelta(microseconds=1)
+
+    def _merged(self, path, data, merge, staged=None):
+        from google.cloud.firestore_v1.transforms import Increment
+        current = dict((self.docs if staged is None else staged).get(path, {})) if merge else {}
+        for field, value in data.items():
+            if isinstance(value, Increment):
+                value = current.get(field, 0) + value.value
+            current[field] = value
+        return current
+
+    def _snapshot(self, path, fields=None):
+        data = self.docs.get(path)
+        if data is not None and fields is not None:
+            data = {field: data[field] for field in fields if field in data}
+        return FakeSnapshot(FakeDocumentRef(self, path), data, self.update_times.get(path))
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data, update_time):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time if self.exists else None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocumentRef:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def collection(self, name):
+        return FakeCollection(self._db, f"{self.path}/{name}")
+
+    def get(self):
+        with self._db._lock:
+            return self._db._snapshot(self.path)
+
+    def set(self, data, merge=False):
+        with self._db._lock:
+            self._db._write(self.path, self._db._merged(self.path, data, merge))
+
+    def update(self, data):
+        with self._db._lock:
+            if self.path not in self._db.docs:
+                raise KeyError(f"No document to update: {self.path}")
+            self._db._write(self.path, self._db._merged(self.path, data, True))
+
+
+class FakeQuery:
+    """where ==/</<=/>/>= filters, one order_by, start_after, select and limit"""
+
+    _OPS = {
+        '==': lambda a, b: a == b,
+        '<': lambda a, b: a < b,
+        '<=': lambda a, b: a <= b,
+        '>': lambda a, b: a > b,
+        '>=': lambda a, b: a >= b,
+    }
+
+    def __init__(self, db, match, filters=(), order=None, cursor=None, fields=None, count=None):
+        self._db = db
+        self._match = match
+        self._filters = filters
+        self._order = order
+        self._cursor = cursor
+        self._fields = fields
+        self._count = count
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, order=self._order, cursor=self._cursor,
+                     fields=self._fields, count=self._count)
+        state.update(changes)
+        return FakeQuery(self._db, self._match, **state)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, self._OPS[op], value),))
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._copy(order=(field, direction == 'DESCENDING'))
+
+    def start_after(self, values):
+        return self._copy(cursor=values)
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def limit(self, count):
+        return self._copy(count=count)
+
+    def stream(self):
+        with self._db._lock:
+            paths = [path for path, data in self._db.docs.items() if self._match(path)
+                     and all(field in data and op(data[field], value) for field, op, value in self._filters)]
+            if self._order:
+                field, descending = self._order
+                paths = [path for path in paths if field in self._db.docs[path]]
+                paths.sort(key=lambda path: self._db.docs[path][field], reverse=descending)
+                if self._cursor is not None:
+                    after = self._cursor[field]
+                    paths = [path for path in paths
+                             if (self._db.docs[path][field] < after if descending else self._db.docs[path][field] > after)]
+            else:
+                paths.sort()
+            if self._count is not None:
+                paths = paths[:self._count]
+            return iter([self._db._snapshot(path, self._fields) for path in paths])
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, path):
+        super().__init__(db, lambda doc_path: doc_path.rsplit('/', 1)[0] == path)
+        self.path = path
+
+    def document(self, document_id=None):
+        return FakeDocumentRef(self._db, f"{self.path}/{document_id or f'doc-{next(_ids):06d}'}")
+
+
+class FakeWriteBatch:
+    """Writes are applied together on commit(), or not at all"""
+
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append((ref.path, data, merge))
+
+    def update(self, ref, data):
+        self._writes.append((ref.path, data, True))
+
+    def commit(self):
+        with self._db._lock:
+            if self._db.fail_commits:
+                self._db.fail_commits -= 1
+                raise RuntimeError("503 The service is currently unavailable.")
+            # Resolve every write before applying any of them
+            staged = dict(self._db.docs)
+            for path, data, merge in self._writes:
+                staged[path] = self._db._merged(path, data, merge, staged)
+            for path in dict.fromkeys(path for path, _, _ in self._writes):
+                self._db._write(path, staged[path])
+            self._db.commits.append([path for path, _, _ in self._writes])
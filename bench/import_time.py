@@ -0,0 +1,71 @@
+"""
+Import-Time Benchmark
+Measures cold-start cost: how long a fresh interpreter takes to import the
+app module (what every Gunicorn worker boot and every test import pays),
+and which imports dominate it (python -X importtime).
+
+Nothing should touch the network or initialize Firebase at import time, so
+this runs without credentials; OPENAI_API_KEY only has to be non-empty.
+
+Usage:
+    python -m bench.import_time --runs 10
+    python -m bench.import_time --module asgi --top 20
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIMER = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault('OPENAI_API_KEY', 'fake')
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    return env
+
+
+def time_import(module):
+    """Seconds to import module in a fresh interpreter"""
+    result = subprocess.run([sys.executable, '-c', TIMER.format(module=module)], cwd=ROOT, env=_env(),
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module, top):
+    """[(cumulative seconds, module name), ...] from -X importtime, slowest first"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=ROOT, env=_env(),
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app', help='Module to import (app or asgi)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list (0 = none)')
+    args = parser.parse_args()
+
+    samples = [time_import(args.module) for _ in range(args.runs)]
+    print(f"import {args.module}: {args.runs} runs, min {min(samples):.3f}s, "
+          f"median {statistics.median(samples):.3f}s, max {max(samples):.3f}s")
+
+    if args.top:
+        print("\nSlowest imports (cumulative, one run):")
+        for seconds, name in slowest_imports(args.module, args.top):
+            print(f"  {seconds:>7.3f}s  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+LLM Latency Benchmark
+Measures p50/p95 latency of LLMService.get_ai_response against the local
+fake OpenAI server for each run execution mode:
+
+- legacy: fixed 1s sleep between run polls (previous behaviour)
+- poll:   adaptive-backoff poller
+- stream: Assistants streaming events
+- chat:   Chat Completions backend (one request per turn)
+
+Usage:
+    python -m bench.llm_latency --requests 20 --run-latency 1.2
+"""
+
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_openai import start_server
+
+MODES = {
+    'legacy': {'OPENAI_RUN_MODE': 'poll', 'OPENAI_POLL_INITIAL_DELAY': '1', 'OPENAI_POLL_BACKOFF': '1'},
+    'poll': {'OPENAI_RUN_MODE': 'poll'},
+    'stream': {'OPENAI_RUN_MODE': 'stream'},
+    'chat': {'LLM_BACKEND': 'chat_completions'},
+}
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def run_mode(mode, requests):
+    env = {'LLM_BACKEND': 'assistants', 'OPENAI_POLL_INITIAL_DELAY': '0.2', 'OPENAI_POLL_BACKOFF': '1.5'}
+    env.update(MODES[mode])
+    os.environ.update(env)
+
+    from services.llm_service import LLMService
+    service = LLMService()
+
+    latencies = []
+    thread_id = None
+    history = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        reply, thread_id = service.get_ai_response("How was your day?", thread_id=thread_id, history=history)
+        latencies.append(time.perf_counter() - start)
+        history += [{'type': 'user', 'message': "How was your day?"}, {'type': 'ai', 'message': reply}]
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--run-latency', type=float, default=1.2, help='Seconds the fake server takes per run')
+    parser.add_argument('--modes', default='legacy,poll,stream')
+    args = parser.parse_args()
+
+    _, state, base_url = start_server(run_latency=args.run_latency)
+    os.environ.update({
+        'OPENAI_BASE_URL': base_url,
+        'OPENAI_API_KEY': 'fake',
+        'OPENAI_ASSISTANT_ID': 'asst_fake',
+    })
+
+    print(f"Run latency: {args.run_latency:.2f}s, {args.requests} requests per mode")
+    print(f"{'mode':<8} {'p50 (s)':>9} {'p95 (s)':>9} {'mean (s)':>9} {'calls/turn':>11} {'KB/turn':>8}")
+    for mode in args.modes.split(','):
+        calls_before, bytes_before = state.request_count, state.bytes_sent
+        latencies = run_mode(mode, args.requests)
+        calls = (state.request_count - calls_before) / args.requests
+        kb = (state.bytes_sent - bytes_before) / args.requests / 1024
+        print(f"{mode:<8} {percentile(latencies, 50):>9.3f} {percentile(latencies, 95):>9.3f} {statistics.mean(latencies):>9.3f} {calls:>11.1f} {kb:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
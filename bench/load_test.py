@@ -0,0 +1,228 @@
+"""
+Load Test
+Serves the backend (bench.stub_app under Gunicorn) against the fake OpenAI
+server and a local Firestore stand-in (in-memory fake or the emulator), then
+drives a weighted mix of POST /api/chat, GET /api/messages/<session_id> and
+POST /api/update-context at a fixed concurrency and reports throughput and
+latency percentiles per endpoint.
+
+--save writes the results as JSON. --baseline compares against a saved run
+and exits with status 1 when any endpoint's p95 or throughput regresses by
+more than --tolerance, so the run can gate a change.
+
+Usage:
+    python -m bench.load_test --concurrency 50 --requests 1000
+    python -m bench.load_test --server async --mix chat=1
+    python -m bench.load_test --firestore emulator      # needs FIRESTORE_EMULATOR_HOST
+    python -m bench.load_test --save baseline.json
+    python -m bench.load_test --baseline baseline.json --tolerance 0.15
+    python -m bench.load_test --url http://127.0.0.1:5001   # already running server
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.fake_openai import start_server
+from bench.sync_vs_async import percentile, wait_for_health
+
+API_HEADERS = {'X-API-Key': '321'}
+ENDPOINTS = ('chat', 'messages', 'update-context')
+
+
+def parse_mix(value):
+    """'chat=8,messages=1,update-context=1' -> {'chat': 8, ...}"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{name}' (expected one of {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def send(client, endpoint, i, users):
+    """One request to endpoint for user i % users"""
+    n = i % users
+    if endpoint == 'chat':
+        return client.post('/api/chat', headers=API_HEADERS, json={
+            'user_id': f"user-{n}",
+            'message': 'How was your day?',
+            'chat_session_id': f"session-{n}"
+        })
+    if endpoint == 'messages':
+        return client.get(f"/api/messages/session-{n}", headers=API_HEADERS)
+    return client.post('/api/update-context', headers=API_HEADERS, json={'user_id': f"user-{n}"})
+
+
+async def drive(base_url, mix, concurrency, requests, duration, users, seed):
+    """
+    Send requests (or until duration seconds have passed) with at most
+    `concurrency` in flight. Returns ({endpoint: [latency, ...]}, {endpoint: errors}, elapsed).
+    """
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    counter = iter(range(requests)) if requests else itertools.count()
+    deadline = time.monotonic() + duration if duration else None
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def worker():
+            for i in counter:
+                if deadline and time.monotonic() >= deadline:
+                    return
+                endpoint = rng.choices(names, weights)[0]
+                start = time.perf_counter()
+                try:
+                    resp = await send(client, endpoint, i, users)
+                    ok = resp.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies[endpoint].append(time.perf_counter() - start)
+                if not ok:
+                    errors[endpoint] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return latencies, errors, elapsed
+
+
+def summarize(latencies, errors, elapsed):
+    """Per-endpoint and overall throughput / latency percentiles"""
+    results = {}
+    groups = dict(latencies)
+    groups['all'] = [sample for samples in latencies.values() for sample in samples]
+    for name, samples in groups.items():
+        if not samples:
+            continue
+        results[name] = {
+            'requests': len(samples),
+            'rps': len(samples) / elapsed,
+            'p50': percentile(samples, 50),
+            'p95': percentile(samples, 95),
+            'p99': percentile(samples, 99),
+            'max': max(samples),
+            'errors': sum(errors.values()) if name == 'all' else errors[name]
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of p95 / throughput beyond tolerance, as printable lines"""
+    regressions = []
+    for name, base in baseline.get('results', {}).items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current['p95'] > base['p95'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95']:.3f}s -> {current['p95']:.3f}s")
+        if current['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['rps']:.1f} -> {current['rps']:.1f} req/s")
+    return regressions
+
+
+def server_command(args):
+    bind = f"127.0.0.1:{args.port}"
+    if args.server == 'async':
+        return ['gunicorn', '-k', 'uvicorn.workers.UvicornWorker', '-w', str(args.workers), '-b', bind,
+                'bench.stub_app:asgi_app']
+    return ['gunicorn', '-w', str(args.workers), '--threads', str(args.threads), '-b', bind,
+            'bench.stub_app:wsgi_app']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('chat=8,messages=1,update-context=1'),
+                        help='Endpoint weights, e.g. chat=8,messages=1,update-context=1')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=1000, help='Total requests (0 = use --duration)')
+    parser.add_argument('--duration', type=float, default=0, help='Stop after this many seconds')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--history', type=int, default=10, help='Seeded messages per user / session')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--server', choices=('sync', 'async'), default='sync')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='Threads per sync worker')
+    parser.add_argument('--firestore', choices=('fake', 'emulator'), default='fake')
+    parser.add_argument('--firestore-latency', type=float, default=0.02, help='Fake Firestore seconds per call')
+    parser.add_argument('--run-latency', type=float, default=1.0, help='Fake OpenAI seconds per run')
+    parser.add_argument('--api-latency', type=float, default=0.03, help='Fake OpenAI seconds per API call')
+    parser.add_argument('--port', type=int, default=8091)
+    parser.add_argument('--url', help='Drive an already running server instead of starting one')
+    parser.add_argument('--save', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against results saved with --save')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed regression vs --baseline (0.10 = 10%%)')
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        parser.error("--requests 0 needs --duration")
+
+    proc = None
+    base_url = args.url
+    if not base_url:
+        _, _, openai_url = start_server(run_latency=args.run_latency, api_latency=args.api_latency)
+        env = dict(os.environ, OPENAI_BASE_URL=openai_url, OPENAI_API_KEY='fake', OPENAI_ASSISTANT_ID='asst_fake',
+                   BENCH_FIRESTORE=args.firestore, BENCH_FIRESTORE_LATENCY=str(args.firestore_latency),
+                   BENCH_USERS=str(args.users), BENCH_HISTORY=str(args.history),
+                   BENCH_ASGI='1' if args.server == 'async' else '0',
+                   LOG_LEVEL=os.getenv('LOG_LEVEL', 'WARNING'))
+        if args.firestore == 'emulator':
+            from bench.emulator import seed_users
+            seed_users(args.users, history=args.history)
+        proc = subprocess.Popen(server_command(args), cwd=ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        wait_for_health(base_url)
+        latencies, errors, elapsed = asyncio.run(drive(base_url, args.mix, args.concurrency, args.requests,
+                                                       args.duration, args.users, args.seed))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    results = summarize(latencies, errors, elapsed)
+    target = args.url or f"{args.server} x{args.workers}, firestore={args.firestore}"
+    print(f"{target}: concurrency {args.concurrency}, {results['all']['requests']} requests in {elapsed:.1f}s")
+    print(f"{'endpoint':<16} {'requests':>8} {'req/s':>8} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9} "
+          f"{'max (s)':>9} {'errors':>7}")
+    for name, r in results.items():
+        print(f"{name:<16} {r['requests']:>8} {r['rps']:>8.1f} {r['p50']:>9.3f} {r['p95']:>9.3f} "
+              f"{r['p99']:>9.3f} {r['max']:>9.3f} {r['errors']:>7}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'config': {k: v for k, v in vars(args).items() if k not in ('save', 'baseline')},
+                       'results': results}, f, indent=2)
+        print(f"Results saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Prompt Render Micro-benchmark
+Measures PromptBuilder.build_system_prompt cost per call:
+
+- resolve fields:  preference fallback resolution (content memo key)
+- render:          template rendering with the memo bypassed (cold user)
+- content memo:    unchanged user / preferences, no profile version available
+- versioned memo:  unchanged user / preferences with a cached profile version (steady state)
+
+Usage:
+    python -m bench.prompt_render --calls 20000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.prompt_builder import PromptBuilder, _render_system_prompt
+
+USER = {'name': 'Alex', 'age': 29}
+PREFERENCES = {
+    'supportType': 'Supportive Friend',
+    'conversationTone': 'Gentle',
+    'relationshipStatus': 'Single',
+    'topicsToAvoid': ['work', 'family'],
+    'aiCommunication': 'Short and concise messages',
+    'aiHonesty': 'Gentle but helpful',
+    'aiToolsFamiliarity': 'Intermediate',
+    'dailyRoutine': 'Busy mornings, quiet evenings',
+    'biggestChallenge': 'Loneliness',
+    'stressResponse': 'Withdraw',
+    'interestedIn': 'Women',
+    'sexualOrientation': 'Straight',
+    'timeDedication': '30 minutes a day',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    values = PromptBuilder._prompt_values(USER, PREFERENCES)
+    render = _render_system_prompt.__wrapped__
+
+    results = {
+        'resolve fields': timeit.timeit(lambda: PromptBuilder._prompt_values(USER, PREFERENCES), number=args.calls),
+        'render': timeit.timeit(lambda: render(values), number=args.calls),
+        'content memo': timeit.timeit(lambda: PromptBuilder.build_system_prompt(USER, PREFERENCES), number=args.calls),
+        'versioned memo': timeit.timeit(
+            lambda: PromptBuilder.build_system_prompt(USER, PREFERENCES, version_key=('user-1', 1, 2)), number=args.calls),
+    }
+
+    print(f"{args.calls} calls, prompt length {len(PromptBuilder.build_system_prompt(USER, PREFERENCES))} chars")
+    for name, total in results.items():
+        print(f"{name:<18} {total / args.calls * 1e6:>8.2f} us/call")
+    print(f"memo: {PromptBuilder.render_stats()}")
+
+
+if __name__ == '__main__':
+    main()
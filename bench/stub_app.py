@@ -0,0 +1,46 @@
+"""
+Benchmark entry points: app.py / asgi.py wired to local Firestore stand-ins.
+OpenAI calls go wherever OPENAI_BASE_URL points (normally bench.fake_openai).
+
+    gunicorn -w 4 bench.stub_app:wsgi_app
+    gunicorn -k uvicorn.workers.UvicornWorker bench.stub_app:asgi_app
+
+Environment:
+    BENCH_FIRESTORE          fake (in-memory, default) or emulator (real FirebaseService
+                             against FIRESTORE_EMULATOR_HOST, see bench/emulator.py)
+    BENCH_FIRESTORE_LATENCY  seconds added to every fake Firestore call (default 0.02)
+    BENCH_USERS              number of seeded users user-0..user-N-1 (default 200)
+    BENCH_HISTORY            messages seeded per user / session (default 10, fake only;
+                             the emulator is seeded by bench.load_test)
+"""
+
+import os
+
+BENCH_FIRESTORE = os.getenv('BENCH_FIRESTORE', 'fake')
+
+if BENCH_FIRESTORE == 'emulator':
+    from bench.emulator import install_emulator_firebase_config
+    install_emulator_firebase_config()
+else:
+    from bench.fakes import install_fake_firebase_config, FakeFirebaseService, AsyncFakeFirebaseService
+    install_fake_firebase_config()
+
+import app as flask_app  # noqa: E402
+
+fake_firebase = None
+if BENCH_FIRESTORE != 'emulator':
+    fake_firebase = FakeFirebaseService(latency=float(os.getenv('BENCH_FIRESTORE_LATENCY', '0.02')))
+    fake_firebase.seed_users(int(os.getenv('BENCH_USERS', '200')), history=int(os.getenv('BENCH_HISTORY', '10')))
+    flask_app.firebase_service = fake_firebase
+
+wsgi_app = flask_app.app
+
+
+def _build_asgi_app():
+    import asgi
+    if fake_firebase is not None:
+        asgi.async_firebase_service = AsyncFakeFirebaseService(fake_firebase)
+    return asgi.app
+
+
+asgi_app = _build_asgi_app() if os.getenv('BENCH_ASGI', '1') == '1' else None
@@ -0,0 +1,119 @@
+"""
+Sync vs Async Load Test
+Starts the fake OpenAI server, then serves the backend twice with in-memory
+Firestore fakes: once under sync Gunicorn workers (app:app) and once under a
+single Uvicorn worker (asgi:app). Drives POST /api/chat at a fixed
+concurrency and reports throughput and latency percentiles for each.
+
+Usage:
+    python -m bench.sync_vs_async --concurrency 100 --requests 500 --sync-workers 4
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.fake_openai import start_server
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+async def drive(base_url, concurrency, requests, users):
+    """Send `requests` chats with at most `concurrency` in flight"""
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                start = time.perf_counter()
+                resp = await client.post('/api/chat', headers={'X-API-Key': '321'}, json={
+                    'user_id': f"user-{i % users}",
+                    'message': 'How was your day?',
+                    'chat_session_id': f"session-{i % users}"
+                })
+                latencies.append(time.perf_counter() - start)
+                if resp.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return latencies, errors, elapsed
+
+
+def wait_for_health(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(base_url + '/health', timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become healthy")
+
+
+def run_server(cmd, env, port, args):
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_health(base_url)
+        return asyncio.run(drive(base_url, args.concurrency, args.requests, args.users))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--sync-workers', type=int, default=4)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--run-latency', type=float, default=1.0, help='Fake OpenAI seconds per run')
+    parser.add_argument('--firestore-latency', type=float, default=0.02, help='Fake Firestore seconds per call')
+    parser.add_argument('--port', type=int, default=8090)
+    args = parser.parse_args()
+
+    _, _, openai_url = start_server(run_latency=args.run_latency)
+    env = dict(os.environ, OPENAI_BASE_URL=openai_url, OPENAI_API_KEY='fake', OPENAI_ASSISTANT_ID='asst_fake',
+               BENCH_FIRESTORE_LATENCY=str(args.firestore_latency), BENCH_USERS=str(args.users))
+
+    modes = {
+        f"sync ({args.sync_workers} workers)": (
+            ['gunicorn', '-w', str(args.sync_workers), '-b', f"127.0.0.1:{args.port}", 'bench.stub_app:wsgi_app'],
+            dict(env, BENCH_ASGI='0')),
+        'async (1 worker)': (
+            ['gunicorn', '-k', 'uvicorn.workers.UvicornWorker', '-w', '1', '-b', f"127.0.0.1:{args.port}",
+             'bench.stub_app:asgi_app'],
+            env),
+    }
+
+    print(f"{args.requests} chats, concurrency {args.concurrency}, run latency {args.run_latency:.2f}s")
+    print(f"{'mode':<22} {'req/s':>8} {'p50 (s)':>9} {'p95 (s)':>9} {'p99 (s)':>9} {'errors':>7}")
+    for name, (cmd, mode_env) in modes.items():
+        latencies, errors, elapsed = run_server(cmd, mode_env, args.port, args)
+        print(f"{name:<22} {len(latencies) / elapsed:>8.1f} {percentile(latencies, 50):>9.3f} "
+              f"{percentile(latencies, 95):>9.3f} {percentile(latencies, 99):>9.3f} {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+"""
+Environment
+Loads .env into os.environ exactly once per process. Import this before any
+module that reads configuration at import time.
+"""
+
+from dotenv import load_dotenv
+
+load_dotenv()
@@ -1,19 +1,40 @@
 """
 Firebase Configuration Module
-Initializes Firebase Admin SDK with credentials from environment variables
+Initializes Firebase Admin SDK with credentials from environment variables.
+
+Nothing is initialized at import time:
+- initialize_firebase() parses the credentials and registers the Admin SDK app
+  (no network). Safe to call in the Gunicorn master with preload_app, so
+  forked workers share it.
+- get_db() / get_async_db() create the Firestore clients on first use, in the
+  process that uses them (gRPC channels must not be created before a fork).
+`config.firebase_config.db` still works and resolves to get_db().
 """
 
 import os
 import re
-import firebase_admin
-from firebase_admin import credentials, firestore
-from dotenv import load_dotenv
+import threading
+
+import config.env  # noqa: F401  (loads .env once)
 
-# Load environment variables
-load_dotenv()
+_app = None
+_db = None
+_async_db = None
+_lock = threading.Lock()
 
 def initialize_firebase():
-    """Initialize Firebase Admin SDK"""
+    """Initialize Firebase Admin SDK (once). Returns the firebase_admin App."""
+    global _app
+    if _app is not None:
+        return _app
+    with _lock:
+        if _app is None:
+            _app = _initialize_app()
+    return _app
+
+def _initialize_app():
+    import firebase_admin
+    from firebase_admin import credentials
     
     # Get and sanitize private key
     private_key = os.getenv("FIREBASE_PRIVATE_KEY", "")
@@ -49,9 +70,35 @@ def initialize_firebase():
     
     # Initialize Firebase
     cred = credentials.Certificate(firebase_credentials)
-    firebase_admin.initialize_app(cred)
+    return firebase_admin.initialize_app(cred)
     
-    return firestore.client()
+def get_db():
+    """Return the Firestore client, initializing Firebase on first use"""
+    global _db
+    if _db is None:
+        app = initialize_firebase()
+        with _lock:
+            if _db is None:
+                from firebase_admin import firestore
+                _db = firestore.client(app)
+    return _db
+
+def get_async_db():
+    """
+    Return the async Firestore client (used by the ASGI chat path).
+    Created on first use so sync-only deployments never open the extra channel.
+    """
+    global _async_db
+    if _async_db is None:
+        app = initialize_firebase()
+        with _lock:
+            if _async_db is None:
+                from firebase_admin import firestore_async
+                _async_db = firestore_async.client(app)
+    return _async_db
 
-# Initialize Firestore client
-db = initialize_firebase()
+def __getattr__(name):
+    # Backwards compatible `from config.firebase_config import db` (initializes on access)
+    if name == 'db':
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
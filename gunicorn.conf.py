@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration
+Loaded automatically when gunicorn is started from the project root.
+"""
+
+import os
+
+# Leave time for queued Firestore writes to drain when a worker is recycled
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# GUNICORN_PRELOAD=1: import the app once in the master and fork workers from it
+# (imports and parsed credentials are shared copy-on-write). Clients, pools and
+# background threads are all created on first use, so each worker gets its own.
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+
+def when_ready(server):
+    """With preload, set up the Firebase Admin app (no network) before forking"""
+    if not preload_app:
+        return
+    import sys
+    firebase_config = sys.modules.get('config.firebase_config')
+    if firebase_config is not None:
+        try:
+            firebase_config.initialize_firebase()
+        except Exception as e:
+            server.log.warning(f"Firebase pre-initialization failed: {e}")
+
+
+def worker_exit(server, worker):
+    """Drain pending background Firestore writes and session rollups, then flush queued log records"""
+    import sys
+    app_module = sys.modules.get('app')
+    if app_module is not None and hasattr(app_module, 'persistence_executor'):
+        app_module.persistence_executor.shutdown()
+    firebase_service = sys.modules.get('services.firebase_service')
+    if firebase_service is not None:
+        firebase_service.flush_session_rollups(force=True)
+    logger_module = sys.modules.get('services.logger')
+    if logger_module is not None:
+        logger_module.shutdown_logging()
@@ -0,0 +1,101 @@
+"""
+Backfill Session Counters
+One-off job that seeds chat_sessions/{session_id}.message_count and
+last_message_at from existing messages, so counters maintained by
+FirebaseService.commit_turn start from the right value.
+
+Scans the 'history' collection group once (projected to chat_session_id and
+timestamp), aggregates per session and writes in batches. With
+SESSION_COUNTER_SHARDS > 1 the total is written to shard 0 and the other
+shards are reset to zero.
+
+The counts are written as absolute values, so an Increment committed by a
+live chat turn between the scan and the write is lost (or counted twice).
+Run it with chat writers stopped (scale the API to zero or put it in
+maintenance) and restart them afterwards.
+
+Usage:
+    python -m scripts.backfill_session_counters [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.firebase_config import db
+from services.firebase_service import SESSION_COUNTER_SHARDS
+
+BATCH_SIZE = 400  # Firestore allows 500 writes per batch
+
+
+def collect_counters():
+    """Return {session_id: {'message_count': n, 'last_message_at': ts}}"""
+    counters = {}
+    scanned = 0
+    for doc in db.collection_group('history').select(['chat_session_id', 'timestamp']).stream():
+        scanned += 1
+        data = doc.to_dict()
+        session_id = data.get('chat_session_id')
+        if not session_id:
+            continue
+        entry = counters.setdefault(session_id, {'message_count': 0, 'last_message_at': None})
+        entry['message_count'] += 1
+        timestamp = data.get('timestamp')
+        if timestamp and (entry['last_message_at'] is None or timestamp > entry['last_message_at']):
+            entry['last_message_at'] = timestamp
+    print(f"Scanned {scanned} messages across {len(counters)} sessions")
+    return counters
+
+
+def write_counters(counters):
+    batch = db.batch()
+    pending = 0
+    now = datetime.now()
+
+    for session_id, entry in counters.items():
+        session_ref = db.collection('chat_sessions').document(session_id)
+        batch.set(session_ref, {
+            'message_count': entry['message_count'],
+            'last_message_at': entry['last_message_at'],
+            'updated_at': now
+        }, merge=True)
+        pending += 1
+
+        if SESSION_COUNTER_SHARDS > 1:
+            for shard in range(SESSION_COUNTER_SHARDS):
+                batch.set(session_ref.collection('counter_shards').document(str(shard)), {
+                    'count': entry['message_count'] if shard == 0 else 0,
+                    'last_message_at': entry['last_message_at']
+                })
+                pending += 1
+
+        if pending >= BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='Only print the counters that would be written')
+    args = parser.parse_args()
+
+    counters = collect_counters()
+    if args.dry_run:
+        for session_id, entry in sorted(counters.items()):
+            print(f"{session_id}: {entry['message_count']} messages, last at {entry['last_message_at']}")
+        return
+
+    print("Writers must be stopped while this runs (see the module docstring)")
+    write_counters(counters)
+    print(f"✅ Backfilled counters for {len(counters)} sessions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Backfill Session Messages
+One-off job that copies existing messages from messages/{user_id}/history
+into chat_sessions/{session_id}/messages/{id}, the per-session layout read
+with SESSION_MESSAGES_LAYOUT=session.
+
+Run it after switching writers to SESSION_MESSAGES_LAYOUT=dual (so nothing
+written meanwhile is missed), then switch readers to 'session'. Copies keep
+the history document ID, so re-running it is safe.
+
+Usage:
+    python -m scripts.backfill_session_messages [--dry-run] [--session SESSION_ID]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.firebase_config import db
+from services.firebase_service import SESSION_MESSAGE_COPY_FIELDS
+
+BATCH_SIZE = 400  # Firestore allows 500 writes per batch
+
+
+def iter_messages(session_id=None):
+    """(session_id, copy) for every history message that belongs to a session"""
+    query = db.collection_group('history')
+    if session_id:
+        query = query.where('chat_session_id', '==', session_id)
+    for doc in query.select(SESSION_MESSAGE_COPY_FIELDS + ['chat_session_id']).stream():
+        data = doc.to_dict()
+        if not data.get('chat_session_id'):
+            continue
+        copy = {field: data.get(field) for field in SESSION_MESSAGE_COPY_FIELDS}
+        # The document ID is authoritative (save_message used to set 'id' in a second write)
+        copy['id'] = doc.id
+        copy['user_id'] = copy['user_id'] or doc.reference.parent.parent.id
+        yield data['chat_session_id'], copy
+
+
+def copy_messages(messages, dry_run=False):
+    """Write the copies in batches; returns (messages, sessions)"""
+    batch = db.batch()
+    pending = 0
+    copied = 0
+    sessions = set()
+
+    for session_id, message in messages:
+        copied += 1
+        sessions.add(session_id)
+        if dry_run:
+            continue
+        batch.set(db.collection('chat_sessions').document(session_id).collection('messages').document(message['id']), message)
+        pending += 1
+
+        if pending >= BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+    return copied, len(sessions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='Only count the messages that would be copied')
+    parser.add_argument('--session', help='Backfill a single session')
+    args = parser.parse_args()
+
+    copied, sessions = copy_messages(iter_messages(args.session), dry_run=args.dry_run)
+    if args.dry_run:
+        print(f"Would copy {copied} messages across {sessions} sessions")
+        return
+    print(f"✅ Copied {copied} messages across {sessions} sessions")
+
+
+if __name__ == '__main__':
+    main()
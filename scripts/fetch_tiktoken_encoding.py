@@ -0,0 +1,37 @@
+"""
+Fetch Tiktoken Encoding
+Build step that downloads the tiktoken encoding used by
+services/token_counter.py into TIKTOKEN_CACHE_DIR (default config/tiktoken),
+so token counts are exact and the app never downloads it at runtime.
+
+Run it after `pip install -r requirements.txt`, in the image or build
+command. Without it the app falls back to estimated counts.
+
+Usage:
+    python -m scripts.fetch_tiktoken_encoding [--encoding cl100k_base]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.token_counter import ENCODING_URLS, TIKTOKEN_CACHE_DIR, TOKEN_ENCODING, encoding_cache_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--encoding', default=TOKEN_ENCODING, choices=sorted(ENCODING_URLS))
+    args = parser.parse_args()
+
+    os.makedirs(TIKTOKEN_CACHE_DIR, exist_ok=True)
+    os.environ["TIKTOKEN_CACHE_DIR"] = TIKTOKEN_CACHE_DIR
+    import tiktoken
+    encoding = tiktoken.get_encoding(args.encoding)
+
+    print(f"✅ {args.encoding} ({encoding.n_vocab} tokens) cached at {encoding_cache_path(args.encoding)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Chat Turn
+Context loading decisions and turn assembly shared by the sync (app.py) and
+async (asgi.py) chat paths. Nothing here does I/O: each path fetches what a
+ChatContext asks for with its own Firestore / session cache clients and
+calls the LLM itself.
+
+Environment:
+- CONTEXT_REFRESH_TURNS:  re-inject the system context every N turns (default 50)
+- CONTEXT_TOKEN_BUDGET:   switch to the compact prompt above this many tokens (default 0 = never)
+"""
+
+import os
+
+from services.conversation_summary import CONVERSATION_SUMMARY, SUMMARY_WINDOW_MESSAGES
+from services.firebase_service import context_fields
+from services.llm_service import record_failure
+from services.logger import get_logger
+from services.metrics import span
+from services.prompt_builder import PromptBuilder
+from services.request_coalescer import merge_messages
+from services.token_counter import record_injection, record_skipped_injection
+
+logger = get_logger('chat_turn')
+
+# Re-inject the system context every N turns (it drifts out of the truncation window)
+CONTEXT_REFRESH_TURNS = int(os.getenv("CONTEXT_REFRESH_TURNS", "50"))
+# Switch to the compact prompt when the full one is larger than this many tokens (0 = never)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0")) or None
+if CONVERSATION_SUMMARY:
+    # Runs keep only SUMMARY_WINDOW_MESSAGES: re-inject before the context message
+    # (1 message, then 2 per turn) falls out of that window
+    CONTEXT_REFRESH_TURNS = min(CONTEXT_REFRESH_TURNS, max(1, (SUMMARY_WINDOW_MESSAGES - 1) // 2))
+
+
+def should_inject_context(thread_id, msg_count, stateless=False):
+    """
+    LOGIC: When to inject System Context?
+    1. Start of Thread (thread_id is None)
+    2. Limit Hit (msg_count > 0 and multiple of CONTEXT_REFRESH_TURNS)
+    A stateless LLM backend (Chat Completions) needs the context on every turn.
+    """
+    if stateless:
+        return True
+    if not thread_id:
+        logger.debug("No active thread found. Context injection REQUIRED.")
+        return True
+    elif msg_count > 0 and msg_count % CONTEXT_REFRESH_TURNS == 0:
+        logger.debug("Message limit hit (%s). Context refresh REQUIRED.", msg_count)
+        return True
+    return False
+
+
+def build_injection(user_data, preferences, prompt_version, msg_count):
+    """
+    Render the context to inject at turn msg_count.
+    Returns (system_prompt, context_record); the record is saved to thread metadata.
+    """
+    context = PromptBuilder.build_context(user_data, preferences, version_key=prompt_version,
+                                          token_budget=CONTEXT_TOKEN_BUDGET)
+    return context['prompt'], {
+        'hash': context['hash'],
+        'tokens': context['tokens'],
+        'msg_count': msg_count
+    }
+
+
+def context_is_current(thread_data, context_hash, stateless=False):
+    """True if this exact context was injected into the thread within the refresh window"""
+    if stateless:
+        return False
+    if not thread_data or thread_data.get('context_hash') != context_hash:
+        return False
+    injected_at = thread_data.get('context_msg_count')
+    return injected_at is not None and thread_data.get('msg_count', 0) - injected_at < CONTEXT_REFRESH_TURNS
+
+
+def default_preferences():
+    """Preferences used when the user has not completed onboarding"""
+    return {
+        'support_type': 'Supportive Friend',
+        'relationship_status': 'Unknown',
+        'topics_to_avoid': ''
+    }
+
+
+def conversation_summary(thread_data):
+    """Rolling summary to send with this turn's run (None when disabled or not written yet)"""
+    if not CONVERSATION_SUMMARY or not thread_data:
+        return None
+    return thread_data.get('summary')
+
+
+class ChatContext:
+    """
+    Everything a chat turn needs before calling the LLM, assembled from what
+    the caller fetched:
+
+        turn = ChatContext(chat_data, recent_thread, prompt_version, stateless)
+        if turn.user_data is None: ...                  # user does not exist
+        if turn.needs_history(cached_history): ...      # fetch recent messages
+        if turn.needs_preferences: ...                  # fetch preferences
+        context = turn.build(history, preferences)
+
+    chat_data is FirebaseService.get_chat_context(include_preferences=True).
+    recent_thread is the thread state left by the previous queued turn of this
+    user (see thread_after_turn); it wins over a possibly stale Firestore read.
+    prompt_version must be read BEFORE chat_data, so a concurrent profile
+    refresh can never pair new content with an old version.
+    """
+
+    def __init__(self, chat_data, recent_thread=None, prompt_version=None, stateless=False):
+        chat_data = chat_data or {}
+        self.chat_data = chat_data
+        self.user_data = chat_data.get('user')
+        # The previous turn's background write may not have landed yet
+        self.thread_data = recent_thread or chat_data.get('thread')
+        self.prompt_version = prompt_version
+        self.stateless = stateless
+        self.thread_id = (self.thread_data or {}).get('thread_id')
+        self.msg_count = (self.thread_data or {}).get('msg_count', 0)
+        self.inject = should_inject_context(self.thread_id, self.msg_count, stateless)
+
+    def needs_history(self, cached_history):
+        """True if the history must be read from Firestore (cache miss, and the run needs it)"""
+        return cached_history is None and (self.stateless or not self.inject)
+
+    @property
+    def needs_preferences(self):
+        """True if preferences are due and the batched lookup could not include them"""
+        return self.inject and 'preferences' not in self.chat_data
+
+    def build(self, history, preferences=None):
+        """The context dict used by the rest of the turn"""
+        system_prompt = None
+        context_record = None
+        if self.inject:
+            if 'preferences' in self.chat_data:
+                preferences = self.chat_data['preferences']
+            preferences = preferences or default_preferences()
+            logger.debug("Preferences retrieved: %s", preferences.get('supportType'))
+            with span('prompt_build'):
+                system_prompt, context_record = build_injection(self.user_data, preferences, self.prompt_version, self.msg_count)
+            if self.thread_id and context_is_current(self.thread_data, context_record['hash'], self.stateless):
+                logger.debug("Context unchanged since last injection. Skipping re-injection.")
+                record_skipped_injection()
+                system_prompt, context_record = None, None
+            else:
+                record_injection(context_record['tokens'])
+        else:
+            preferences = {}
+
+        return {
+            'user_data': self.user_data,
+            'thread_id': self.thread_id,
+            'msg_count': self.msg_count,
+            'preferences': preferences,
+            'system_prompt': system_prompt,
+            'context_record': context_record,
+            'prompt_version': self.prompt_version,
+            'history': history,
+            'thread_data': self.thread_data,
+            'summary': conversation_summary(self.thread_data)
+        }
+
+
+def llm_request(context, user_messages):
+    """
+    Keyword arguments for get_ai_response / stream_ai_response.
+    user_messages are the messages answered by this turn (see ChatCoalescer.submit).
+    """
+    return {
+        'user_message': merge_messages(user_messages),
+        'thread_id': context['thread_id'],
+        'system_prompt': context['system_prompt'],
+        'history': context['history'],
+        'summary': context['summary']
+    }
+
+
+def needs_new_thread(error, thread_id):
+    """True if the LLM call failed because the existing thread is unusable"""
+    return bool(thread_id) and getattr(error, 'failure_class', None) == 'invalid_thread'
+
+
+def new_thread_request(context, user_messages):
+    """
+    llm_request for the retry-on-a-new-thread fallback. A new thread starts
+    without context, so it is rendered again (and recorded on context).
+    """
+    logger.warning("Thread is no longer valid. Retrying with NEW thread...")
+    record_failure('new_threads')
+    system_prompt, context['context_record'] = build_injection(context['user_data'], context['preferences'], context['prompt_version'], 0)
+    record_injection(context['context_record']['tokens'])
+    return {**llm_request(context, user_messages), 'thread_id': None, 'system_prompt': system_prompt}
+
+
+def thread_after_turn(context, active_thread_id):
+    """Thread state once this turn is persisted (mirrors FirebaseService.commit_turn)"""
+    if active_thread_id != context['thread_id']:
+        return {'thread_id': active_thread_id, 'msg_count': 0, 'summary': context['summary'], 'summary_msg_count': 0,
+                'summary_through_at': (context['thread_data'] or {}).get('summary_through_at'),
+                **context_fields(context['context_record'])}
+    thread_data = dict(context['thread_data'] or {})
+    thread_data['msg_count'] = thread_data.get('msg_count', 0) + 1
+    if context['context_record']:
+        thread_data.update(context_fields(context['context_record']))
+    return thread_data
+
+
+def chat_response_data(user_id, context, ai_response, active_thread_id):
+    """Build the 'data' object returned by the chat endpoints"""
+    return {
+        'user_id': user_id,
+        'user_name': context['user_data'].get('name'),
+        'message': ai_response,
+        'preferences': context['preferences'],
+        'thread_id': active_thread_id
+    }
@@ -0,0 +1,141 @@
+"""
+Conversation Summary
+Rolling summary of the older part of a conversation, so each run only ships
+a short window of raw thread messages plus a compact summary instead of the
+last 50 messages.
+
+Every SUMMARY_REFRESH_TURNS turns, the messages that have left the window
+since the previous refresh are folded into the summary by one small Chat
+Completions call (in the background, after the turn). The summary is stored
+on the thread metadata document (users/{user_id}/metadata/openai_thread) and
+sent with each run as additional_instructions (Assistants) or as a system
+message (Chat Completions).
+
+summary_through_at (the timestamp of the last message folded in) bounds what
+a refresh reads, so nothing is summarized twice, also after a thread reset.
+A process runs at most one refresh per user at a time.
+
+Environment:
+- CONVERSATION_SUMMARY:     1 to enable (default 0)
+- SUMMARY_WINDOW_MESSAGES:  raw messages a run keeps once a summary exists (default 20)
+- SUMMARY_REFRESH_TURNS:    turns between refreshes (default 10)
+- SUMMARY_MAX_TOKENS:       upper bound on the summary length (default 400)
+- OPENAI_SUMMARY_MODEL:     model for the summary call (default OPENAI_CHAT_MODEL)
+"""
+
+import os
+import threading
+import time
+
+CONVERSATION_SUMMARY = os.getenv("CONVERSATION_SUMMARY", "0") == "1"
+SUMMARY_WINDOW_MESSAGES = int(os.getenv("SUMMARY_WINDOW_MESSAGES", "20"))
+SUMMARY_REFRESH_TURNS = int(os.getenv("SUMMARY_REFRESH_TURNS", "10"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "400"))
+
+# Never fold more than this many messages into one refresh (catch-up after a long gap)
+SUMMARY_MAX_MESSAGES = 200
+
+# A refresh still marked in flight after this long (dropped from the
+# persistence queue) no longer blocks new ones
+SUMMARY_REFRESH_TIMEOUT = 300
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and their "
+    "supportive AI companion. Merge the new messages into the existing summary. "
+    "Keep facts about the user, their situation, feelings, plans and anything the "
+    "AI promised or should follow up on. Drop small talk. Write in the third person, "
+    f"as compact notes, under {SUMMARY_MAX_TOKENS} tokens."
+)
+
+_stats = {
+    'refreshes': 0,
+    'failures': 0,
+    'messages_summarized': 0,
+    'summary_tokens': 0
+}
+_stats_lock = threading.Lock()
+
+_refreshing = {}  # user_id -> monotonic start of the in-flight refresh
+_refreshing_lock = threading.Lock()
+
+
+def summary_due(thread_data):
+    """
+    True when a refresh should be queued after this turn: enabled, the thread
+    holds more messages than the window, and SUMMARY_REFRESH_TURNS turns have
+    passed since the last summary.
+    """
+    if not CONVERSATION_SUMMARY or not thread_data:
+        return False
+    msg_count = thread_data.get('msg_count', 0)
+    summarized_through = thread_data.get('summary_msg_count') or 0
+    return msg_count * 2 > SUMMARY_WINDOW_MESSAGES and msg_count - summarized_through >= SUMMARY_REFRESH_TURNS
+
+
+def messages_to_fetch(summarized_through, msg_count, through_at=None):
+    """
+    History messages to read for a refresh: the window plus the turns that
+    left it since. When the read starts after through_at, everything it
+    returns is unsummarized (thread counts restart on a new thread), so it is
+    only capped.
+    """
+    if through_at is not None:
+        return SUMMARY_MAX_MESSAGES + SUMMARY_WINDOW_MESSAGES
+    left_window = min(max(msg_count - summarized_through, 0) * 2, SUMMARY_MAX_MESSAGES)
+    return left_window + SUMMARY_WINDOW_MESSAGES
+
+
+def summary_instructions(summary):
+    """Run instructions carrying the summary of the conversation before the window"""
+    return (
+        "CONVERSATION_SUMMARY: Earlier messages of this conversation are no longer "
+        f"shown. This is what happened before them:\n\n{summary}"
+    )
+
+
+def summary_request(previous_summary, messages):
+    """Chat Completions messages asking to fold messages (oldest first) into previous_summary"""
+    transcript = "\n".join(
+        f"{'User' if msg.get('type') == 'user' else 'AI'}: {msg.get('message', '')}"
+        for msg in messages if msg.get('type') in ('user', 'ai')
+    )
+    return [
+        {'role': 'system', 'content': SUMMARY_SYSTEM_PROMPT},
+        {'role': 'user', 'content': f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"}
+    ]
+
+
+def start_refresh(user_id):
+    """Claim the user's refresh slot; False if a refresh is already in flight"""
+    with _refreshing_lock:
+        now = time.monotonic()
+        started = _refreshing.get(user_id)
+        if started is not None and now - started < SUMMARY_REFRESH_TIMEOUT:
+            return False
+        _refreshing[user_id] = now
+        return True
+
+
+def finish_refresh(user_id):
+    with _refreshing_lock:
+        _refreshing.pop(user_id, None)
+
+
+def record_refresh(messages, tokens):
+    with _stats_lock:
+        _stats['refreshes'] += 1
+        _stats['messages_summarized'] += messages
+        _stats['summary_tokens'] += tokens
+
+
+def record_refresh_failure():
+    with _stats_lock:
+        _stats['failures'] += 1
+
+
+def summary_stats():
+    """Refresh counters; average_summary_tokens is the size runs now carry instead of history"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['average_summary_tokens'] = stats['summary_tokens'] / stats['refreshes'] if stats['refreshes'] else 0.0
+    return stats
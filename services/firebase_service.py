@@ -3,7 +3,271 @@ Firebase Service Module
 Handles all Firebase Firestore read operations
 """
 
-from config.firebase_config import db
+import os
+import random
+import threading
+import time
+
+from config.firebase_config import get_db, get_async_db
+from services.logger import get_logger
+from services.profile_cache import profile_cache, MISSING
+
+logger = get_logger('firebase')
+
+# Fields read for the messages endpoint (field projection: the rest of each
+# history document never leaves Firestore)
+SESSION_MESSAGE_FIELDS = ['message', 'type', 'timestamp']
+
+# Where session message reads come from. Every message lives in
+# messages/{user_id}/history; session reads there need a collection group query
+# on chat_session_id (an index across every user's history).
+# - history: only that layout
+# - dual:    also copy each message to chat_sessions/{session_id}/messages/{id}
+#            (same ID; run scripts/backfill_session_messages.py once), reads unchanged
+# - session: dual writes, and session reads go straight to that subcollection
+SESSION_MESSAGES_LAYOUTS = ('history', 'dual', 'session')
+SESSION_MESSAGES_LAYOUT = os.getenv("SESSION_MESSAGES_LAYOUT", "history").lower()
+if SESSION_MESSAGES_LAYOUT not in SESSION_MESSAGES_LAYOUTS:
+    raise ValueError(f"SESSION_MESSAGES_LAYOUT must be one of {', '.join(SESSION_MESSAGES_LAYOUTS)}")
+SESSION_MESSAGE_COPY_FIELDS = ['id', 'user_id', 'message', 'type', 'timestamp']
+
+# Per-session message counters on chat_sessions/{session_id}.
+# With more than one shard, increments are spread over
+# chat_sessions/{session_id}/counter_shards/{n} (distributed counter for hot
+# sessions) and rolled up onto the session document at most every
+# SESSION_ROLLUP_INTERVAL seconds.
+SESSION_COUNTER_SHARDS = int(os.getenv("SESSION_COUNTER_SHARDS", "1"))
+SESSION_ROLLUP_INTERVAL = float(os.getenv("SESSION_ROLLUP_INTERVAL", "30"))
+
+_last_rollup = {}
+# Throttled sessions still owed a rollup: { session_id: due (monotonic) }.
+# A flusher thread writes them once the interval is over, so the last turns of
+# a session are never left out of chat_sessions/{id}.
+_pending_rollups = {}
+_rollup_lock = threading.Lock()
+_rollup_flusher_pid = None
+
+
+def _ensure_rollup_flusher():
+    """Start the trailing-rollup thread in this process (call with _rollup_lock held)"""
+    global _rollup_flusher_pid
+    if _rollup_flusher_pid != os.getpid():
+        _rollup_flusher_pid = os.getpid()
+        threading.Thread(target=_rollup_flush_loop, daemon=True).start()
+
+
+def _rollup_flush_loop():
+    while True:
+        time.sleep(min(1.0, SESSION_ROLLUP_INTERVAL))
+        flush_session_rollups()
+
+
+def flush_session_rollups(force=False):
+    """
+    Write the trailing rollups that are due (all pending ones with force=True,
+    e.g. when a worker exits)
+    """
+    now = time.monotonic()
+    with _rollup_lock:
+        due = [sid for sid, due_at in _pending_rollups.items() if force or due_at <= now]
+        for sid in due:
+            del _pending_rollups[sid]
+            _last_rollup[sid] = now
+    for sid in due:
+        FirebaseService.roll_up_session(sid)
+
+# Preferences live in a subcollection queried with limit(1), so the document ID
+# is only known after the first query. Remembering it lets later lookups fetch
+# the preferences document in the same get_all round-trip as the user.
+_preferences_doc_ids = {}
+_PREFERENCES_DOC_IDS_MAX = 100000
+
+
+def _session_messages_ref(database, chat_session_id):
+    return database.collection('chat_sessions').document(chat_session_id).collection('messages')
+
+
+def _session_message(message_data):
+    """The per-session copy of a history message"""
+    return {field: message_data.get(field) for field in SESSION_MESSAGE_COPY_FIELDS}
+
+
+def _session_messages_query(database, session_id):
+    """Messages of one session in the configured layout (see SESSION_MESSAGES_LAYOUT)"""
+    if SESSION_MESSAGES_LAYOUT == 'session':
+        return _session_messages_ref(database, session_id)
+    # Collection Group Query: searches ALL 'history' subcollections
+    # REQUIRES INDEX on 'history' collection for field 'chat_session_id'
+    return database.collection_group('history').where('chat_session_id', '==', session_id)
+
+
+def _remember_preferences_doc_id(user_id, doc_id):
+    if len(_preferences_doc_ids) >= _PREFERENCES_DOC_IDS_MAX:
+        _preferences_doc_ids.clear()
+    _preferences_doc_ids[user_id] = doc_id
+
+
+# Read-through cache for user / preferences documents.
+# Entries are per worker: a change made elsewhere (or through another worker)
+# reaches this worker's chat turns within PROFILE_CACHE_TTL_SECONDS (default
+# 60), while the GET endpoints always read Firestore (FirebaseService.read_profile).
+# PROFILE_CACHE_LISTEN=1 attaches a Firestore snapshot listener to every cached
+# document so changes made elsewhere invalidate the entry immediately (one
+# listener per cached entry, released when the entry leaves the cache).
+PROFILE_CACHE_LISTEN = os.getenv("PROFILE_CACHE_LISTEN", "0") == "1"
+
+_profile_watches = {}
+_profile_watches_lock = threading.Lock()
+
+# Firestore update_time of each cached profile document (a re-read of an
+# unchanged document keeps its entry), kept exactly as long as the cache entry
+_profile_update_times = {}
+
+
+def _release_profile_watch(key):
+    with _profile_watches_lock:
+        watch = _profile_watches.pop(key, None)
+    if watch is not None:
+        # Unsubscribing from inside a listener callback can block the watch thread
+        threading.Thread(target=watch.unsubscribe, daemon=True).start()
+
+
+def _on_profile_evict(key):
+    _profile_update_times.pop(key, None)
+    _release_profile_watch(key)
+
+
+profile_cache.on_evict = _on_profile_evict
+
+
+def _watch_profile(key):
+    """Invalidate a cached profile document when Firestore reports a change"""
+    if not PROFILE_CACHE_LISTEN:
+        return
+    kind, user_id = key
+    with _profile_watches_lock:
+        if key in _profile_watches:
+            return
+        user_ref = get_db().collection('users').document(user_id)
+        target = user_ref if kind == 'user' else user_ref.collection('preferences').limit(1)
+        initial = [True]
+
+        def on_change(*_):
+            # The first callback delivers the current state, not a change
+            if initial[0]:
+                initial[0] = False
+                return
+            profile_cache.invalidate(key)
+
+        try:
+            _profile_watches[key] = target.on_snapshot(on_change)
+        except Exception as e:
+            logger.error("Error attaching profile listener for %s: %s", user_id, e)
+
+
+def _cache_profile(kind, user_id, value, update_time=None):
+    key = (kind, user_id)
+    if update_time is not None and _profile_update_times.get(key) == update_time and profile_cache.version(key) is not None:
+        # Unchanged document: keep the entry (and the prompt versions built on it)
+        return
+    _profile_update_times[key] = update_time
+    profile_cache.set(key, value)
+    _watch_profile(key)
+
+
+def _cached_profile(kind, user_id):
+    """Return a copy of the cached document (MISSING if not cached)"""
+    value = profile_cache.get((kind, user_id))
+    if value is MISSING or value is None:
+        return value
+    return dict(value)
+
+
+def _thread_from_data(data):
+    """Shape the openai_thread metadata document for callers"""
+    return {
+        'thread_id': data.get('thread_id'),
+        'msg_count': data.get('msg_count', 0),
+        # Last injected context (see FirebaseService.record_context_injection)
+        'context_hash': data.get('context_hash'),
+        'context_tokens': data.get('context_tokens'),
+        'context_msg_count': data.get('context_msg_count'),
+        # Rolling conversation summary (see services/conversation_summary.py)
+        'summary': data.get('summary'),
+        'summary_msg_count': data.get('summary_msg_count', 0),
+        'summary_through_at': data.get('summary_through_at')
+    }
+
+
+def context_fields(context):
+    """
+    Thread metadata fields describing an injected context.
+    context is {'hash', 'tokens', 'msg_count'} or None (nothing injected).
+    """
+    context = context or {}
+    return {
+        'context_hash': context.get('hash'),
+        'context_tokens': context.get('tokens'),
+        'context_msg_count': context.get('msg_count')
+    }
+
+
+def _chat_context_refs(database, user_id, include_preferences):
+    """
+    Document references for a batched chat context lookup.
+    Returns (refs, cached): documents served from the profile cache are not re-read.
+    """
+    user_ref = database.collection('users').document(user_id)
+    refs = {
+        'thread': user_ref.collection('metadata').document('openai_thread')
+    }
+    cached = {}
+    
+    user_data = _cached_profile('user', user_id)
+    if user_data is MISSING:
+        refs['user'] = user_ref
+    else:
+        cached['user'] = user_data
+    
+    if include_preferences:
+        preferences = _cached_profile('preferences', user_id)
+        if preferences is not MISSING:
+            cached['preferences'] = preferences
+        elif user_id in _preferences_doc_ids:
+            refs['preferences'] = user_ref.collection('preferences').document(_preferences_doc_ids[user_id])
+    return refs, cached
+
+
+def _chat_context_from_snapshots(user_id, refs, cached, snapshots):
+    """
+    Shape get_all() results like get_user / get_thread_data / get_user_preferences.
+    The 'preferences' key is only set when the preferences document was fetched.
+    """
+    by_path = {snap.reference.path: snap for snap in snapshots}
+    context = dict(cached)
+    
+    if 'user' in refs:
+        user_snap = by_path.get(refs['user'].path)
+        context['user'] = user_snap.to_dict() if user_snap and user_snap.exists else None
+        if context['user'] is not None:
+            _cache_profile('user', user_id, dict(context['user']), user_snap.update_time)
+    
+    thread_snap = by_path.get(refs['thread'].path)
+    if thread_snap and thread_snap.exists:
+        context['thread'] = _thread_from_data(thread_snap.to_dict())
+    else:
+        context['thread'] = None
+    
+    if 'preferences' in refs:
+        prefs_snap = by_path.get(refs['preferences'].path)
+        if prefs_snap and prefs_snap.exists:
+            context['preferences'] = prefs_snap.to_dict()
+            _cache_profile('preferences', user_id, dict(context['preferences']), prefs_snap.update_time)
+        else:
+            # Document was replaced: forget the ID and let the caller query again
+            _preferences_doc_ids.pop(user_id, None)
+    
+    return context
 
 class FirebaseService:
    
@@ -13,28 +277,77 @@ class FirebaseService:
         """
         Get user from users_mimik collection
         """
+        cached = _cached_profile('user', user_id)
+        if cached is not MISSING:
+            return cached
+        return FirebaseService.read_profile('user', user_id)[0]
+
+    @staticmethod
+    def read_profile(kind, user_id):
+        """
+        Read the 'user' / 'preferences' document from Firestore, never from the
+        profile cache, and refresh its cache entry. Endpoints that return the
+        profile to clients use this: another worker may have changed it since
+        this worker cached it.
+        Returns (data, version); version is the document's update_time (the
+        same in every worker), None when the document does not exist.
+        """
         try:
-            user_doc = db.collection('users').document(user_id).get()
+            user_ref = get_db().collection('users').document(user_id)
+            if kind == 'user':
+                doc = user_ref.get()
+                doc = doc if doc.exists else None
+            else:
+                # Preferences live in a subcollection (see _preferences_doc_ids)
+                doc = next(iter(user_ref.collection('preferences').limit(1).stream()), None)
+                if doc is not None:
+                    _remember_preferences_doc_id(user_id, doc.id)
             
-            if not user_doc.exists:
-                return None
+            if doc is None:
+                if kind == 'preferences':
+                    # Cache "no preferences" too; update-context invalidates it
+                    _cache_profile('preferences', user_id, None)
+                return None, None
             
-            return user_doc.to_dict()
+            data = doc.to_dict()
+            _cache_profile(kind, user_id, dict(data), doc.update_time)
+            return data, doc.update_time.isoformat() if doc.update_time else None
         except Exception as e:
-            print(f"Error fetching user {user_id}: {str(e)}")
+            logger.error("Error fetching %s for user %s: %s", kind, user_id, e)
+            return None, None
+
+    @staticmethod
+    def invalidate_user_cache(user_id):
+        """
+        Drop cached user / preferences documents (call after they change)
+        """
+        profile_cache.invalidate(('user', user_id))
+        profile_cache.invalidate(('preferences', user_id))
+
+    @staticmethod
+    def profile_version(user_id):
+        """
+        Version key of the cached user + preferences documents, or None if
+        either is not cached. Changes whenever either document is re-read.
+        """
+        user_version = profile_cache.version(('user', user_id))
+        prefs_version = profile_cache.version(('preferences', user_id))
+        if user_version is None or prefs_version is None:
             return None
+        return (user_id, user_version, prefs_version)
+
     @staticmethod
     def get_thread_id(user_id):
         """
         Get the active OpenAI Thread ID for a user
         """
         try:
-            doc = db.collection('users').document(user_id).collection('metadata').document('openai_thread').get()
+            doc = get_db().collection('users').document(user_id).collection('metadata').document('openai_thread').get()
             if doc.exists:
                 return doc.to_dict().get('thread_id')
             return None
         except Exception as e:
-            print(f"Error fetching thread ID for {user_id}: {str(e)}")
+            logger.error("Error fetching thread ID for %s: %s", user_id, e)
             return None
 
     @staticmethod
@@ -44,14 +357,14 @@ class FirebaseService:
         """
         try:
             from datetime import datetime
-            db.collection('users').document(user_id).collection('metadata').document('openai_thread').set({
+            get_db().collection('users').document(user_id).collection('metadata').document('openai_thread').set({
                 'thread_id': thread_id,
                 'msg_count': 0,
                 'updated_at': datetime.now()
             }, merge=True)
             return True
         except Exception as e:
-            print(f"Error saving thread ID for {user_id}: {str(e)}")
+            logger.error("Error saving thread ID for %s: %s", user_id, e)
             return False
 
     @staticmethod
@@ -60,17 +373,48 @@ class FirebaseService:
         Get thread_id and current message count
         """
         try:
-            doc = db.collection('users').document(user_id).collection('metadata').document('openai_thread').get()
+            doc = get_db().collection('users').document(user_id).collection('metadata').document('openai_thread').get()
             if doc.exists:
-                data = doc.to_dict()
-                return {
-                    'thread_id': data.get('thread_id'),
-                    'msg_count': data.get('msg_count', 0)
-                }
+                return _thread_from_data(doc.to_dict())
             return None
         except Exception:
             return None
 
+    @staticmethod
+    def record_context_injection(user_id, context):
+        """
+        Remember the context just injected into the user's thread
+        (context = {'hash', 'tokens', 'msg_count'}), so an unchanged prompt
+        is not injected again.
+        """
+        try:
+            get_db().collection('users').document(user_id).collection('metadata').document('openai_thread').set(
+                context_fields(context), merge=True)
+            return True
+        except Exception as e:
+            logger.error("Error recording context injection for %s: %s", user_id, e)
+            return False
+
+    @staticmethod
+    def save_conversation_summary(user_id, summary, msg_count, through_at=None):
+        """
+        Store the rolling conversation summary on the thread metadata,
+        covering the conversation up to turn msg_count and the message
+        timestamped through_at
+        """
+        try:
+            from datetime import datetime
+            get_db().collection('users').document(user_id).collection('metadata').document('openai_thread').set({
+                'summary': summary,
+                'summary_msg_count': msg_count,
+                'summary_through_at': through_at,
+                'summary_updated_at': datetime.now()
+            }, merge=True)
+            return True
+        except Exception as e:
+            logger.error("Error saving conversation summary for %s: %s", user_id, e)
+            return False
+
     @staticmethod
     def increment_thread_count(user_id):
         """
@@ -78,38 +422,51 @@ class FirebaseService:
         """
         try:
             from firebase_admin import firestore
-            ref = db.collection('users').document(user_id).collection('metadata').document('openai_thread')
+            ref = get_db().collection('users').document(user_id).collection('metadata').document('openai_thread')
             ref.update({'msg_count': firestore.Increment(1)})
         except Exception as e:
-            print(f"Error incrementing thread count: {e}")
+            logger.error("Error incrementing thread count: %s", e)
 
     @staticmethod
     def get_user_preferences(user_id):
         """
         Get user preferences from subcollection under users_mimik/{user_id}/preferences
         """
+        cached = _cached_profile('preferences', user_id)
+        if cached is not MISSING:
+            return cached
+        return FirebaseService.read_profile('preferences', user_id)[0]
+    
+    @staticmethod
+    def get_chat_context(user_id, include_preferences=False):
+        """
+        Fetch the user doc, thread metadata doc and (when requested and its
+        document ID is known) the preferences doc in a single get_all round-trip.
+        Returns {'user': ..., 'thread': ..., ['preferences': ...]} or None on error.
+        """
         try:
-            # Get preferences from subcollection
-            prefs_docs = list(db.collection('users').document(user_id).collection('preferences').limit(1).stream())
-            
-            if prefs_docs:
-                return prefs_docs[0].to_dict()
-            
-            return None
+            db = get_db()
+            refs, cached = _chat_context_refs(db, user_id, include_preferences)
+            snapshots = db.get_all(list(refs.values()))
+            return _chat_context_from_snapshots(user_id, refs, cached, snapshots)
         except Exception as e:
-            print(f"Error fetching preferences for user {user_id}: {str(e)}")
+            logger.error("Error fetching chat context for %s: %s", user_id, e)
             return None
     
     @staticmethod
-    def get_user_messages(user_id, limit=10):
+    def get_user_messages(user_id, limit=10, after=None):
         """
         Get last N messages for a user from messages/{user_id}/history
+        (only those timestamped after `after`, when given)
         """
         try:
             from google.cloud import firestore
             
             # Query history subcollection
-            messages_query = db.collection('messages').document(user_id).collection('history')\
+            messages_query = get_db().collection('messages').document(user_id).collection('history')
+            if after is not None:
+                messages_query = messages_query.where('timestamp', '>', after)
+            messages_query = messages_query\
                 .order_by('timestamp', direction=firestore.Query.DESCENDING)\
                 .limit(limit)\
                 .stream()
@@ -130,32 +487,39 @@ class FirebaseService:
             return messages
             
         except Exception as e:
-            print(f"Error fetching messages for user {user_id}: {str(e)}")
+            logger.error("Error fetching messages for user %s: %s", user_id, e)
             return []
     
     @staticmethod
     def get_chat_session(session_id):
       
         try:
-            session_doc = db.collection('chat_sessions').document(session_id).get()
+            session_doc = get_db().collection('chat_sessions').document(session_id).get()
             
             if not session_doc.exists:
                 return None
             
             return session_doc.to_dict()
         except Exception as e:
-            print(f"Error fetching session {session_id}: {str(e)}")
+            logger.error("Error fetching session %s: %s", session_id, e)
             return None
     
     def save_message(self, user_id, chat_session_id, message_text, message_type='user'):
         """
         Save a message to Firestore in messages/{user_id}/history
+        (and its per-session copy, see SESSION_MESSAGES_LAYOUT)
         """
         try:
             from datetime import datetime
             
+            db = get_db()
+            # Save to: messages/{user_id}/history
+            # Pre-allocate the ID so 'id' is written with the document
+            doc_ref = db.collection('messages').document(user_id).collection('history').document()
+            
             # Construct message data
             message_data = {
+                'id': doc_ref.id,
                 'user_id': user_id,
                 'message': message_text,
                 'type': message_type,
@@ -165,66 +529,350 @@ class FirebaseService:
                 'chat_session_id': chat_session_id
             }
             
-            # Save to: messages/{user_id}/history
-            # We use .add() to generate a random ID
-            _, doc_ref = db.collection('messages').document(user_id).collection('history').add(message_data)
-            
-            # Update the ID field in the document itself to match doc ID (good practice)
-            doc_ref.update({'id': doc_ref.id})
+            if SESSION_MESSAGES_LAYOUT != 'history' and chat_session_id:
+                batch = db.batch()
+                batch.set(doc_ref, message_data)
+                batch.set(_session_messages_ref(db, chat_session_id).document(doc_ref.id), _session_message(message_data))
+                batch.commit()
+            else:
+                doc_ref.set(message_data)
             
             return doc_ref.id
         except Exception as e:
-            print(f"Error saving message: {str(e)}")
+            logger.error("Error saving message: %s", e)
+            return None
+
+    def commit_turn(self, user_id, chat_session_id, user_text, ai_text, new_thread_id=None, context=None):
+        """
+        Persist a full chat turn in a single WriteBatch (one round-trip, atomic):
+        - user message(s) and AI message in messages/{user_id}/history (IDs pre-allocated),
+          plus their per-session copies unless SESSION_MESSAGES_LAYOUT is 'history'.
+          user_text may be a list: the messages of a merged turn, one document each
+        - thread metadata: reset for a new thread, otherwise increment msg_count;
+          context ({'hash', 'tokens', 'msg_count'}) records the context injected this turn
+        Returns the message IDs (user messages first, AI last) or None on failure.
+        """
+        try:
+            from datetime import datetime, timedelta
+            from firebase_admin import firestore
+            
+            db = get_db()
+            batch = db.batch()
+            now = datetime.now()
+            
+            # Pre-allocate document IDs so 'id' is written with the document
+            history = db.collection('messages').document(user_id).collection('history')
+            user_texts = [user_text] if isinstance(user_text, str) else list(user_text)
+            messages = []
+            for offset, (text, msg_type) in enumerate([(text, 'user') for text in user_texts] + [(ai_text, 'ai')]):
+                ref = history.document()
+                messages.append((ref, {
+                    'id': ref.id,
+                    'user_id': user_id,
+                    'message': text,
+                    'type': msg_type,
+                    # Stored in sending order, the AI reply always last
+                    'timestamp': now + timedelta(microseconds=offset),
+                    'is_typing': False,
+                    'metadata': {},
+                    'chat_session_id': chat_session_id
+                }))
+            last_message_at = messages[-1][1]['timestamp']
+            
+            # Per-session copies, same IDs (see SESSION_MESSAGES_LAYOUT)
+            session_messages = None
+            if SESSION_MESSAGES_LAYOUT != 'history' and chat_session_id:
+                session_messages = _session_messages_ref(db, chat_session_id)
+            for ref, message in messages:
+                batch.set(ref, message)
+                if session_messages is not None:
+                    batch.set(session_messages.document(ref.id), _session_message(message))
+            
+            thread_ref = db.collection('users').document(user_id).collection('metadata').document('openai_thread')
+            if new_thread_id:
+                # Same fields as save_thread_id: new thread starts counting from 0
+                # A new thread has no context until one is injected into it
+                # (the conversation summary is kept, counted from the new thread's start)
+                batch.set(thread_ref, {
+                    'thread_id': new_thread_id,
+                    'msg_count': 0,
+                    'summary_msg_count': 0,
+                    'updated_at': now,
+                    **context_fields(context)
+                }, merge=True)
+            else:
+                # We increment once per interaction (User + AI turn)
+                thread_update = {'msg_count': firestore.Increment(1)}
+                if context:
+                    thread_update.update(context_fields(context))
+                batch.set(thread_ref, thread_update, merge=True)
+            
+            # Session counters: +1 per message of the turn
+            if chat_session_id:
+                session_ref = db.collection('chat_sessions').document(chat_session_id)
+                if SESSION_COUNTER_SHARDS > 1:
+                    shard_ref = session_ref.collection('counter_shards').document(str(random.randrange(SESSION_COUNTER_SHARDS)))
+                    batch.set(shard_ref, {
+                        'count': firestore.Increment(len(messages)),
+                        'last_message_at': last_message_at
+                    }, merge=True)
+                else:
+                    batch.set(session_ref, {
+                        'message_count': firestore.Increment(len(messages)),
+                        'last_message_at': last_message_at,
+                        'updated_at': now
+                    }, merge=True)
+            
+            batch.commit()
+            return tuple(ref.id for ref, _ in messages)
+        except Exception as e:
+            logger.error("Error committing chat turn for %s: %s", user_id, e)
             return None
 
-    def get_session_messages(self, session_id, limit=50):
+    def get_session_messages(self, session_id, limit=50, before=None, after=None):
         """
-        Get messages for a specific session using Collection Group Query on 'history'
+        Get messages for a specific session (from chat_sessions/{id}/messages with
+        SESSION_MESSAGES_LAYOUT=session, else a collection group query on 'history').
+        Only SESSION_MESSAGE_FIELDS are read. Returns up to `limit` messages, oldest first:
+        - before: the newest messages older than this timestamp (page backwards)
+        - after:  the oldest messages newer than this timestamp (page forwards / "since")
+        - neither: the latest messages
         """
         try:
             from google.cloud import firestore
             
-            # Collection Group Query: searches ALL 'history' subcollections
-            # REQUIRES INDEX on 'history' collection for field 'chat_session_id'
-            messages = db.collection_group('history')\
-                .where('chat_session_id', '==', session_id)\
-                .order_by('timestamp', direction=firestore.Query.DESCENDING)\
-                .limit(limit)\
-                .stream()
+            query = _session_messages_query(get_db(), session_id).select(SESSION_MESSAGE_FIELDS)
+            
+            if after is not None:
+                query = query.order_by('timestamp', direction=firestore.Query.ASCENDING)\
+                    .start_after({'timestamp': after})
+            else:
+                query = query.order_by('timestamp', direction=firestore.Query.DESCENDING)
+                if before is not None:
+                    query = query.start_after({'timestamp': before})
                 
             formatted_messages = []
-            for msg in messages:
+            for msg in query.limit(limit).stream():
                 data = msg.to_dict()
                 data['id'] = msg.id
                 formatted_messages.append(data)
                 
-            return sorted(formatted_messages, key=lambda x: x.get('timestamp', ''))
+            # Newest-first queries come back in reverse order
+            if after is None:
+                formatted_messages.reverse()
+            return formatted_messages
             
         except Exception as e:
-            print(f"Error getting session messages: {str(e)}")
-            print("NOTE: A Collection Group Index is REQUIRED on 'history' collection (field: chat_session_id).")
+            logger.error("Error getting session messages: %s", e)
+            if SESSION_MESSAGES_LAYOUT != 'session':
+                logger.warning("NOTE: A Collection Group Index is REQUIRED on 'history' collection (field: chat_session_id).")
             return []
     
+    @staticmethod
+    def get_session_version(session_id):
+        """
+        Timestamp of the newest message in a session (the ETag version of its
+        message pages): a single-document query projected to 'timestamp'.
+        Returns None for an empty session or on error.
+        """
+        try:
+            from google.cloud import firestore
+            
+            newest = _session_messages_query(get_db(), session_id)\
+                .order_by('timestamp', direction=firestore.Query.DESCENDING)\
+                .select(['timestamp'])\
+                .limit(1)\
+                .stream()
+            for msg in newest:
+                return str(msg.to_dict().get('timestamp'))
+            return None
+        except Exception as e:
+            logger.error("Error getting session version: %s", e)
+            return None
+    
+    @staticmethod
+    def get_session_counters(chat_session_id):
+        """
+        Get message_count and last_message_at for a session from its counters.
+        Sums the counter shards when sharding is enabled.
+        """
+        try:
+            session_ref = get_db().collection('chat_sessions').document(chat_session_id)
+            if SESSION_COUNTER_SHARDS > 1:
+                count = 0
+                last_message_at = None
+                for shard in session_ref.collection('counter_shards').stream():
+                    data = shard.to_dict()
+                    count += data.get('count', 0)
+                    shard_last = data.get('last_message_at')
+                    if shard_last and (last_message_at is None or shard_last > last_message_at):
+                        last_message_at = shard_last
+                return {'message_count': count, 'last_message_at': last_message_at}
+            
+            session_doc = session_ref.get()
+            data = session_doc.to_dict() if session_doc.exists else {}
+            return {
+                'message_count': data.get('message_count', 0),
+                'last_message_at': data.get('last_message_at')
+            }
+        except Exception as e:
+            logger.error("Error fetching session counters for %s: %s", chat_session_id, e)
+            return None
+
     @staticmethod
     def update_session_metadata(chat_session_id):
+        """
+        Keep chat_sessions/{id}.message_count / last_message_at current.
+        commit_turn maintains them directly with a single counter, so this only
+        rolls up sharded counters, at most once per SESSION_ROLLUP_INTERVAL per
+        session. A throttled call schedules a trailing rollup at the end of the
+        interval, so turns after the last rollup are written back too.
+        """
+        if not chat_session_id or SESSION_COUNTER_SHARDS <= 1:
+            return
+        
+        with _rollup_lock:
+            now = time.monotonic()
+            last = _last_rollup.get(chat_session_id, float('-inf'))
+            if now - last < SESSION_ROLLUP_INTERVAL:
+                _pending_rollups.setdefault(chat_session_id, last + SESSION_ROLLUP_INTERVAL)
+                _ensure_rollup_flusher()
+                return
+            _last_rollup[chat_session_id] = now
+            _pending_rollups.pop(chat_session_id, None)
+            # Bounded: forget sessions not rolled up recently
+            if len(_last_rollup) > 10000:
+                for sid, ts in list(_last_rollup.items()):
+                    if now - ts >= SESSION_ROLLUP_INTERVAL and sid not in _pending_rollups:
+                        del _last_rollup[sid]
+        
+        FirebaseService.roll_up_session(chat_session_id)
+
+    @staticmethod
+    def roll_up_session(chat_session_id):
+        """Sum the counter shards of a session onto chat_sessions/{id}"""
         try:
             from datetime import datetime
             
-            # Count using collection group query
-            # Note: aggregating counts in client-side code is expensive for large sets
-            # ideally use distributed counters, but for low volume this is ok
-            docs = db.collection_group('history')\
-                .where('chat_session_id', '==', chat_session_id)\
-                .stream()
+            counters = FirebaseService.get_session_counters(chat_session_id)
+            if counters is None:
+                return
                 
-            count = sum(1 for _ in docs)
+            get_db().collection('chat_sessions').document(chat_session_id).set({
+                'last_message_at': counters['last_message_at'],
+                'updated_at': datetime.now(),
+                'message_count': counters['message_count']
+            }, merge=True)
             
-            # Update session (Uncomment if you use chat_sessions collection)
-            # db.collection('chat_sessions').document(chat_session_id).update({
-            #     'last_message_at': datetime.now(),
-            #     'updated_at': datetime.now(),
-            #     'message_count': count
-            # })
+        except Exception as e:
+            logger.error("Error updating session metadata: %s", e)
+
+
+class AsyncFirebaseService:
+    """
+    Non-blocking Firestore reads for the async (ASGI) chat path.
+    Mirrors the read methods of FirebaseService used by /api/chat.
+    """
+
+    @staticmethod
+    async def get_user(user_id):
+        """
+        Get user from users collection
+        """
+        cached = _cached_profile('user', user_id)
+        if cached is not MISSING:
+            return cached
+        try:
+            user_doc = await get_async_db().collection('users').document(user_id).get()
+            
+            if not user_doc.exists:
+                return None
             
+            user_data = user_doc.to_dict()
+            _cache_profile('user', user_id, dict(user_data), user_doc.update_time)
+            return user_data
         except Exception as e:
-            print(f"Error updating session metadata: {str(e)}")
+            logger.error("Error fetching user %s: %s", user_id, e)
+            return None
+
+    @staticmethod
+    async def get_thread_data(user_id):
+        """
+        Get thread_id and current message count
+        """
+        try:
+            doc = await get_async_db().collection('users').document(user_id).collection('metadata').document('openai_thread').get()
+            if doc.exists:
+                return _thread_from_data(doc.to_dict())
+            return None
+        except Exception:
+            return None
+
+    @staticmethod
+    async def get_chat_context(user_id, include_preferences=False):
+        """
+        Async version of FirebaseService.get_chat_context (single get_all round-trip)
+        """
+        try:
+            async_db = get_async_db()
+            refs, cached = _chat_context_refs(async_db, user_id, include_preferences)
+            snapshots = [snap async for snap in async_db.get_all(list(refs.values()))]
+            return _chat_context_from_snapshots(user_id, refs, cached, snapshots)
+        except Exception as e:
+            logger.error("Error fetching chat context for %s: %s", user_id, e)
+            return None
+
+    @staticmethod
+    async def get_user_preferences(user_id):
+        """
+        Get user preferences from subcollection under users/{user_id}/preferences
+        """
+        cached = _cached_profile('preferences', user_id)
+        if cached is not MISSING:
+            return cached
+        try:
+            query = get_async_db().collection('users').document(user_id).collection('preferences').limit(1)
+            async for prefs_doc in query.stream():
+                _remember_preferences_doc_id(user_id, prefs_doc.id)
+                preferences = prefs_doc.to_dict()
+                _cache_profile('preferences', user_id, dict(preferences), prefs_doc.update_time)
+                return preferences
+            _cache_profile('preferences', user_id, None)
+            return None
+        except Exception as e:
+            logger.error("Error fetching preferences for user %s: %s", user_id, e)
+            return None
+
+    @staticmethod
+    async def get_user_messages(user_id, limit=10, after=None):
+        """
+        Get last N messages for a user from messages/{user_id}/history
+        (only those timestamped after `after`, when given)
+        """
+        try:
+            from google.cloud import firestore
+            
+            messages_query = get_async_db().collection('messages').document(user_id).collection('history')
+            if after is not None:
+                messages_query = messages_query.where('timestamp', '>', after)
+            messages_query = messages_query\
+                .order_by('timestamp', direction=firestore.Query.DESCENDING)\
+                .limit(limit)
+            
+            messages = []
+            async for msg_doc in messages_query.stream():
+                msg_data = msg_doc.to_dict()
+                messages.append({
+                    'type': msg_data.get('type'),
+                    'message': msg_data.get('message'), 
+                    'timestamp': msg_data.get('timestamp')
+                })
+            
+            # Sort by timestamp (oldest first)
+            messages.sort(key=lambda x: x.get('timestamp') or 0)
+            
+            return messages
+            
+        except Exception as e:
+            logger.error("Error fetching messages for user %s: %s", user_id, e)
+            return []
@@ -0,0 +1,221 @@
+"""
+HTTP Clients
+Tuned keep-alive connection pools for the outbound APIs (OpenAI, Stripe).
+Each client is built once per worker process and shared by all request
+threads, so TLS handshakes are paid once per connection instead of per call.
+"""
+
+import importlib.util
+import os
+import re
+import threading
+import time
+import weakref
+
+from services.logger import get_logger
+from services.metrics import registry
+
+logger = get_logger('http')
+
+# OpenAI (httpx): pool size, keep-alive, timeouts, HTTP/2 when 'h2' is installed
+OPENAI_POOL_MAX_CONNECTIONS = int(os.getenv("OPENAI_POOL_MAX_CONNECTIONS", "100"))
+OPENAI_POOL_MAX_KEEPALIVE = int(os.getenv("OPENAI_POOL_MAX_KEEPALIVE", "20"))
+OPENAI_POOL_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_POOL_KEEPALIVE_EXPIRY", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "1") == "1"
+
+# Stripe (requests + urllib3): connections kept per host, timeout, network retries
+STRIPE_POOL_MAXSIZE = int(os.getenv("STRIPE_POOL_MAXSIZE", "10"))
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", "30"))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "2"))
+
+_lock = threading.Lock()
+# id(client) -> (name, client) for every live pooled client reported by
+# http_pool_stats() (several clients can share a name, e.g. one per LLMService)
+_pools = {}
+_request_counts = {}  # name -> requests sent
+_stripe_client = None
+_stripe_key = None
+
+# One series per API operation: object IDs in the path are collapsed to {id}
+openai_request_latency = registry.histogram(
+    'openai_request_duration_seconds',
+    'OpenAI API call duration until response headers (each run poll is one call)',
+    ('method', 'path', 'status')
+)
+_OPENAI_ID_SEGMENT = re.compile(r'/(?:asst|thread|run|msg|step|file|vs)_[A-Za-z0-9]+')
+
+
+def _http2_enabled():
+    if not OPENAI_HTTP2:
+        return False
+    if importlib.util.find_spec('h2') is None:
+        logger.warning("OPENAI_HTTP2=1 but the 'h2' package is not installed. Using HTTP/1.1.")
+        return False
+    return True
+
+
+def _register_pool(name, client):
+    """Report client's pool under name until the client is garbage collected"""
+    key = id(client)
+
+    def forget(ref):
+        # No lock: GC can run this in a thread that already holds _lock
+        if _pools.get(key, (None, None))[1] is ref:
+            _pools.pop(key, None)
+
+    _pools[key] = (name, weakref.ref(client, forget))
+
+
+def _count_request(name):
+    with _lock:
+        _request_counts[name] = _request_counts.get(name, 0) + 1
+
+
+def _observe_openai_response(response):
+    started = response.request.extensions.get('ammora_started')
+    if started is None:
+        return
+    path = _OPENAI_ID_SEGMENT.sub('/{id}', response.request.url.path)
+    openai_request_latency.observe(time.perf_counter() - started, method=response.request.method,
+                                   path=path, status=response.status_code)
+
+
+def _openai_client_kwargs(name, is_async):
+    import httpx
+
+    if is_async:
+        async def on_request(request):
+            _count_request(name)
+            request.extensions['ammora_started'] = time.perf_counter()
+
+        async def on_response(response):
+            _observe_openai_response(response)
+    else:
+        def on_request(request):
+            _count_request(name)
+            request.extensions['ammora_started'] = time.perf_counter()
+
+        def on_response(response):
+            _observe_openai_response(response)
+
+    return {
+        'limits': httpx.Limits(
+            max_connections=OPENAI_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=OPENAI_POOL_KEEPALIVE_EXPIRY
+        ),
+        'timeout': httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        'http2': _http2_enabled(),
+        'event_hooks': {'request': [on_request], 'response': [on_response]}
+    }
+
+
+def openai_http_client():
+    """Pooled httpx client for the OpenAI SDK (pass as OpenAI(http_client=...))"""
+    from openai import DefaultHttpxClient
+    client = DefaultHttpxClient(**_openai_client_kwargs('openai', is_async=False))
+    _register_pool('openai', client)
+    return client
+
+
+def async_openai_http_client():
+    """Pooled httpx client for AsyncOpenAI (pass as AsyncOpenAI(http_client=...))"""
+    from openai import DefaultAsyncHttpxClient
+    client = DefaultAsyncHttpxClient(**_openai_client_kwargs('openai_async', is_async=True))
+    _register_pool('openai_async', client)
+    return client
+
+
+def get_stripe_client():
+    """
+    Shared StripeClient backed by one pooled requests session.
+    Returns None if STRIPE_SECRET_KEY is not configured.
+    """
+    global _stripe_client, _stripe_key
+    api_key = os.getenv('STRIPE_SECRET_KEY')
+    if not api_key:
+        return None
+    if _stripe_client is not None and _stripe_key == api_key:
+        return _stripe_client
+
+    with _lock:
+        if _stripe_client is None or _stripe_key != api_key:
+            import requests
+            import stripe
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            # Stripe retries itself (with idempotency keys), so urllib3 must not
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=STRIPE_POOL_MAXSIZE, max_retries=0)
+            session.mount('https://', adapter)
+            session.hooks['response'].append(lambda response, *args, **kwargs: _count_request('stripe'))
+
+            _stripe_client = stripe.StripeClient(
+                api_key,
+                http_client=stripe.RequestsClient(timeout=STRIPE_TIMEOUT, session=session),
+                max_network_retries=STRIPE_MAX_NETWORK_RETRIES
+            )
+            _stripe_key = api_key
+            _register_pool('stripe', adapter)
+    return _stripe_client
+
+
+def _httpx_pool_stats(client):
+    """Open / idle connections of an httpx client (httpcore pool internals, best effort)"""
+    pool = getattr(getattr(client, '_transport', None), '_pool', None)
+    connections = list(getattr(pool, 'connections', None) or [])
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {
+        'connections': len(connections),
+        'idle': idle,
+        'active': len(connections) - idle,
+        'max_connections': OPENAI_POOL_MAX_CONNECTIONS,
+        'max_keepalive': OPENAI_POOL_MAX_KEEPALIVE
+    }
+
+
+def _urllib3_pool_stats(adapter):
+    """Checked-out / idle connections of a requests HTTPAdapter (urllib3 pools)"""
+    stats = {'connections_created': 0, 'idle': 0, 'active': 0, 'max_connections': STRIPE_POOL_MAXSIZE}
+    for key in list(adapter.poolmanager.pools.keys()):
+        host_pool = adapter.poolmanager.pools.get(key)
+        if host_pool is None:
+            continue
+        stats['connections_created'] += host_pool.num_connections
+        # The queue is pre-filled with None placeholders: whatever is missing is checked out
+        queued = list(host_pool.pool.queue)
+        stats['idle'] += sum(1 for conn in queued if conn is not None)
+        stats['active'] += max(0, host_pool.pool.maxsize - len(queued))
+    return stats
+
+
+def http_pool_stats():
+    """
+    Connection pool utilization and request counts per outbound API.
+    Pools of clients sharing a name are summed; 'clients' is how many there are.
+    """
+    with _lock:
+        pools = [(name, ref()) for name, ref in _pools.values()]
+        counts = dict(_request_counts)
+
+    stats = {}
+    for name, pool in pools:
+        if pool is None:
+            continue
+        try:
+            pool_stats = _urllib3_pool_stats(pool) if name == 'stripe' else _httpx_pool_stats(pool)
+        except Exception as e:
+            pool_stats = {'error': str(e)}
+        total = stats.setdefault(name, {'clients': 0})
+        total['clients'] += 1
+        for key, value in pool_stats.items():
+            if key.startswith('max_') or key == 'error':
+                # Per-client limits (the same for every client of a name)
+                total[key] = value
+            else:
+                total[key] = total.get(key, 0) + value
+    for name, total in stats.items():
+        total['requests'] = counts.get(name, 0)
+    return stats
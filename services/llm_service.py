@@ -1,127 +1,926 @@
 import os
 import time
 import json
-from openai import OpenAI
-from dotenv import load_dotenv
+import uuid
+import random
+import asyncio
+import threading
+import openai
+from openai import OpenAI, AsyncOpenAI
 
-load_dotenv()
+import config.env  # noqa: F401  (loads .env once)
+from services.conversation_summary import SUMMARY_MAX_TOKENS, SUMMARY_WINDOW_MESSAGES, summary_instructions, summary_request
+from services.http_clients import openai_http_client, async_openai_http_client
+from services.logger import get_logger
+from services.metrics import span
+from services.prompt_builder import PromptBuilder
 
-class LLMService:
-    """Service for LLM interactions using OpenAI Assistants API (Threads)"""
+logger = get_logger('llm')
+
+# Truncation Strategy: Keep last 50 messages.
+# Since we re-inject context when hitting 50, this is safe.
+TRUNCATION_STRATEGY = {
+    "type": "last_messages",
+    "last_messages": 50
+}
+
+# With a conversation summary (see services/conversation_summary.py) the
+# summary stands in for older messages, so runs keep a smaller window
+SUMMARY_TRUNCATION_STRATEGY = {
+    "type": "last_messages",
+    "last_messages": SUMMARY_WINDOW_MESSAGES
+}
+
+# Terminal run statuses that mean the assistant will not answer
+RUN_FAILED_STATUSES = ('failed', 'cancelled', 'expired', 'incomplete')
+
+# Conversation backends (LLM_BACKEND):
+# - assistants:       OpenAI threads + runs, OpenAI keeps the conversation
+# - chat_completions: one Chat Completions call per turn, built from our own
+#                     history (Firestore / session_cache) plus the system prompt
+LLM_BACKENDS = ('assistants', 'chat_completions')
+
+# Most recent history messages sent with each Chat Completions request
+CHAT_HISTORY_MESSAGES = int(os.getenv("CHAT_HISTORY_MESSAGES", "20"))
+
+
+def _conversation_id(thread_id):
+    """
+    Chat Completions has no threads: keep the caller's ID, or mint a local one
+    so callers can keep tracking msg_count per conversation.
+    """
+    return thread_id or f"chat_{uuid.uuid4().hex}"
+
+
+def _chat_messages(user_message, system_prompt, history, summary=None):
+    """Chat Completions messages: system prompt, summary, recent history, new user message"""
+    messages = []
+    history_messages = CHAT_HISTORY_MESSAGES
+    if system_prompt:
+        messages.append({'role': 'system', 'content': system_prompt})
+    if summary:
+        messages.append({'role': 'system', 'content': summary_instructions(summary)})
+        history_messages = min(history_messages, SUMMARY_WINDOW_MESSAGES)
+    if history:
+        messages.extend(PromptBuilder.format_conversation_history(history[-history_messages:]))
+    messages.append({'role': 'user', 'content': user_message})
+    return messages
+
+
+def _run_options(summary):
+    """Truncation (and the summary, if any) for an Assistants run"""
+    if not summary:
+        return {'truncation_strategy': TRUNCATION_STRATEGY}
+    return {
+        'truncation_strategy': SUMMARY_TRUNCATION_STRATEGY,
+        'additional_instructions': summary_instructions(summary)
+    }
+
+
+def _step_message_id(steps):
+    """ID of the message created by the newest completed message_creation run step"""
+    for step in steps:
+        if step.type == 'message_creation' and step.status == 'completed':
+            return step.step_details.message_creation.message_id
+    return None
+
+
+class RunFailedError(Exception):
+    """Raised when an Assistants run ends in a non-completed terminal status"""
+
+    def __init__(self, status, code=None, message=None):
+        self.status = status
+        self.code = code
+        detail = f" ({code}: {message})" if code else ""
+        super().__init__(f"Run failed with status: {status}{detail}")
+
+
+class RunTimeoutError(Exception):
+    """Raised (after cancelling the run) when a run does not finish within OPENAI_RUN_TIMEOUT"""
+
+    def __init__(self, run_id, timeout):
+        self.run_id = run_id
+        super().__init__(f"Run {run_id} did not complete within {timeout}s")
+
+
+class LLMServiceError(Exception):
+    """
+    Final error of an LLM call, after retries.
+    failure_class (see classify_error) tells callers whether a new thread can help.
+    """
+
+    def __init__(self, message, failure_class):
+        self.failure_class = failure_class
+        super().__init__(message)
+
+
+# Failure classes. Transient ones are retried on the same thread with
+# exponential backoff; only 'invalid_thread' justifies starting a new thread.
+# 'run_timeout' (a run that did not finish within OPENAI_RUN_TIMEOUT) is not
+# retried: another attempt could hold the user's chat lane for as long again.
+TRANSIENT_FAILURES = ('rate_limited', 'server_error', 'connection', 'timeout', 'active_run')
+# Run statuses that block new messages / runs on a thread
+ACTIVE_RUN_STATUSES = ('queued', 'in_progress', 'requires_action', 'cancelling')
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+
+_failure_counts = {}
+_failure_lock = threading.Lock()
+
+
+def classify_error(error):
+    """
+    Failure class of an error raised by the OpenAI SDK or a run:
+    rate_limited, server_error, connection, timeout, active_run,
+    run_timeout, invalid_thread or fatal.
+    """
+    if isinstance(error, LLMServiceError):
+        return error.failure_class
+    if isinstance(error, RunFailedError):
+        if error.code == 'rate_limit_exceeded':
+            return 'rate_limited'
+        if error.code == 'server_error' or error.status == 'expired':
+            return 'server_error'
+        return 'fatal'
+    if isinstance(error, RunTimeoutError):
+        return 'run_timeout'
+    if isinstance(error, openai.RateLimitError):
+        # An exhausted quota is a 429 that waiting does not fix
+        return 'fatal' if getattr(error, 'code', None) == 'insufficient_quota' else 'rate_limited'
+    if isinstance(error, openai.APITimeoutError):
+        return 'timeout'
+    if isinstance(error, openai.APIConnectionError):
+        return 'connection'
+    if isinstance(error, openai.InternalServerError):
+        return 'server_error'
+    message = str(error).lower()
+    if isinstance(error, openai.NotFoundError) and 'thread' in message:
+        return 'invalid_thread'
+    if isinstance(error, openai.BadRequestError) and ('while a run' in message or 'already has an active run' in message):
+        return 'active_run'
+    if isinstance(error, openai.ConflictError):
+        return 'server_error'
+    return 'fatal'
+
+
+def record_failure(name):
+    with _failure_lock:
+        _failure_counts[name] = _failure_counts.get(name, 0) + 1
+
+
+def failure_stats():
+    """Counts per failure class, plus retries, cancelled runs and new-thread fallbacks"""
+    with _failure_lock:
+        return dict(_failure_counts)
+
+
+def _retry_delay(attempt, error):
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * (2 ** attempt)))
+    response = getattr(error, 'response', None)
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get('retry-after'))
+            delay = max(delay, min(retry_after, LLM_RETRY_MAX_DELAY))
+        except (TypeError, ValueError):
+            pass
+    return delay
+
+
+def _should_retry(error, attempt):
+    """Record the failure; True if it is transient and retries remain"""
+    failure = classify_error(error)
+    record_failure(failure)
+    if failure not in TRANSIENT_FAILURES or attempt >= LLM_MAX_RETRIES:
+        return False
+    record_failure('retries')
+    return True
+
+
+def _next_retry(error, attempt):
+    """Seconds to wait before retrying after error, or None to give up"""
+    if not _should_retry(error, attempt):
+        return None
+    delay = _retry_delay(attempt, error)
+    logger.warning("%s error (%s). Retry %s/%s in %.1fs...", classify_error(error), error, attempt + 1, LLM_MAX_RETRIES, delay)
+    return delay
+
+
+# The services below share everything but the I/O: the helpers in this
+# section decide, LLMService / AsyncLLMService call OpenAI and sleep.
+
+NO_RESPONSE_TEXT = "Error: No response from AI"
+
+
+def _context_message(system_prompt):
+    """Thread message that carries the injected system context"""
+    return f"SYSTEM_CONTEXT: The following are the user's confirmed preferences. Please allow them to guide your personality dynamics:\n\n{system_prompt}"
+
+
+def _message_text(message):
+    """Concatenate the text content parts of a thread message"""
+    response_text = ""
+    for content in message.content:
+        if hasattr(content, 'text'):
+            response_text += content.text.value
+    return response_text
+
+
+def _listed_reply(messages):
+    """Reply text from a run's newest listed message, None if it is not the assistant's"""
+    if messages.data and messages.data[0].role == "assistant":
+        return _message_text(messages.data[0])
+    return None
+
+
+def _run_failure(run):
+    """RunFailedError for a run that ended in a failed status"""
+    last_error = getattr(run, 'last_error', None)
+    return RunFailedError(
+        run.status,
+        getattr(last_error, 'code', None),
+        getattr(last_error, 'message', None)
+    )
+
+
+def _run_finished(run):
+    """True once a polled run has completed; raises RunFailedError if it failed"""
+    if run.status == 'completed':
+        return True
+    if run.status in RUN_FAILED_STATUSES:
+        raise _run_failure(run)
+    return False
+
+
+def _runs_to_cancel(runs):
+    """Runs that block new messages / runs on a thread and are not being cancelled yet"""
+    return [run for run in runs.data if run.status in ACTIVE_RUN_STATUSES and run.status != 'cancelling']
+
+
+class _RunEvents:
+    """
+    Reads the events of a streaming run. feed(event) returns the (kind, value)
+    tuples it produces:
+    - ('run', run_id) once the run is created
+    - ('delta', text) for every assistant text delta
+    - ('done', full_text) when the run completes
+    and raises RunFailedError if the run ends in a failed status.
+    """
 
     def __init__(self):
-        """Initialize OpenAI client and ensure Assistant exists"""
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
+        self.run_id = None
+        self.streamed_text = ""
+        self.completed_text = None
+
+    def feed(self, event):
+        if event.event == 'thread.run.created':
+            self.run_id = event.data.id
+            return [('run', self.run_id)]
+        if event.event == 'thread.message.delta':
+            deltas = []
+            for part in event.data.delta.content or []:
+                if part.type == 'text' and part.text and part.text.value:
+                    self.streamed_text += part.text.value
+                    deltas.append(('delta', part.text.value))
+            return deltas
+        if event.event == 'thread.message.completed':
+            if event.data.role == 'assistant':
+                self.completed_text = _message_text(event.data)
+        elif event.event == 'thread.run.completed':
+            return [('done', self.completed_text if self.completed_text is not None else self.streamed_text)]
+        elif event.event.startswith('thread.run.') and event.data.status in RUN_FAILED_STATUSES:
+            raise _run_failure(event.data)
+        return []
+
+
+class _LLMServiceBase:
+    """Configuration shared by LLMService and AsyncLLMService"""
+
+    def __init__(self):
+        self.api_key = os.getenv("OPENAI_API_KEY")
+        if not self.api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         
-        self.client = OpenAI(api_key=api_key)
-        self.assistant_id = os.getenv("OPENAI_ASSISTANT_ID")
+        self._client = None
         self.model = "gpt-4-turbo-preview" # Use a model that supports tools/threads well
+
+        self.backend = os.getenv("LLM_BACKEND", "assistants").lower()
+        if self.backend not in LLM_BACKENDS:
+            raise ValueError(f"LLM_BACKEND must be one of {', '.join(LLM_BACKENDS)}")
+        self.chat_model = os.getenv("OPENAI_CHAT_MODEL", self.model)
+        self.summary_model = os.getenv("OPENAI_SUMMARY_MODEL", self.chat_model)
+
+        # Run execution: 'stream' returns as soon as the run completes,
+        # 'poll' uses the adaptive-backoff poller only.
+        self.run_mode = os.getenv("OPENAI_RUN_MODE", "stream").lower()
+        self.poll_initial_delay = float(os.getenv("OPENAI_POLL_INITIAL_DELAY", "0.2"))
+        self.poll_max_delay = float(os.getenv("OPENAI_POLL_MAX_DELAY", "1.0"))
+        self.poll_backoff = float(os.getenv("OPENAI_POLL_BACKOFF", "1.5"))
+        self.run_timeout = float(os.getenv("OPENAI_RUN_TIMEOUT", "120"))
+
+    @property
+    def stateless(self):
+        """True when every request must carry the system prompt and history itself"""
+        return self.backend == 'chat_completions'
+
+    def _poll_delays(self):
+        """
+        Sleep before each poll of a run: short at first (most runs finish
+        within a few seconds), backing off towards poll_max_delay. Stops once
+        run_timeout has passed.
+        """
+        delay = self.poll_initial_delay
+        deadline = time.monotonic() + self.run_timeout
+        while time.monotonic() <= deadline:
+            yield delay
+            delay = min(delay * self.poll_backoff, self.poll_max_delay)
+
+
+class LLMService(_LLMServiceBase):
+    """Service for LLM interactions using OpenAI Assistants API (Threads) or Chat Completions"""
+
+    def __init__(self):
+        """
+        Read configuration only. The OpenAI client (and, if OPENAI_ASSISTANT_ID
+        is not set, the Assistant) are created on first use, in the worker
+        process that uses them.
+        """
+        super().__init__()
+        self._assistant_id = os.getenv("OPENAI_ASSISTANT_ID")
+        self._init_lock = threading.RLock()
         
-        # If no assistant ID is set, create a basic one (or handle error)
-        if not self.assistant_id:
-            print("⚠️ No OPENAI_ASSISTANT_ID found. Creating a new Assistant...")
-            assistant = self.client.beta.assistants.create(
-                name="Ammora Chatbot",
-                instructions="You are a supportive AI companion. Use the context provided in the thread.",
-                model=self.model
-            )
-            self.assistant_id = assistant.id
-            print(f"✅ Created new Assistant: {self.assistant_id}")
-            print("❗ IMPORTANT: Add create OPENAI_ASSISTANT_ID=" + self.assistant_id + " to your .env file to persist this.")
+    @property
+    def client(self):
+        """
+        OpenAI client with one pooled keep-alive HTTP client per worker, shared by
+        all request threads. Retries are ours (classified, see _retrying), not the SDK's.
+        """
+        if self._client is None:
+            with self._init_lock:
+                if self._client is None:
+                    self._client = OpenAI(api_key=self.api_key, http_client=openai_http_client(), max_retries=0)
+        return self._client
+
+    @property
+    def assistant_id(self):
+        """Assistant to run threads with, created on first use if none is configured"""
+        if not self._assistant_id and not self.stateless:
+            with self._init_lock:
+                if not self._assistant_id:
+                    self._assistant_id = self._create_assistant()
+        return self._assistant_id
+
+    def _create_assistant(self):
+        logger.warning("No OPENAI_ASSISTANT_ID found. Creating a new Assistant...")
+        assistant = self.client.beta.assistants.create(
+            name="Ammora Chatbot",
+            instructions="You are a supportive AI companion. Use the context provided in the thread.",
+            model=self.model
+        )
+        logger.info("Created new Assistant: %s", assistant.id)
+        logger.warning("IMPORTANT: Add OPENAI_ASSISTANT_ID=%s to your .env file to persist this.", assistant.id)
+        return assistant.id
             
     def create_thread(self):
         """Create a new empty thread"""
-        thread = self.client.beta.threads.create()
+        thread = self._retrying(None, self.client.beta.threads.create)
         return thread.id
 
     def add_message(self, thread_id, content, role="user"):
         """Add a message to the thread"""
+        if self.stateless:
+            # Nothing is stored server-side: the next request carries the fresh system prompt
+            return
         try:
-            self.client.beta.threads.messages.create(
+            self._retrying(
+                thread_id,
+                self.client.beta.threads.messages.create,
                 thread_id=thread_id,
                 role=role,
                 content=content
             )
         except Exception as e:
-            print(f"Error adding message to thread {thread_id}: {e}")
+            logger.error("Error adding message to thread %s: %s", thread_id, e)
             raise e
 
-    def get_ai_response(self, user_message, thread_id=None, system_prompt=None):
+    def get_ai_response(self, user_message, thread_id=None, system_prompt=None, history=None, summary=None):
         """
         Main method to interact with AI.
         - If thread_id is None, creates a NEW thread.
         - If system_prompt is provided (Event Trigger), it is added as a MESSAGE to the thread context.
         - Adds user message.
-        - Runs assistant (with truncation).
+        - Runs assistant (with truncation; a conversation summary, when given,
+          goes in additional_instructions and the window shrinks).
+        With the chat_completions backend, system_prompt, summary and history
+        (oldest first) are sent in a single request instead.
         """
         try:
-            # 1. Manage Thread
-            current_thread_id = thread_id
-            
-            if not current_thread_id:
-                print("🧵 Creating new Empty Thread...")
-                current_thread_id = self.create_thread()
-                # If it's a new thread, we likely have a system_prompt to inject immediately
-            
-            # 2. Inject Context (If triggered by App Logic)
-            if system_prompt:
-                print(" 💉 Injecting Persistent Context Message...")
-                context_msg = f"SYSTEM_CONTEXT: The following are the user's confirmed preferences. Please allow them to guide your personality dynamics:\n\n{system_prompt}"
-                self.add_message(current_thread_id, context_msg)
-            
-            # 3. Add User Message
-            self.add_message(current_thread_id, user_message)
+            if self.stateless:
+                response_text = self._retrying(None, self._chat_completion, user_message, system_prompt, history, summary)
+                return response_text, _conversation_id(thread_id)
+
+            current_thread_id = self._prepare_thread(user_message, thread_id, system_prompt)
 
             # 4. Run Assistant
-            print(f"🏃 Starting Run on Thread {current_thread_id}...")
+            logger.debug("Starting Run on Thread %s...", current_thread_id)
             
             # We NO LONGER use additional_instructions for preferences.
-            # They are now in the thread history.
+            # They are now in the thread history (only the conversation summary goes there).
             
-            run = self.client.beta.threads.runs.create(
-                thread_id=current_thread_id,
-                assistant_id=self.assistant_id,
-                # Truncation Strategy: Keep last 50 messages.
-                # Since we re-inject context when hitting 50, this is safe.
-                truncation_strategy={
-                    "type": "last_messages",
-                    "last_messages": 50
-                }
+            # 5. Wait for Completion (stream or poll) and 6. Retrieve the reply
+            events = lambda: self._run_turn(current_thread_id, stream=self.run_mode == 'stream', summary=summary)
+            for kind, value in self._events_with_retries(events, current_thread_id):
+                if kind == 'done':
+                    return value, current_thread_id
+            
+        except Exception as e:
+            logger.error("Error in LLM Service: %s", e)
+            raise LLMServiceError(f"Failed to get AI response: {str(e)}", classify_error(e)) from e
+
+    def stream_ai_response(self, user_message, thread_id=None, system_prompt=None, history=None, summary=None):
+        """
+        Streaming variant of get_ai_response.
+        Yields ('delta', text) as the assistant produces text, then a final
+        ('done', (response_text, thread_id)) once the run has completed.
+        Falls back to polling (emitting the reply as one delta) when streaming is unavailable.
+        """
+        try:
+            if self.stateless:
+                current_thread_id = _conversation_id(thread_id)
+                events = lambda: self._iter_chat_completion(user_message, system_prompt, history, summary)
+            else:
+                current_thread_id = self._prepare_thread(user_message, thread_id, system_prompt)
+                logger.debug("Starting Streaming Run on Thread %s...", current_thread_id)
+                events = lambda: self._run_turn(current_thread_id, stream=True, summary=summary)
+
+            for kind, value in self._events_with_retries(events, None if self.stateless else current_thread_id):
+                if kind == 'delta':
+                    yield 'delta', value
+                elif kind == 'done':
+                    yield 'done', (value, current_thread_id)
+                    return
+
+        except Exception as e:
+            logger.error("Error in LLM Service: %s", e)
+            raise LLMServiceError(f"Failed to get AI response: {str(e)}", classify_error(e)) from e
+
+    def _prepare_thread(self, user_message, thread_id, system_prompt):
+        """
+        Create the thread if needed, inject the system context when provided
+        and add the user message. Returns the thread ID to run on.
+        """
+        # 1. Manage Thread
+        current_thread_id = thread_id
+        
+        if not current_thread_id:
+            logger.debug("Creating new Empty Thread...")
+            current_thread_id = self.create_thread()
+            # If it's a new thread, we likely have a system_prompt to inject immediately
+        
+        # 2. Inject Context (If triggered by App Logic)
+        if system_prompt:
+            logger.debug("Injecting Persistent Context Message...")
+            self.add_message(current_thread_id, _context_message(system_prompt))
+        
+        # 3. Add User Message
+        self.add_message(current_thread_id, user_message)
+        return current_thread_id
+
+    def summarize_conversation(self, previous_summary, messages):
+        """
+        Fold messages (oldest first) into previous_summary with one Chat
+        Completions call, whatever the backend. Returns the new summary text.
+        """
+        completion = self._retrying(
+            None,
+            self.client.chat.completions.create,
+            model=self.summary_model,
+            messages=summary_request(previous_summary, messages),
+            max_tokens=SUMMARY_MAX_TOKENS
+        )
+        return (completion.choices[0].message.content or "").strip()
+
+    def _chat_completion(self, user_message, system_prompt, history, summary=None):
+        """Single Chat Completions call. Returns the reply text."""
+        logger.debug("Calling Chat Completions (%s)...", self.chat_model)
+        completion = self.client.chat.completions.create(
+            model=self.chat_model,
+            messages=_chat_messages(user_message, system_prompt, history, summary)
+        )
+        return completion.choices[0].message.content or ""
+
+    def _iter_chat_completion(self, user_message, system_prompt, history, summary=None):
+        """Streaming Chat Completions call. Yields ('delta', text) then ('done', full_text)."""
+        logger.debug("Streaming Chat Completions (%s)...", self.chat_model)
+        stream = self.client.chat.completions.create(
+            model=self.chat_model,
+            messages=_chat_messages(user_message, system_prompt, history, summary),
+            stream=True
+        )
+        try:
+            response_text = ""
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    response_text += chunk.choices[0].delta.content
+                    yield 'delta', chunk.choices[0].delta.content
+            yield 'done', response_text
+        finally:
+            stream.close()
+
+    def _run_response_text(self, thread_id, run_id):
+        """
+        Return the text of the assistant message produced by a run.
+        Fetches only that run's newest message (limit 1) instead of a page of
+        thread history; falls back to the run's message_creation step.
+        """
+        reply = _listed_reply(self.client.beta.threads.messages.list(
+            thread_id=thread_id,
+            run_id=run_id,
+            order="desc",
+            limit=1
+        ))
+        if reply is not None:
+            return reply
+        
+        logger.warning("No message listed for run %s. Reading run steps...", run_id)
+        steps = self.client.beta.threads.runs.steps.list(
+            thread_id=thread_id,
+            run_id=run_id,
+            order="desc"
+        )
+        message_id = _step_message_id(steps.data)
+        if message_id:
+            message = self.client.beta.threads.messages.retrieve(
+                message_id=message_id,
+                thread_id=thread_id
             )
+            return _message_text(message)
+        return NO_RESPONSE_TEXT
+
+    def _create_run(self, thread_id, summary=None, **kwargs):
+        """Start a run of the assistant on a thread"""
+        return self.client.beta.threads.runs.create(
+            thread_id=thread_id,
+            assistant_id=self.assistant_id,
+            **_run_options(summary),
+            **kwargs
+        )
+
+    def _iter_run_events(self, thread_id, summary=None):
+        """
+        Start a streaming run and yield (kind, value) tuples:
+        - ('run', run_id) once the run is created
+        - ('delta', text) for every assistant text delta
+        - ('done', full_text) when the run completes
+        Raises RunFailedError if the run ends in a failed status.
+        """
+        stream = self._create_run(thread_id, summary, stream=True)
+        try:
+            reader = _RunEvents()
+            for event in stream:
+                for kind, value in reader.feed(event):
+                    yield kind, value
+                    if kind == 'done':
+                        return
+        finally:
+            stream.close()
+
+    def _run_turn(self, thread_id, stream, summary=None):
+        """
+        Run the assistant on a thread. Yields ('delta', text) as text becomes
+        available, then ('done', full_text).
+        With stream=False (or if streaming breaks mid-run) the run is polled and
+        whatever the caller has not received yet is emitted as one delta.
+        """
+        run_id = None
+        sent_text = ""
+        if stream:
+            try:
+                for kind, value in self._iter_run_events(thread_id, summary):
+                    if kind == 'run':
+                        run_id = value
+                    elif kind == 'delta':
+                        sent_text += value
+                        yield 'delta', value
+                    elif kind == 'done':
+                        yield 'done', value
+                        return
+            except RunFailedError:
+                raise
+            except Exception as e:
+                # The run never started: let the retry policy deal with API errors
+                if run_id is None and classify_error(e) != 'fatal':
+                    raise
+                logger.warning("Streaming unavailable (%s). Falling back to polling...", e)
+
+        if not run_id:
+            run_id = self._create_run(thread_id, summary).id
+        self._wait_for_run(thread_id, run_id)
+        response_text = self._run_response_text(thread_id, run_id)
 
-            # 5. Poll for Completion
-            while True:
-                time.sleep(1) # Wait 1s between checks
+        # Only emit what the client has not already received
+        if response_text.startswith(sent_text):
+            remainder = response_text[len(sent_text):]
+            if remainder:
+                yield 'delta', remainder
+        yield 'done', response_text
+
+    def _events_with_retries(self, make_events, thread_id=None):
+        """
+        Iterate make_events(), starting over on transient failures as long as
+        no delta has been yielded yet (a retry would repeat text already sent).
+        """
+        attempt = 0
+        while True:
+            sent = False
+            try:
+                for kind, value in make_events():
+                    sent = sent or kind == 'delta'
+                    yield kind, value
+                return
+            except Exception as e:
+                delay = None if sent else _next_retry(e, attempt)
+                if delay is None:
+                    raise
+                self._before_retry(e, delay, thread_id)
+                attempt += 1
+
+    def _retrying(self, cancel_thread_id, fn, *args, **kwargs):
+        """
+        Call fn(*args, **kwargs), retrying transient failures with exponential
+        backoff. cancel_thread_id (optional) is the thread whose active runs are
+        cancelled when a run blocks the call; it is not passed to fn, so fn may
+        take its own thread_id keyword.
+        """
+        attempt = 0
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                delay = _next_retry(e, attempt)
+                if delay is None:
+                    raise
+                self._before_retry(e, delay, cancel_thread_id)
+                attempt += 1
+
+    def _before_retry(self, error, delay, thread_id):
+        if classify_error(error) == 'active_run' and thread_id:
+            self._cancel_active_runs(thread_id)
+        time.sleep(delay)
+
+    def _cancel_active_runs(self, thread_id):
+        """Cancel runs stuck in an active state on a thread"""
+        try:
+            runs = self.client.beta.threads.runs.list(thread_id=thread_id, limit=5)
+            for run in _runs_to_cancel(runs):
+                logger.warning("Cancelling active run %s (%s) on thread %s", run.id, run.status, thread_id)
+                self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+                record_failure('cancelled_runs')
+        except Exception as e:
+            logger.error("Error cancelling active runs on %s: %s", thread_id, e)
+
+    def _wait_for_run(self, thread_id, run_id):
+        """
+        Poll a run with adaptive backoff (see _poll_delays) until it reaches a
+        terminal status, cancelling it after run_timeout.
+        """
+        for delay in self._poll_delays():
+            # One iteration = backoff sleep + runs.retrieve
+            with span('openai_poll_iteration'):
+                time.sleep(delay)
                 run_status = self.client.beta.threads.runs.retrieve(
-                    thread_id=current_thread_id,
-                    run_id=run.id
+                    thread_id=thread_id,
+                    run_id=run_id
                 )
 
-                if run_status.status == 'completed':
-                    break
-                elif run_status.status in ['failed', 'cancelled', 'expired']:
-                    raise Exception(f"Run failed with status: {run_status.status}")
+            if _run_finished(run_status):
+                return run_status
+
+        # Stuck run: cancel it so it does not keep the thread busy
+        try:
+            self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+            record_failure('cancelled_runs')
+        except Exception as e:
+            logger.error("Error cancelling run %s: %s", run_id, e)
+        raise RunTimeoutError(run_id, self.run_timeout)
+
+
+class AsyncLLMService(_LLMServiceBase):
+    """
+    Async counterpart of LLMService for the ASGI chat path.
+    Uses AsyncOpenAI so awaiting a run does not hold a worker thread.
+    """
+
+    def __init__(self, assistant_id=None, assistant_provider=None):
+        """
+        Read configuration only; the AsyncOpenAI client is created on first use.
+        assistant_provider (optional) is called on first use when no Assistant ID
+        is configured, e.g. lambda: llm_service.assistant_id to share the sync
+        service's Assistant without creating it at import time.
+        """
+        super().__init__()
+        self._assistant_id = assistant_id or os.getenv("OPENAI_ASSISTANT_ID")
+        self._assistant_provider = assistant_provider
+        if not self._assistant_id and not self._assistant_provider and not self.stateless:
+            raise ValueError("OPENAI_ASSISTANT_ID is required for AsyncLLMService")
+
+    @property
+    def client(self):
+        """AsyncOpenAI client over this worker's pooled HTTP client (created on first use)"""
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=self.api_key, http_client=async_openai_http_client(), max_retries=0)
+        return self._client
+
+    @property
+    def assistant_id(self):
+        if not self._assistant_id and self._assistant_provider:
+            self._assistant_id = self._assistant_provider()
+        return self._assistant_id
 
-            # 6. Retrieve Messages
-            messages = self.client.beta.threads.messages.list(
-                thread_id=current_thread_id
+    async def create_thread(self):
+        """Create a new empty thread"""
+        thread = await self._retrying(None, self.client.beta.threads.create)
+        return thread.id
+
+    async def add_message(self, thread_id, content, role="user"):
+        """Add a message to the thread"""
+        if self.stateless:
+            return
+        try:
+            await self._retrying(
+                thread_id,
+                self.client.beta.threads.messages.create,
+                thread_id=thread_id,
+                role=role,
+                content=content
             )
-            
-            # Get the latest message from AI
-            latest_message = messages.data[0]
-
-            # Extract text
-            if latest_message.role == "assistant":
-                response_text = ""
-                for content in latest_message.content:
-                    if hasattr(content, 'text'):
-                        response_text += content.text.value
-                return response_text, current_thread_id
-            else:
-                return "Error: No response from AI", current_thread_id
-            
         except Exception as e:
-            print(f"Error in LLM Service: {str(e)}")
-            raise Exception(f"Failed to get AI response: {str(e)}")
+            logger.error("Error adding message to thread %s: %s", thread_id, e)
+            raise e
+
+    async def get_ai_response(self, user_message, thread_id=None, system_prompt=None, history=None, summary=None):
+        """
+        Async version of LLMService.get_ai_response.
+        Returns (response_text, thread_id).
+        """
+        try:
+            if self.stateless:
+                response_text = await self._retrying(None, self._chat_completion, user_message, system_prompt, history, summary)
+                return response_text, _conversation_id(thread_id)
+
+            current_thread_id = await self._prepare_thread(user_message, thread_id, system_prompt)
+
+            logger.debug("Starting Run on Thread %s...", current_thread_id)
+            response_text = await self._retrying(current_thread_id, self._complete_run, current_thread_id, summary)
+            return response_text, current_thread_id
+
+        except Exception as e:
+            logger.error("Error in LLM Service: %s", e)
+            raise LLMServiceError(f"Failed to get AI response: {str(e)}", classify_error(e)) from e
+
+    async def _prepare_thread(self, user_message, thread_id, system_prompt):
+        """Async version of LLMService._prepare_thread"""
+        current_thread_id = thread_id
+        if not current_thread_id:
+            logger.debug("Creating new Empty Thread...")
+            current_thread_id = await self.create_thread()
+
+        if system_prompt:
+            logger.debug("Injecting Persistent Context Message...")
+            await self.add_message(current_thread_id, _context_message(system_prompt))
+
+        await self.add_message(current_thread_id, user_message)
+        return current_thread_id
+
+    async def _chat_completion(self, user_message, system_prompt, history, summary=None):
+        """Single Chat Completions call. Returns the reply text."""
+        logger.debug("Calling Chat Completions (%s)...", self.chat_model)
+        completion = await self.client.chat.completions.create(
+            model=self.chat_model,
+            messages=_chat_messages(user_message, system_prompt, history, summary)
+        )
+        return completion.choices[0].message.content or ""
+
+    async def _complete_run(self, thread_id, summary=None):
+        """Run the assistant on a thread (streamed or polled) and return its reply"""
+        run_id = None
+        if self.run_mode == 'stream':
+            response_text, run_id = await self._run_streaming(thread_id, summary)
+            if response_text is not None:
+                return response_text
+
+        if not run_id:
+            run = await self._create_run(thread_id, summary)
+            run_id = run.id
+
+        await self._wait_for_run(thread_id, run_id)
+        return await self._run_response_text(thread_id, run_id)
+
+    async def _retrying(self, cancel_thread_id, fn, *args, **kwargs):
+        """Async version of LLMService._retrying"""
+        attempt = 0
+        while True:
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                delay = _next_retry(e, attempt)
+                if delay is None:
+                    raise
+                if classify_error(e) == 'active_run' and cancel_thread_id:
+                    await self._cancel_active_runs(cancel_thread_id)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _cancel_active_runs(self, thread_id):
+        """Cancel runs stuck in an active state on a thread"""
+        try:
+            runs = await self.client.beta.threads.runs.list(thread_id=thread_id, limit=5)
+            for run in _runs_to_cancel(runs):
+                logger.warning("Cancelling active run %s (%s) on thread %s", run.id, run.status, thread_id)
+                await self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+                record_failure('cancelled_runs')
+        except Exception as e:
+            logger.error("Error cancelling active runs on %s: %s", thread_id, e)
+
+    async def _create_run(self, thread_id, summary=None, **kwargs):
+        """Start a run of the assistant on a thread"""
+        return await self.client.beta.threads.runs.create(
+            thread_id=thread_id,
+            assistant_id=self.assistant_id,
+            **_run_options(summary),
+            **kwargs
+        )
+
+    async def _run_streaming(self, thread_id, summary=None):
+        """
+        Execute a run using Assistants streaming events.
+        Returns (response_text, run_id). response_text is None when the stream
+        could not be used; run_id is set if the run was started anyway so the
+        caller can poll it instead of starting a second run.
+        """
+        reader = _RunEvents()
+        try:
+            stream = await self._create_run(thread_id, summary, stream=True)
+            try:
+                async for event in stream:
+                    for kind, value in reader.feed(event):
+                        if kind == 'done':
+                            return value, reader.run_id
+            finally:
+                await stream.close()
+        except RunFailedError:
+            raise
+        except Exception as e:
+            # The run never started: let the retry policy deal with API errors
+            if reader.run_id is None and classify_error(e) != 'fatal':
+                raise
+            logger.warning("Streaming unavailable (%s). Falling back to polling...", e)
+        return None, reader.run_id
+
+    async def _wait_for_run(self, thread_id, run_id):
+        """Async version of LLMService._wait_for_run (does not block the event loop)"""
+        for delay in self._poll_delays():
+            with span('openai_poll_iteration'):
+                await asyncio.sleep(delay)
+                run_status = await self.client.beta.threads.runs.retrieve(
+                    thread_id=thread_id,
+                    run_id=run_id
+                )
+
+            if _run_finished(run_status):
+                return run_status
+
+        try:
+            await self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+            record_failure('cancelled_runs')
+        except Exception as e:
+            logger.error("Error cancelling run %s: %s", run_id, e)
+        raise RunTimeoutError(run_id, self.run_timeout)
+
+    async def _run_response_text(self, thread_id, run_id):
+        """Async version of LLMService._run_response_text"""
+        reply = _listed_reply(await self.client.beta.threads.messages.list(
+            thread_id=thread_id,
+            run_id=run_id,
+            order="desc",
+            limit=1
+        ))
+        if reply is not None:
+            return reply
+
+        logger.warning("No message listed for run %s. Reading run steps...", run_id)
+        steps = await self.client.beta.threads.runs.steps.list(
+            thread_id=thread_id,
+            run_id=run_id,
+            order="desc"
+        )
+        message_id = _step_message_id(steps.data)
+        if message_id:
+            message = await self.client.beta.threads.messages.retrieve(
+                message_id=message_id,
+                thread_id=thread_id
+            )
+            return _message_text(message)
+        return NO_RESPONSE_TEXT
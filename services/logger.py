@@ -0,0 +1,203 @@
+"""
+Logger
+Structured, level-controlled logging that never writes to stdout on the
+request path. Records are put on a bounded in-memory queue and written by one
+listener thread per worker process; when the queue is full, records are
+dropped (and counted) instead of blocking the request.
+
+Every record carries the current request ID (set per request, and copied into
+background persistence tasks by PersistenceExecutor).
+
+High-volume lines are logged with extra=SAMPLED: only one in LOG_SAMPLE_EVERY
+of them (per message) is kept. Warnings and errors are never sampled.
+
+Environment:
+- LOG_LEVEL:        DEBUG | INFO | WARNING | ERROR (default INFO)
+- LOG_FORMAT:       json | text (default json)
+- LOG_SAMPLE_EVERY: keep 1 of N sampled lines (default 10, 1 = keep all)
+- LOG_QUEUE_SIZE:   records buffered before dropping (default 10000)
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_SAMPLE_EVERY = max(1, int(os.getenv("LOG_SAMPLE_EVERY", "10")))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+ROOT_LOGGER = 'ammora'
+
+# Pass as extra= on high-volume lines (see module docstring)
+SAMPLED = {'sampled': True}
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# Attributes of every LogRecord; anything else came from extra= and is emitted as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id', 'sampled'}
+
+_stats = {
+    'dropped': 0,
+    'sampled_out': 0
+}
+_stats_lock = threading.Lock()
+
+
+def new_request_id(request_id=None):
+    """Set (or generate) the request ID for the current context and return it"""
+    request_id = request_id or uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    return request_id
+
+
+def get_logger(name):
+    """Logger under the 'ammora' hierarchy (e.g. get_logger('llm'))"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+class _SamplingFilter(logging.Filter):
+    """Keep 1 of every LOG_SAMPLE_EVERY records marked sampled (per message template)"""
+
+    def __init__(self):
+        super().__init__()
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False) or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            seen = self._seen.get(key, 0)
+            self._seen[key] = seen + 1
+            if len(self._seen) > 10000:
+                self._seen.clear()
+        if seen % LOG_SAMPLE_EVERY == 0:
+            record.sample_rate = LOG_SAMPLE_EVERY
+            return True
+        _count('sampled_out')
+        return False
+
+
+class _JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, request_id, msg, extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': record.request_id,
+            'msg': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Non-blocking hand-off to the listener thread. The listener is (re)started
+    lazily in each process, so it also works after Gunicorn forks workers.
+    """
+
+    def __init__(self, record_queue, target):
+        super().__init__(record_queue)
+        self._target = target
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.addFilter(_SamplingFilter())
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                if self._pid is not None:
+                    # Forked: the parent's queue (and its lock) may be mid-use
+                    self.queue = queue.Queue(maxsize=self.queue.maxsize)
+                self._listener = logging.handlers.QueueListener(self.queue, self._target, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Only what must happen in the caller: bind the request ID and the
+        # exception text (frames go away); formatting happens on the listener
+        record.request_id = request_id_var.get()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _count('dropped')
+
+    def stop(self):
+        """Write out everything still queued (worker exit)"""
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+
+_handler = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging():
+    """Attach the queue handler to the 'ammora' logger (idempotent)"""
+    global _handler
+    with _configure_lock:
+        if _handler is not None:
+            return
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(_JsonFormatter() if LOG_FORMAT == 'json' else _TextFormatter())
+        _handler = _QueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE), stream)
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(_handler)
+        root.propagate = False
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records (called from the Gunicorn worker_exit hook and at exit)"""
+    if _handler is not None:
+        _handler.stop()
+
+
+def logging_stats():
+    """Records dropped on a full queue and sampled-out lines"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['queue_depth'] = _handler.queue.qsize() if _handler is not None else 0
+    return stats
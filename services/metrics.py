@@ -0,0 +1,190 @@
+"""
+Metrics
+In-process latency histograms and counters for the chat pipeline, exported
+in the Prometheus text format at GET /metrics.
+Values are per worker process: scrape every worker (or aggregate by instance).
+"""
+
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from services.logger import get_logger
+
+logger = get_logger('metrics')
+
+# Seconds. Covers cache hits (sub-ms) up to slow OpenAI runs.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values):
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{labels} {values[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Owns the histograms / counters and the stats collectors.
+    A collector is a callable returning a stats dict (like PersistenceExecutor.stats);
+    its numeric values are exported as gauges named <namespace>_<prefix>_<key>,
+    one level of nested dicts becomes a 'name' label.
+    """
+
+    def __init__(self, namespace='ammora'):
+        self.namespace = namespace
+        self._metrics = []
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(f"{self.namespace}_{name}", documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(f"{self.namespace}_{name}", documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, prefix, collect):
+        with self._lock:
+            self._collectors[prefix] = collect
+
+    def _collector_lines(self, prefix, stats):
+        gauges = {}
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    if isinstance(sub_value, (int, float)):
+                        gauges.setdefault(sub_key, []).append(((('name', key),), sub_value))
+            elif isinstance(value, (int, float)):
+                gauges.setdefault(key, []).append(((), value))
+
+        lines = []
+        for key, samples in sorted(gauges.items()):
+            name = re.sub(r'[^a-zA-Z0-9_]', '_', f"{self.namespace}_{prefix}_{key}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels([n for n, _ in labels], [v for _, v in labels])} {_format_value(value)}")
+        return lines
+
+    def render(self):
+        """Prometheus text exposition of every metric and collector"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        with self._lock:
+            collectors = dict(self._collectors)
+        for prefix, collect in collectors.items():
+            try:
+                lines.extend(self._collector_lines(prefix, collect() or {}))
+            except Exception as e:
+                logger.error("Collector %s failed: %s", prefix, e)
+        return '\n'.join(lines) + '\n'
+
+
+# Global registry and the pipeline metrics
+registry = MetricsRegistry()
+
+stage_latency = registry.histogram(
+    'chat_stage_duration_seconds',
+    'Duration of each stage of the chat pipeline',
+    ('stage',)
+)
+request_latency = registry.histogram(
+    'http_request_duration_seconds',
+    'HTTP request duration by endpoint and status (until the response is returned)',
+    ('endpoint', 'method', 'status')
+)
+stage_errors = registry.counter(
+    'chat_stage_errors_total',
+    'Chat pipeline stages that raised',
+    ('stage',)
+)
+
+
+@contextmanager
+def span(stage):
+    """Time a pipeline stage into ammora_chat_stage_duration_seconds{stage=...}"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        stage_latency.observe(time.perf_counter() - start, stage=stage)
@@ -0,0 +1,198 @@
+"""
+Persistence Executor
+Bounded worker pool for fire-and-forget Firestore writes.
+Replaces one OS thread per request with a fixed set of workers fed by a
+bounded queue, and drains pending writes when the worker shuts down.
+"""
+
+import atexit
+import contextvars
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from services.logger import get_logger
+
+logger = get_logger('persist')
+
+# Overflow policies when the queue is full:
+# - block:       wait up to PERSIST_BLOCK_TIMEOUT for space, then run in the caller
+# - caller_runs: run the task in the request thread immediately (never loses writes)
+# - drop_oldest: discard the oldest queued task to make room
+# - drop:        discard the new task
+OVERFLOW_POLICIES = ('block', 'caller_runs', 'drop_oldest', 'drop')
+
+_STOP = object()
+
+
+class PersistenceExecutor:
+    """Bounded queue + fixed worker threads with backpressure, drain and metrics"""
+
+    def __init__(self, max_workers=None, max_queue=None, overflow_policy=None,
+                 block_timeout=None, drain_timeout=None):
+        self.max_workers = max_workers or int(os.getenv("PERSIST_WORKERS", "4"))
+        self.max_queue = max_queue or int(os.getenv("PERSIST_QUEUE_SIZE", "1000"))
+        self.overflow_policy = (overflow_policy or os.getenv("PERSIST_OVERFLOW", "block")).lower()
+        self.block_timeout = block_timeout if block_timeout is not None else float(os.getenv("PERSIST_BLOCK_TIMEOUT", "2.0"))
+        self.drain_timeout = drain_timeout if drain_timeout is not None else float(os.getenv("PERSIST_DRAIN_TIMEOUT", "25"))
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"PERSIST_OVERFLOW must be one of {', '.join(OVERFLOW_POLICIES)}")
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Metrics
+        self._counts = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'dropped': 0,
+            'caller_runs': 0
+        }
+        self._write_latencies = deque(maxlen=1024)
+        self._queue_waits = deque(maxlen=1024)
+
+        atexit.register(self.shutdown)
+
+    def _start_workers(self):
+        """Start worker threads on first use (after any fork)"""
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"persist-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) for background execution.
+        The task runs in a copy of the caller's context (request ID for logging).
+        Returns False if the task was dropped by the overflow policy.
+        """
+        if self._closed:
+            # Shutting down: persist synchronously rather than lose the write
+            self._run_inline(fn, args, kwargs)
+            return True
+
+        if not self._workers:
+            self._start_workers()
+
+        self._count('submitted')
+        item = (fn, args, kwargs, time.monotonic(), contextvars.copy_context())
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+
+        if self.overflow_policy == 'block':
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                logger.warning("Persistence queue full for %ss. Running write in caller.", self.block_timeout)
+                self._run_inline(fn, args, kwargs)
+                return True
+        elif self.overflow_policy == 'caller_runs':
+            self._run_inline(fn, args, kwargs)
+            return True
+        elif self.overflow_policy == 'drop_oldest':
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self._count('dropped')
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                pass
+
+        logger.warning("Persistence queue full. Dropping background write.")
+        self._count('dropped')
+        return False
+
+    def _run_inline(self, fn, args, kwargs):
+        self._count('caller_runs')
+        self._execute(fn, args, kwargs)
+
+    def _worker_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                fn, args, kwargs, enqueued_at, context = item
+                self._queue_waits.append(time.monotonic() - enqueued_at)
+                context.run(self._execute, fn, args, kwargs)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, fn, args, kwargs):
+        start = time.monotonic()
+        try:
+            fn(*args, **kwargs)
+            self._count('completed')
+        except Exception as e:
+            self._count('failed')
+            logger.error("Background write failed: %s", e)
+        finally:
+            self._write_latencies.append(time.monotonic() - start)
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def shutdown(self, timeout=None):
+        """
+        Stop accepting queued work and drain pending writes.
+        Called from the Gunicorn worker_exit hook and at interpreter exit.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if not self._workers:
+            return
+
+        deadline = time.monotonic() + (self.drain_timeout if timeout is None else timeout)
+        pending = self._queue.qsize()
+        if pending:
+            logger.info("Draining %d pending writes...", pending)
+        for _ in self._workers:
+            try:
+                self._queue.put(_STOP, timeout=max(0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for worker in self._workers:
+            worker.join(max(0, deadline - time.monotonic()))
+
+        remaining = self._queue.qsize()
+        if remaining:
+            logger.warning("Shutdown timed out with %d writes still queued.", remaining)
+
+    def stats(self):
+        """Snapshot of queue depth, task counters and write latency"""
+        latencies = sorted(self._write_latencies)
+        waits = list(self._queue_waits)
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            **counts,
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self.max_queue,
+            'workers': len(self._workers),
+            'write_latency_p50': pct(0.50),
+            'write_latency_p95': pct(0.95),
+            'write_latency_max': latencies[-1] if latencies else 0.0,
+            'queue_wait_avg': sum(waits) / len(waits) if waits else 0.0
+        }
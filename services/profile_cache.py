@@ -0,0 +1,110 @@
+"""
+Profile Cache
+TTL + LRU read-through cache for rarely-changing Firestore documents
+(user profiles and preferences), so steady-state chat requests skip those reads.
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services.logger import get_logger
+
+logger = get_logger('profile_cache')
+
+MISSING = object()
+
+
+class ProfileCache:
+    """
+    Bounded TTL + LRU cache.
+    Keys are tuples like ('user', user_id) / ('preferences', user_id).
+    on_evict(key) is called whenever an entry leaves the cache (eviction,
+    expiry or invalidation) so attached listeners can be released.
+    """
+
+    def __init__(self, max_entries=None, ttl_seconds=None, on_evict=None):
+        self.max_entries = max_entries or int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "10000"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "60"))
+        self.on_evict = on_evict
+        # Structure: { key: (value, expires_at, version) }, least recently used first
+        # version is unique per stored value, so (key, version) identifies its content
+        self._entries = OrderedDict()
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+        self._counts = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0
+        }
+
+    def get(self, key):
+        """Return the cached value, or MISSING if absent or expired"""
+        expired = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, _ = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self._counts['hits'] += 1
+                    return value
+                del self._entries[key]
+                self._counts['expirations'] += 1
+                expired = True
+            self._counts['misses'] += 1
+        if expired:
+            self._notify_evict(key)
+        return MISSING
+
+    def set(self, key, value):
+        evicted = []
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds, next(self._versions))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._counts['evictions'] += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._notify_evict(old_key)
+
+    def version(self, key):
+        """Version of the live entry for key (None if absent or expired)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() >= entry[1]:
+                return None
+            return entry[2]
+
+    def invalidate(self, key):
+        with self._lock:
+            removed = self._entries.pop(key, None) is not None
+            if removed:
+                self._counts['invalidations'] += 1
+        if removed:
+            self._notify_evict(key)
+
+    def _notify_evict(self, key):
+        if self.on_evict:
+            try:
+                self.on_evict(key)
+            except Exception as e:
+                logger.error("on_evict failed for %s: %s", key, e)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            stats['size'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+# Global instance
+profile_cache = ProfileCache()
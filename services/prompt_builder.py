@@ -3,37 +3,62 @@ Prompt Builder Service
 Constructs personalized AI prompts based on user data and preferences
 """
 
-class PromptBuilder:
-    """Service for building AI prompts"""
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib
+import os
+import threading
+
+from services.token_counter import count_tokens
     
-    @staticmethod
-    def build_system_prompt(user_data, preferences):
+# Preference fields: (snake_case key used in the prompt/API, camelCase key in Firestore, default)
+# Resolved as preferences.get(camelCase) or preferences.get(snake_case, default)
+PREFERENCE_FIELDS = (
+    ('conversation_tone', 'conversationTone', 'Gentle'),
+    ('topics_to_avoid', 'topicsToAvoid', ''),
+    ('relationship_status', 'relationshipStatus', 'Unknown'),
+    ('support_type', 'supportType', 'Supportive Friend'),
+    # New Preferences
+    ('ai_communication', 'aiCommunication', 'Short and concise messages'),
+    ('ai_honesty', 'aiHonesty', 'Gentle but helpful'),
+    ('ai_tools_familiarity', 'aiToolsFamiliarity', 'Intermediate'),
+    # User Context
+    ('daily_routine', 'dailyRoutine', 'Unknown'),
+    ('biggest_challenge', 'biggestChallenge', 'Unknown'),
+    ('stress_response', 'stressResponse', 'Unknown'),
+    ('interested_in', 'interestedIn', 'Unknown'),
+    ('sexual_orientation', 'sexualOrientation', 'Unknown'),
+    ('time_dedication', 'timeDedication', 'Unknown'),
+)
        
-        name = user_data.get('name', 'User')
-        age = user_data.get('age', 'Unknown')
-        
-        # Get preferences - handle both camelCase (Firestore) and snake_case (API)
-        # Get preferences - handle both camelCase (Firestore) and snake_case (API)
-        conversation_tone = preferences.get('conversationTone') or preferences.get('conversation_tone', 'Gentle')
-        topics_to_avoid = preferences.get('topicsToAvoid') or preferences.get('topics_to_avoid', '')
-        relationship_status = preferences.get('relationshipStatus') or preferences.get('relationship_status', 'Unknown')
-        support_type = preferences.get('supportType') or preferences.get('support_type', 'Supportive Friend')
-        
-        # New Preferences
-        ai_communication = preferences.get('aiCommunication') or preferences.get('ai_communication', 'Short and concise messages')
-        ai_honesty = preferences.get('aiHonesty') or preferences.get('ai_honesty', 'Gentle but helpful')
-        ai_tools_familiarity = preferences.get('aiToolsFamiliarity') or preferences.get('ai_tools_familiarity', 'Intermediate')
-        
-        # User Context
-        daily_routine = preferences.get('dailyRoutine') or preferences.get('daily_routine', 'Unknown')
-        biggest_challenge = preferences.get('biggestChallenge') or preferences.get('biggest_challenge', 'Unknown')
-        stress_response = preferences.get('stressResponse') or preferences.get('stress_response', 'Unknown')
-        interested_in = preferences.get('interestedIn') or preferences.get('interested_in', 'Unknown')
-        sexual_orientation = preferences.get('sexualOrientation') or preferences.get('sexual_orientation', 'Unknown')
-        time_dedication = preferences.get('timeDedication') or preferences.get('time_dedication', 'Unknown')
+_FIELD_ORDER = ('name', 'age') + tuple(field for field, _, _ in PREFERENCE_FIELDS)
+_TOPICS_INDEX = _FIELD_ORDER.index('topics_to_avoid')
+_PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "4096"))
 
-        # Build system prompt
-        prompt = f"""You are a {support_type.lower()} AI companion chatting with {name}.
+# Which prompt is injected as thread context: 'full' or 'compact'
+PROMPT_VARIANT = os.getenv("PROMPT_VARIANT", "full").lower()
+        
+# Rendered prompts keyed by a caller-supplied profile version
+# (user_id, user doc version, preferences doc version): skips field resolution entirely
+_versioned_prompts = OrderedDict()
+_versioned_lock = threading.Lock()
+_versioned_counts = {'hits': 0, 'misses': 0}
+        
+@lru_cache(maxsize=_PROMPT_CACHE_SIZE)
+def _render_system_prompt(values):
+    """
+    Render the system prompt from resolved, stringified field values
+    (in _FIELD_ORDER). The template is compiled Python f-strings; results are
+    memoized on the values themselves, so an unchanged user / preferences
+    pair never re-renders.
+    """
+    (name, age, conversation_tone, topics_str, relationship_status, support_type,
+     ai_communication, ai_honesty, ai_tools_familiarity, daily_routine,
+     biggest_challenge, stress_response, interested_in, sexual_orientation,
+     time_dedication) = values
+    support_type_lower = support_type.lower()
+        
+    prompt = f"""You are a {support_type_lower} AI companion chatting with {name}.
 
 User Information:
 - Name: {name}
@@ -53,19 +78,14 @@ Conversation Style:
 - Honesty Level: {ai_honesty}
 """
         
-        # Handle topics to avoid in conversation style section
-        if topics_to_avoid:
-            # Handle both string and array formats
-            if isinstance(topics_to_avoid, list):
-                topics_str = ', '.join(topics_to_avoid)
-            else:
-                topics_str = topics_to_avoid
-            prompt += f"- IMPORTANT: User has requested to AVOID discussing: {topics_str}\n"
+    # Handle topics to avoid in conversation style section
+    if topics_str:
+        prompt += f"- IMPORTANT: User has requested to AVOID discussing: {topics_str}\n"
         
-        prompt += f"""
+    prompt += f"""
 Personality Guidelines:
 - Be warm, caring, and empathetic
-- Act as a {support_type.lower()}
+- Act as a {support_type_lower}
 - Use a {conversation_tone.lower()} tone in your responses
 - Adhere to the communication style: {ai_communication}
 - Adhere to the honesty level: {ai_honesty}
@@ -82,16 +102,9 @@ Response Length Guidelines:
 - Match the user's message length and energy
 """
         
-        
-        # Add critical instruction for topics to avoid
-        if topics_to_avoid:
-            # Handle both string and array formats
-            if isinstance(topics_to_avoid, list):
-                topics_str = ', '.join(topics_to_avoid)
-            else:
-                topics_str = topics_to_avoid
-            
-            prompt += f"""
+    # Add critical instruction for topics to avoid
+    if topics_str:
+        prompt += f"""
  CRITICAL INSTRUCTION - TOPICS TO AVOID:
 The user has EXPLICITLY requested that you DO NOT discuss: {topics_str}
 
@@ -103,8 +116,157 @@ If the user asks about any of these topics, you MUST:
 Example response: "I understand you're interested in that topic, but I remember you mentioned you'd prefer to avoid discussing {topics_str}. I'm here to support you in ways that feel comfortable for you. Is there something else on your mind that we could talk about instead?"
 """
         
+    return prompt
+
+# Values treated as "not provided" by the compact prompt
+_UNKNOWN_VALUES = ('', 'Unknown', 'None')
+
+# (label, field) for the optional user information lines, in prompt order
+_USER_INFO_FIELDS = (
+    ('Age', 'age'),
+    ('Relationship Status', 'relationship_status'),
+    ('Sexual Orientation', 'sexual_orientation'),
+    ('Interested In', 'interested_in'),
+    ('Daily Routine', 'daily_routine'),
+    ('Biggest Challenge', 'biggest_challenge'),
+    ('Stress Response', 'stress_response'),
+    ('Time Dedication', 'time_dedication'),
+    ('AI Tools Familiarity', 'ai_tools_familiarity'),
+)
+
+@lru_cache(maxsize=_PROMPT_CACHE_SIZE)
+def _render_compact_prompt(values):
+    """
+    Compact variant of the system prompt: drops unknown fields and condenses
+    the guideline boilerplate, keeping every instruction that changes behaviour.
+    """
+    fields = dict(zip(_FIELD_ORDER, values))
+    support_type_lower = fields['support_type'].lower()
+    
+    known = [f"{label}: {fields[field]}" for label, field in _USER_INFO_FIELDS
+             if fields[field] not in _UNKNOWN_VALUES]
+    
+    prompt = f"You are a {support_type_lower} AI companion chatting with {fields['name']}.\n"
+    if known:
+        prompt += "User: " + "; ".join(known) + "\n"
+    prompt += (
+        f"Style: {fields['conversation_tone']} tone; communication: {fields['ai_communication']}; "
+        f"honesty: {fields['ai_honesty']}.\n"
+        f"Be warm, empathetic and natural; act as a {support_type_lower}; listen actively and remember details.\n"
+        "Keep replies concise (10-20 words when possible); elaborate only for deeper or emotional topics; "
+        "match the user's message length and energy.\n"
+    )
+    if fields['topics_to_avoid']:
+        prompt += (
+            f"NEVER discuss: {fields['topics_to_avoid']}. If asked, politely decline, mention they asked to avoid it, "
+            "and suggest another topic, even if the user insists.\n"
+        )
+    return prompt
+
+_RENDERERS = {
+    'full': _render_system_prompt,
+    'compact': _render_compact_prompt
+}
+
+class PromptBuilder:
+    """Service for building AI prompts"""
+    
+    @staticmethod
+    def _prompt_values(user_data, preferences):
+        """
+        Resolve every field once (camelCase from Firestore, snake_case from the API)
+        into a hashable render key, formatted exactly as the template would.
+        """
+        get = preferences.get
+        values = [user_data.get('name', 'User'), user_data.get('age', 'Unknown')]
+        for field, camel, default in PREFERENCE_FIELDS:
+            values.append(get(camel) or get(field, default))
+        
+        # Handle both string and array formats for topics_to_avoid
+        topics_to_avoid = values[_TOPICS_INDEX]
+        if topics_to_avoid and isinstance(topics_to_avoid, list):
+            values[_TOPICS_INDEX] = ', '.join(topics_to_avoid)
+        elif not topics_to_avoid:
+            values[_TOPICS_INDEX] = ''
+        
+        for i, value in enumerate(values):
+            if type(value) is not str:
+                values[i] = format(value)
+        return tuple(values)
+    
+    @staticmethod
+    def build_system_prompt(user_data, preferences, version_key=None, variant='full'):
+        """
+        Build the personalized system prompt ('full' or 'compact' variant).
+        Rendering is memoized per distinct (user, preferences) content. When
+        version_key identifies the exact profile documents (see
+        FirebaseService.profile_version), unchanged users skip even field resolution.
+        """
+        if version_key is not None:
+            version_key = (version_key, variant)
+            with _versioned_lock:
+                prompt = _versioned_prompts.get(version_key)
+                if prompt is not None:
+                    _versioned_prompts.move_to_end(version_key)
+                    _versioned_counts['hits'] += 1
+                    return prompt
+                _versioned_counts['misses'] += 1
+        
+        prompt = _RENDERERS[variant](PromptBuilder._prompt_values(user_data, preferences))
+        
+        if version_key is not None:
+            with _versioned_lock:
+                _versioned_prompts[version_key] = prompt
+                while len(_versioned_prompts) > _PROMPT_CACHE_SIZE:
+                    _versioned_prompts.popitem(last=False)
         return prompt
     
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def prompt_hash(prompt):
+        """Stable content hash of a rendered prompt"""
+        return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def build_context(user_data, preferences, version_key=None, variant=None, token_budget=None):
+        """
+        Build the context to inject into a thread and measure it.
+        variant defaults to PROMPT_VARIANT. If the full prompt exceeds
+        token_budget tokens, the compact variant is used instead.
+        Returns {'prompt', 'hash', 'tokens', 'variant'}.
+        """
+        variant = variant or PROMPT_VARIANT
+        prompt = PromptBuilder.build_system_prompt(user_data, preferences, version_key=version_key, variant=variant)
+        tokens = count_tokens(prompt)
+        
+        if token_budget and tokens > token_budget and variant != 'compact':
+            variant = 'compact'
+            prompt = PromptBuilder.build_system_prompt(user_data, preferences, version_key=version_key, variant=variant)
+            tokens = count_tokens(prompt)
+        
+        return {
+            'prompt': prompt,
+            'hash': PromptBuilder.prompt_hash(prompt),
+            'tokens': tokens,
+            'variant': variant
+        }
+    
+    @staticmethod
+    def render_stats():
+        """Memo hits / misses / size for rendered prompts"""
+        info = _render_system_prompt.cache_info()
+        with _versioned_lock:
+            versioned = dict(_versioned_counts, size=len(_versioned_prompts))
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'max_size': info.maxsize,
+            'versioned_hits': versioned['hits'],
+            'versioned_misses': versioned['misses'],
+            'versioned_size': versioned['size']
+        }
+    
     @staticmethod
     def format_conversation_history(messages):
         
@@ -0,0 +1,277 @@
+"""
+Request Coalescer
+Per-user coordination of chat turns. Concurrent messages from one user
+would otherwise race on the same OpenAI thread: both add messages, the
+second runs.create fails while the first run is active, and the new-thread
+fallback throws the conversation away.
+
+Modes (CHAT_COALESCE_MODE):
+- merge:     messages that arrive while a turn is in flight are combined into
+             the next turn, and every caller receives that turn's result (one
+             shared reply). Only messages with the same merge key (the chat
+             session) are combined. The handler gets each original message
+             (repeats included), so they can be stored one by one, and
+             merge_messages() joins them for the LLM.
+- serialize: turns for one user run one at a time, in arrival order
+- off:       no coordination
+"""
+
+import asyncio
+import os
+import threading
+from contextlib import contextmanager
+
+COALESCE_MODES = ('merge', 'serialize', 'off')
+
+
+def merge_messages(messages):
+    """Text of a turn that answers several messages, in arrival order"""
+    return "\n\n".join(messages)
+
+
+class _Batch:
+    """Messages answered by a single turn"""
+
+    def __init__(self, started, done, merge_key=None):
+        self.messages = []
+        self.merge_key = merge_key
+        self.started = started
+        self.done = done
+        self.result = None
+        self.error = None
+
+
+class _FifoLock:
+    """
+    threading.Lock that is granted in request order (threading.Lock makes no
+    ordering promise). A caller that gives up waiting forfeits its place.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned = set()
+
+    def acquire(self, timeout=None):
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            if self._cond.wait_for(lambda: self._serving == ticket, timeout):
+                return True
+            self._abandoned.add(ticket)
+            return False
+
+    def release(self):
+        with self._cond:
+            self._serving += 1
+            while self._serving in self._abandoned:
+                self._abandoned.discard(self._serving)
+                self._serving += 1
+            self._cond.notify_all()
+
+    def locked(self):
+        with self._cond:
+            return self._serving != self._next_ticket
+
+
+class _Lane:
+    """
+    Per-user state, alive while any request for the user is in flight.
+    state is shared by consecutive turns, so a turn can see what the previous
+    one did before its background write has reached Firestore.
+    """
+
+    def __init__(self, run_lock):
+        self.run_lock = run_lock
+        self.pending = None
+        self.refs = 0
+        self.state = {}
+
+
+class _CoalescerBase:
+    def __init__(self, mode=None, wait_timeout=None):
+        self.mode = (mode or os.getenv("CHAT_COALESCE_MODE", "merge")).lower()
+        self.wait_timeout = wait_timeout if wait_timeout is not None else float(os.getenv("CHAT_COALESCE_TIMEOUT", "120"))
+        if self.mode not in COALESCE_MODES:
+            raise ValueError(f"CHAT_COALESCE_MODE must be one of {', '.join(COALESCE_MODES)}")
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self._counts = {
+            'turns': 0,
+            'queued': 0,
+            'merged': 0,
+            'timeouts': 0
+        }
+
+    def _acquire_lane(self, key):
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = self._lanes[key] = _Lane(self._new_lock())
+            lane.refs += 1
+            return lane
+
+    def _release_lane(self, key, lane):
+        with self._lock:
+            lane.refs -= 1
+            if lane.refs == 0 and self._lanes.get(key) is lane:
+                del self._lanes[key]
+
+    def _join_batch(self, lane, message, merge_key=None):
+        """
+        Add message to the lane's waiting batch if it has the same merge_key,
+        else open a new one. Returns (batch, is_leader).
+        """
+        with self._lock:
+            batch = lane.pending
+            if batch is None or self.mode == 'serialize' or batch.merge_key != merge_key:
+                batch = _Batch(self._new_event(), self._new_event(), merge_key)
+                lane.pending = batch
+                if lane.run_lock.locked():
+                    self._counts['queued'] += 1
+            else:
+                self._counts['merged'] += 1
+            batch.messages.append(message)
+            return batch, len(batch.messages) == 1
+
+    def _start_batch(self, lane, batch):
+        """Close the batch to new messages once its turn begins"""
+        with self._lock:
+            if lane.pending is batch:
+                lane.pending = None
+            self._counts['turns'] += 1
+        batch.started.set()
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            stats['active_users'] = len(self._lanes)
+        stats['mode'] = self.mode
+        return stats
+
+
+class ChatCoalescer(_CoalescerBase):
+    """Per-user turn coordination for threaded (WSGI) workers"""
+
+    _new_lock = staticmethod(_FifoLock)
+    _new_event = staticmethod(threading.Event)
+
+    def submit(self, key, message, handler, merge_key=None):
+        """
+        Run handler(messages, state) for key and return its result.
+        messages is the list of messages answered by the turn: [message], or
+        in merge mode every queued message of the same merge_key, in arrival
+        order. All of their callers receive the same result.
+        """
+        if self.mode == 'off':
+            return handler([message], {})
+
+        lane = self._acquire_lane(key)
+        try:
+            batch, leader = self._join_batch(lane, message, merge_key)
+            if leader:
+                self._run_batch(lane, batch, handler)
+            # The leader's wait for the lane is bounded by wait_timeout; the
+            # turn itself gets wait_timeout from when it starts
+            elif not (batch.started.wait() and batch.done.wait(self.wait_timeout)):
+                self._count('timeouts')
+                raise TimeoutError(f"Timed out waiting for a queued chat turn for {key}")
+            if batch.error is not None:
+                raise batch.error
+            return batch.result
+        finally:
+            self._release_lane(key, lane)
+
+    def _run_batch(self, lane, batch, handler):
+        try:
+            if not lane.run_lock.acquire(timeout=self.wait_timeout):
+                self._count('timeouts')
+                raise TimeoutError("Timed out waiting for the previous chat turn")
+            try:
+                self._start_batch(lane, batch)
+                batch.result = handler(list(batch.messages), lane.state)
+            finally:
+                lane.run_lock.release()
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.started.set()
+            batch.done.set()
+
+    @contextmanager
+    def exclusive(self, key):
+        """
+        Hold key's lane for a whole turn that cannot be merged (streaming).
+        Yields the lane state shared with submit().
+        """
+        if self.mode == 'off':
+            yield {}
+            return
+
+        lane = self._acquire_lane(key)
+        try:
+            if lane.run_lock.locked():
+                self._count('queued')
+            if not lane.run_lock.acquire(timeout=self.wait_timeout):
+                self._count('timeouts')
+                raise TimeoutError(f"Timed out waiting for the previous chat turn for {key}")
+            try:
+                self._count('turns')
+                yield lane.state
+            finally:
+                lane.run_lock.release()
+        finally:
+            self._release_lane(key, lane)
+
+
+class AsyncChatCoalescer(_CoalescerBase):
+    """Per-user turn coordination for the ASGI event loop"""
+
+    _new_lock = staticmethod(asyncio.Lock)
+    _new_event = staticmethod(asyncio.Event)
+
+    async def submit(self, key, message, handler, merge_key=None):
+        """Async version of ChatCoalescer.submit (handler is a coroutine function)"""
+        if self.mode == 'off':
+            return await handler([message], {})
+
+        lane = self._acquire_lane(key)
+        try:
+            batch, leader = self._join_batch(lane, message, merge_key)
+            if leader:
+                await self._run_batch(lane, batch, handler)
+            else:
+                await batch.started.wait()
+                try:
+                    await asyncio.wait_for(batch.done.wait(), self.wait_timeout)
+                except asyncio.TimeoutError:
+                    self._count('timeouts')
+                    raise TimeoutError(f"Timed out waiting for a queued chat turn for {key}")
+            if batch.error is not None:
+                raise batch.error
+            return batch.result
+        finally:
+            self._release_lane(key, lane)
+
+    async def _run_batch(self, lane, batch, handler):
+        try:
+            try:
+                await asyncio.wait_for(lane.run_lock.acquire(), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self._count('timeouts')
+                raise TimeoutError("Timed out waiting for the previous chat turn")
+            try:
+                self._start_batch(lane, batch)
+                batch.result = await handler(list(batch.messages), lane.state)
+            finally:
+                lane.run_lock.release()
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.started.set()
+            batch.done.set()
@@ -0,0 +1,63 @@
+"""
+Response Cache
+Serialized JSON bodies of read endpoints, keyed by resource and stored with
+the ETag of the version they were built from. A poll for an unchanged
+resource is answered with 304 (If-None-Match) or with the cached bytes,
+without encoding JSON again.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Bounded LRU of { key: (etag, body) }.
+    Only the latest version of each key is kept: a new ETag replaces the old body.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {
+            'hits': 0,
+            'misses': 0,
+            'not_modified': 0,
+            'evictions': 0
+        }
+
+    def get(self, key, etag):
+        """Cached body for key if it was built for this etag, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == etag:
+                self._entries.move_to_end(key)
+                self._counts['hits'] += 1
+                return entry[1]
+            self._counts['misses'] += 1
+            return None
+
+    def set(self, key, etag, body):
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counts['evictions'] += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self._counts['not_modified'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            stats['size'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        return stats
+
+
+# Global instance
+response_cache = ResponseCache()
@@ -0,0 +1,274 @@
+"""
+Session Cache Backends
+Storage implementations behind SessionCache:
+- LocalSessionBackend: bounded in-process LRU (one copy per worker)
+- RedisSessionBackend: shared across workers via any redis-py compatible client
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+import json
+import os
+import threading
+import time
+
+from services.logger import get_logger
+
+logger = get_logger('session_cache')
+
+def _message_bytes(message):
+    """Approximate memory cost of a cached message (text + fixed overhead)"""
+    return len(message.get('message') or '') + 128
+
+class SessionBackend:
+    """
+    Interface for session history storage.
+    get() returns the history list or None when there is no live session.
+    blocking is True when calls do network I/O (keep them off an event loop).
+    """
+    blocking = False
+
+    def get(self, user_id):
+        raise NotImplementedError
+
+    def set(self, user_id, history):
+        raise NotImplementedError
+
+    def append(self, user_id, message):
+        """Append to an existing live session; no-op if there is none"""
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+class LocalSessionBackend(SessionBackend):
+    """
+    Bounded in-process LRU: capped by user count, approximate bytes and per-user history length.
+    Expired sessions are removed by a background sweeper, not only on access.
+    """
+    def __init__(self, max_users, max_bytes, max_history, ttl_seconds, sweep_interval):
+        # Structure: { user_id: { 'history': [], 'last_active': monotonic, 'bytes': int } }
+        # Ordered least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._timeout_seconds = ttl_seconds
+        self._max_users = max_users
+        self._max_bytes = max_bytes
+        self._max_history = max_history
+        self._sweep_interval = sweep_interval
+        self._sweeper = None
+        self._bytes = 0
+        self._counts = {
+            'expirations': 0,
+            'evictions': 0
+        }
+
+    def get(self, user_id):
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                return None
+
+            # Check expiration
+            now = time.monotonic()
+            if now - session['last_active'] > self._timeout_seconds:
+                self._remove(user_id)
+                self._counts['expirations'] += 1
+                return None
+
+            # Update activity timestamp on access
+            session['last_active'] = now
+            self._sessions.move_to_end(user_id)
+            return list(session['history'])
+
+    def set(self, user_id, history):
+        history = list(history)[-self._max_history:]
+        with self._lock:
+            if user_id in self._sessions:
+                self._remove(user_id)
+            size = sum(_message_bytes(m) for m in history)
+            self._sessions[user_id] = {
+                'history': history,
+                'last_active': time.monotonic(),
+                'bytes': size
+            }
+            self._bytes += size
+            self._enforce_limits()
+        self._ensure_sweeper()
+
+    def append(self, user_id, message):
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                return
+            session['history'].append(message)
+            size = _message_bytes(message)
+            session['bytes'] += size
+            self._bytes += size
+            # Per-user cap: drop the oldest messages
+            while len(session['history']) > self._max_history:
+                dropped = _message_bytes(session['history'].pop(0))
+                session['bytes'] -= dropped
+                self._bytes -= dropped
+            session['last_active'] = time.monotonic()
+            self._sessions.move_to_end(user_id)
+            self._enforce_limits()
+
+    def _remove(self, user_id):
+        # Caller holds the lock
+        session = self._sessions.pop(user_id)
+        self._bytes -= session['bytes']
+
+    def _enforce_limits(self):
+        # Caller holds the lock. Evict least recently used sessions.
+        while self._sessions and (len(self._sessions) > self._max_users or self._bytes > self._max_bytes):
+            oldest = next(iter(self._sessions))
+            self._remove(oldest)
+            self._counts['evictions'] += 1
+
+    def sweep(self):
+        """
+        Remove every expired session. Returns the number removed.
+        """
+        now = time.monotonic()
+        removed = 0
+        with self._lock:
+            # LRU order: expired sessions are at the front
+            while self._sessions:
+                user_id, session = next(iter(self._sessions.items()))
+                if now - session['last_active'] <= self._timeout_seconds:
+                    break
+                self._remove(user_id)
+                removed += 1
+            self._counts['expirations'] += removed
+        return removed
+
+    def _ensure_sweeper(self):
+        """Start the periodic sweeper on first write (after any fork)"""
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="session-cache-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self._sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error("Sweep failed: %s", e)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            stats['users'] = len(self._sessions)
+            stats['bytes'] = self._bytes
+        stats['max_users'] = self._max_users
+        stats['max_bytes'] = self._max_bytes
+        return stats
+
+def _encode_message(message):
+    return json.dumps(message, default=lambda v: {'__dt__': v.isoformat()} if isinstance(v, datetime) else str(v))
+
+def _decode_message(raw):
+    return json.loads(raw, object_hook=lambda d: datetime.fromisoformat(d['__dt__']) if set(d) == {'__dt__'} else d)
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Shared session storage in Redis (or any client exposing the redis-py API).
+    Each session is a list key plus a marker key, both with a sliding TTL;
+    the marker distinguishes an empty history from no session.
+    Memory across all users is bounded by Redis itself (maxmemory + an LRU policy).
+    Redis errors are treated as cache misses so chat keeps working.
+    """
+    blocking = True
+
+    def __init__(self, client, max_history, ttl_seconds, key_prefix='session'):
+        self._client = client
+        self._max_history = max_history
+        self._ttl_ms = max(1, int(ttl_seconds * 1000))
+        self._prefix = key_prefix
+        self._counts = {
+            'errors': 0
+        }
+
+    def _keys(self, user_id):
+        return f"{self._prefix}:{user_id}:history", f"{self._prefix}:{user_id}:alive"
+
+    def get(self, user_id):
+        history_key, alive_key = self._keys(user_id)
+        try:
+            pipe = self._client.pipeline()
+            pipe.exists(alive_key)
+            pipe.lrange(history_key, 0, -1)
+            # Sliding expiry, same as touching last_active locally
+            pipe.pexpire(alive_key, self._ttl_ms)
+            pipe.pexpire(history_key, self._ttl_ms)
+            alive, raw_history, _, _ = pipe.execute()
+            if not alive:
+                return None
+            return [_decode_message(raw) for raw in raw_history]
+        except Exception as e:
+            self._counts['errors'] += 1
+            logger.error("Redis get failed for %s: %s", user_id, e)
+            return None
+
+    def set(self, user_id, history):
+        history_key, alive_key = self._keys(user_id)
+        history = list(history)[-self._max_history:]
+        try:
+            pipe = self._client.pipeline()
+            pipe.delete(history_key)
+            if history:
+                pipe.rpush(history_key, *[_encode_message(m) for m in history])
+                pipe.pexpire(history_key, self._ttl_ms)
+            pipe.set(alive_key, 1, px=self._ttl_ms)
+            pipe.execute()
+        except Exception as e:
+            self._counts['errors'] += 1
+            logger.error("Redis set failed for %s: %s", user_id, e)
+
+    def append(self, user_id, message):
+        history_key, alive_key = self._keys(user_id)
+        try:
+            if not self._client.exists(alive_key):
+                return
+            pipe = self._client.pipeline()
+            pipe.rpush(history_key, _encode_message(message))
+            pipe.ltrim(history_key, -self._max_history, -1)
+            pipe.pexpire(history_key, self._ttl_ms)
+            pipe.pexpire(alive_key, self._ttl_ms)
+            pipe.execute()
+        except Exception as e:
+            self._counts['errors'] += 1
+            logger.error("Redis append failed for %s: %s", user_id, e)
+
+    def stats(self):
+        return dict(self._counts)
+
+def create_backend():
+    """
+    Build the backend selected by SESSION_CACHE_BACKEND (local | redis).
+    """
+    backend = os.getenv("SESSION_CACHE_BACKEND", "local").lower()
+    ttl_seconds = float(os.getenv("SESSION_CACHE_TTL_SECONDS", "30"))
+    max_history = int(os.getenv("SESSION_CACHE_MAX_HISTORY", "50"))
+
+    if backend == 'redis':
+        import redis
+        client = redis.Redis.from_url(os.getenv("SESSION_CACHE_REDIS_URL", "redis://localhost:6379/0"))
+        return RedisSessionBackend(client, max_history, ttl_seconds,
+                                   key_prefix=os.getenv("SESSION_CACHE_REDIS_PREFIX", "session"))
+    if backend != 'local':
+        raise ValueError("SESSION_CACHE_BACKEND must be 'local' or 'redis'")
+
+    return LocalSessionBackend(
+        max_users=int(os.getenv("SESSION_CACHE_MAX_USERS", "10000")),
+        max_bytes=int(os.getenv("SESSION_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        max_history=max_history,
+        ttl_seconds=ttl_seconds,
+        sweep_interval=float(os.getenv("SESSION_CACHE_SWEEP_INTERVAL", "60"))
+    )
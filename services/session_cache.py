@@ -1,54 +1,69 @@
-from datetime import datetime, timedelta
 import threading
 
+from services.session_backends import create_backend
+
 class SessionCache:
     """
-    In-Memory Session Cache for Chat History.
+    Session Cache for Chat History.
     Stores fetched message history to avoid repeated Firestore reads during an active session.
+    Storage is pluggable (see services/session_backends.py): the default in-process
+    LRU, or a Redis backend shared by every worker.
     """
-    def __init__(self):
-        # Structure: { user_id: { 'history': [], 'last_active': datetime } }
-        self._sessions = {}
+    def __init__(self, backend=None):
+        self._backend = backend
         self._lock = threading.Lock()
-        self._timeout_minutes = 0.5 
+        self._counts = {
+            'hits': 0,
+            'misses': 0
+        }
+
+    @property
+    def backend(self):
+        # Built on first use so importing the module never connects anywhere
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_backend()
+        return self._backend
+
+    @property
+    def blocking(self):
+        """True if the backend does network I/O (async callers use a thread for it)"""
+        return self.backend.blocking
+
+    def use_backend(self, backend):
+        """Swap the storage backend (e.g. an in-process fake for benchmarks)"""
+        self._backend = backend
+
     def get_history(self, user_id):
         """
         Returns cached history if session exists and is valid.
         Returns None if session is missing or expired.
         """
+        history = self.backend.get(user_id)
         with self._lock:
-            if user_id in self._sessions:
-                session = self._sessions[user_id]
-                
-                # Check expiration
-                if datetime.now() - session['last_active'] > timedelta(minutes=self._timeout_minutes):
-                    print(f"[SessionCache] Session for {user_id} expired. Clearing.")
-                    del self._sessions[user_id]
-                    return None
-                
-                # Update activity timestamp on access
-                session['last_active'] = datetime.now()
-                return session['history']
-            return None
+            self._counts['hits' if history is not None else 'misses'] += 1
+        return history
 
     def update_history(self, user_id, history_messages):
         """
         Creates or updates a session with the latest full history.
         """
-        with self._lock:
-            self._sessions[user_id] = {
-                'history': history_messages,
-                'last_active': datetime.now()
-            }
+        self.backend.set(user_id, history_messages)
 
     def append_message(self, user_id, message):
         """
         Appends a single message to the active session history.
         """
+        self.backend.append(user_id, message)
+
+    def stats(self):
+        """Hit / miss counters plus backend-specific counters"""
         with self._lock:
-            if user_id in self._sessions:
-                self._sessions[user_id]['history'].append(message)
-                self._sessions[user_id]['last_active'] = datetime.now()
+            stats = dict(self._counts)
+        stats.update(self.backend.stats())
+        stats['backend'] = type(self.backend).__name__
+        return stats
 
 # Global instance
 session_cache = SessionCache()
@@ -0,0 +1,107 @@
+"""
+Token Counter
+Local (no network) token counting for injected context.
+Uses tiktoken when the encoding file has been fetched into
+TIKTOKEN_CACHE_DIR (default config/tiktoken) at build time:
+
+    python -m scripts.fetch_tiktoken_encoding
+
+Otherwise counts are a character-based estimate (4 characters per token).
+For English prose that is usually within ~20% of the real count; code, URLs,
+emoji and non-Latin scripts take more tokens per character and can be
+undercounted by 2x or more. injection_stats()['exact'] shows which mode is in
+use.
+"""
+
+from functools import lru_cache
+import hashlib
+import math
+import os
+import threading
+
+from services.logger import get_logger
+
+logger = get_logger('tokens')
+
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+TIKTOKEN_CACHE_DIR = os.getenv(
+    "TIKTOKEN_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'tiktoken')
+)
+
+# Where tiktoken downloads each encoding from; its cache file is named after the URL
+ENCODING_URLS = {
+    'cl100k_base': "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken",
+    'o200k_base': "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken"
+}
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+# Context injection counters (injections, skipped re-injections, tokens injected)
+_injection_stats = {
+    'injections': 0,
+    'skipped': 0,
+    'tokens_injected': 0
+}
+_stats_lock = threading.Lock()
+
+
+def encoding_cache_path(name=None):
+    """File tiktoken reads the encoding from in TIKTOKEN_CACHE_DIR (None for unknown encodings)"""
+    url = ENCODING_URLS.get(name or TOKEN_ENCODING)
+    if url is None:
+        return None
+    return os.path.join(TIKTOKEN_CACHE_DIR, hashlib.sha1(url.encode()).hexdigest())
+
+
+def _get_encoding():
+    """Load the tiktoken encoding once, only from the local cache"""
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+    with _encoding_lock:
+        if not _encoding_loaded:
+            # Without the cached file tiktoken would download it on a request thread
+            cache_path = encoding_cache_path()
+            if cache_path and os.path.exists(cache_path):
+                try:
+                    os.environ.setdefault("TIKTOKEN_CACHE_DIR", TIKTOKEN_CACHE_DIR)
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+                except Exception as e:
+                    logger.warning("tiktoken unavailable (%s). Using estimated token counts.", e)
+            else:
+                logger.info("%s not fetched into %s. Using estimated token counts.", TOKEN_ENCODING, TIKTOKEN_CACHE_DIR)
+            _encoding_loaded = True
+    return _encoding
+
+
+@lru_cache(maxsize=1024)
+def count_tokens(text):
+    """Number of tokens in text (exact with tiktoken, estimated otherwise)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def record_injection(tokens):
+    with _stats_lock:
+        _injection_stats['injections'] += 1
+        _injection_stats['tokens_injected'] += tokens
+
+
+def record_skipped_injection():
+    with _stats_lock:
+        _injection_stats['skipped'] += 1
+
+
+def injection_stats():
+    with _stats_lock:
+        stats = dict(_injection_stats)
+    stats['exact'] = _get_encoding() is not None
+    return stats
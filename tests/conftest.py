@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the flat services/ and bench/ modules from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
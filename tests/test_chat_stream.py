@@ -0,0 +1,103 @@
+"""
+/api/chat/stream through the Flask test client: the events sent, and the
+user's coalescer lane being released however the stream ends.
+"""
+
+import pytest
+
+from bench.fakes import FakeFirebaseService, install_fake_firebase_config
+
+HEADERS = {'X-API-Key': '321'}
+BODY = {'user_id': 'user-0', 'message': 'hello', 'chat_session_id': 'session-0'}
+
+
+class QueuedTasks:
+    """Persistence executor stand-in that only records tasks"""
+
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.tasks.append((fn, args, kwargs))
+        return True
+
+
+@pytest.fixture
+def stream_app(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'fake')
+    monkeypatch.setenv('OPENAI_ASSISTANT_ID', 'asst_fake')
+    install_fake_firebase_config()
+    import app
+    from services.request_coalescer import ChatCoalescer
+
+    firebase = FakeFirebaseService()
+    firebase.seed_users(1)
+    monkeypatch.setattr(app, 'firebase_service', firebase)
+    monkeypatch.setattr(app, 'persistence_executor', QueuedTasks())
+    monkeypatch.setattr(app, 'chat_coalescer', ChatCoalescer(mode='merge', wait_timeout=1))
+    return app
+
+
+def _stream(app, monkeypatch, events):
+    """Make the LLM stream `events`; an Exception instance is raised in place"""
+    def stream_ai_response(**kwargs):
+        for event in events:
+            if isinstance(event, Exception):
+                raise event
+            yield event
+    monkeypatch.setattr(app.llm_service, 'stream_ai_response', stream_ai_response)
+
+
+def _lane_is_free(app):
+    with app.chat_coalescer.exclusive('user-0'):
+        pass
+    return app.chat_coalescer.stats()['active_users'] == 0
+
+
+def test_full_stream(stream_app, monkeypatch):
+    _stream(stream_app, monkeypatch, [('delta', 'Hel'), ('delta', 'lo'), ('done', ('Hello', 'thread-1'))])
+    response = stream_app.app.test_client().post('/api/chat/stream', json=BODY, headers=HEADERS, buffered=False)
+    assert response.mimetype == 'text/event-stream'
+
+    body = b''.join(response.response).decode()
+    # The lane is held until the response is closed (call_on_close)
+    assert stream_app.chat_coalescer.stats()['active_users'] == 1
+    response.close()
+
+    assert body.split('\n\n')[:2] == ['event: delta\ndata: {"text": "Hel"}', 'event: delta\ndata: {"text": "lo"}']
+    assert 'event: done' in body and '"thread_id": "thread-1"' in body
+    assert len(stream_app.persistence_executor.tasks) == 1
+    assert _lane_is_free(stream_app)
+
+
+def test_stream_error_event(stream_app, monkeypatch):
+    _stream(stream_app, monkeypatch, [('delta', 'Hel'), RuntimeError("upstream closed the stream")])
+    response = stream_app.app.test_client().post('/api/chat/stream', json=BODY, headers=HEADERS, buffered=False)
+    body = b''.join(response.response).decode()
+    response.close()
+
+    assert body.endswith('event: error\ndata: {"success": false, "error": "upstream closed the stream"}\n\n')
+    assert 'event: done' not in body
+    # Nothing is persisted for a failed turn
+    assert stream_app.persistence_executor.tasks == []
+    assert _lane_is_free(stream_app)
+
+
+def test_client_disconnect_releases_lane(stream_app, monkeypatch):
+    _stream(stream_app, monkeypatch, [('delta', 'Hel'), ('delta', 'lo'), ('done', ('Hello', 'thread-1'))])
+    response = stream_app.app.test_client().post('/api/chat/stream', json=BODY, headers=HEADERS, buffered=False)
+
+    first = next(iter(response.response))
+    assert first.startswith(b'event: delta')
+    assert stream_app.chat_coalescer.stats()['active_users'] == 1
+    # Client goes away after the first event
+    response.close()
+
+    assert stream_app.persistence_executor.tasks == []
+    assert _lane_is_free(stream_app)
+
+
+def test_unknown_user_releases_lane(stream_app):
+    response = stream_app.app.test_client().post('/api/chat/stream', json={**BODY, 'user_id': 'nobody'}, headers=HEADERS)
+    assert response.status_code == 404
+    assert stream_app.chat_coalescer.stats()['active_users'] == 0
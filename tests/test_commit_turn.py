@@ -0,0 +1,109 @@
+"""
+FirebaseService.commit_turn against FakeFirestore: the documents one turn
+writes, in one batch that is applied completely or not at all.
+"""
+
+import pytest
+
+from bench.fakes import FakeFirestore
+from services import firebase_service
+from services.firebase_service import FirebaseService
+
+
+@pytest.fixture
+def firestore(monkeypatch):
+    db = FakeFirestore()
+    monkeypatch.setattr(firebase_service, 'get_db', lambda: db)
+    monkeypatch.setattr(firebase_service, 'SESSION_MESSAGES_LAYOUT', 'history')
+    monkeypatch.setattr(firebase_service, 'SESSION_COUNTER_SHARDS', 1)
+    return db
+
+
+def _history(db, user_id):
+    prefix = f"messages/{user_id}/history/"
+    messages = [data for path, data in db.docs.items() if path.startswith(prefix)]
+    return sorted(messages, key=lambda data: data['timestamp'])
+
+
+def test_merged_turn_stores_each_message(firestore):
+    ids = FirebaseService().commit_turn('u1', 's1', ['ok', 'sure', 'ok'], 'Glad to hear it')
+
+    history = _history(firestore, 'u1')
+    assert [(m['type'], m['message']) for m in history] == [
+        ('user', 'ok'), ('user', 'sure'), ('user', 'ok'), ('ai', 'Glad to hear it')
+    ]
+    assert ids == tuple(m['id'] for m in history)
+    # One interaction for the thread, one count per stored message for the session
+    assert firestore.docs['users/u1/metadata/openai_thread']['msg_count'] == 1
+    assert firestore.docs['chat_sessions/s1']['message_count'] == 4
+    assert firestore.docs['chat_sessions/s1']['last_message_at'] == history[-1]['timestamp']
+
+
+@pytest.mark.parametrize('layout, shards', [('history', 1), ('dual', 4)])
+def test_writes_exactly_the_turn_documents(firestore, monkeypatch, layout, shards):
+    monkeypatch.setattr(firebase_service, 'SESSION_MESSAGES_LAYOUT', layout)
+    monkeypatch.setattr(firebase_service, 'SESSION_COUNTER_SHARDS', shards)
+    firestore.put('users/u1/metadata/openai_thread', {'thread_id': 't1', 'msg_count': 4})
+    before = set(firestore.docs)
+
+    context = {'hash': 'abc', 'tokens': 120, 'msg_count': 4}
+    user_id, ai_id = FirebaseService().commit_turn('u1', 's1', 'hello', 'hi there', context=context)
+
+    expected = {f"messages/u1/history/{user_id}", f"messages/u1/history/{ai_id}",
+                'users/u1/metadata/openai_thread'}
+    if layout == 'dual':
+        expected |= {f"chat_sessions/s1/messages/{user_id}", f"chat_sessions/s1/messages/{ai_id}"}
+    shard_paths = {path for path in firestore.docs if path.startswith('chat_sessions/s1/counter_shards/')}
+    if shards > 1:
+        assert len(shard_paths) == 1
+        expected |= shard_paths
+    else:
+        expected.add('chat_sessions/s1')
+    # One batch, and nothing but the turn's documents
+    assert len(firestore.commits) == 1
+    assert set(firestore.commits[0]) == expected
+    assert set(firestore.docs) - before == expected - {'users/u1/metadata/openai_thread'}
+
+    user_message = firestore.docs[f"messages/u1/history/{user_id}"]
+    ai_message = firestore.docs[f"messages/u1/history/{ai_id}"]
+    assert (user_message['type'], user_message['message'], user_message['chat_session_id']) == ('user', 'hello', 's1')
+    assert (ai_message['type'], ai_message['message']) == ('ai', 'hi there')
+    assert ai_message['timestamp'] > user_message['timestamp']
+    if layout == 'dual':
+        assert firestore.docs[f"chat_sessions/s1/messages/{ai_id}"] == {
+            field: ai_message[field] for field in firebase_service.SESSION_MESSAGE_COPY_FIELDS
+        }
+
+    thread = firestore.docs['users/u1/metadata/openai_thread']
+    assert (thread['thread_id'], thread['msg_count']) == ('t1', 5)
+    assert (thread['context_hash'], thread['context_tokens'], thread['context_msg_count']) == ('abc', 120, 4)
+
+    counter = firestore.docs[shard_paths.pop()]['count'] if shards > 1 else firestore.docs['chat_sessions/s1']['message_count']
+    assert counter == 2
+
+
+def test_new_thread_resets_thread_metadata(firestore):
+    firestore.put('users/u1/metadata/openai_thread', {'thread_id': 't1', 'msg_count': 9, 'summary': 'earlier',
+                                                      'summary_msg_count': 8, 'context_hash': 'old'})
+    FirebaseService().commit_turn('u1', 's1', 'hello', 'hi there', new_thread_id='t2')
+
+    thread = firestore.docs['users/u1/metadata/openai_thread']
+    assert (thread['thread_id'], thread['msg_count'], thread['summary_msg_count']) == ('t2', 0, 0)
+    assert thread['context_hash'] is None
+    # The summary outlives the thread
+    assert thread['summary'] == 'earlier'
+
+
+def test_failed_commit_writes_nothing(firestore):
+    firestore.put('users/u1/metadata/openai_thread', {'thread_id': 't1', 'msg_count': 4})
+    firestore.put('chat_sessions/s1', {'message_count': 8})
+    before = {path: dict(data) for path, data in firestore.docs.items()}
+
+    firestore.fail_commits = 1
+    assert FirebaseService().commit_turn('u1', 's1', 'hello', 'hi there') is None
+    assert firestore.docs == before and firestore.commits == []
+
+    # The next turn commits normally
+    assert FirebaseService().commit_turn('u1', 's1', 'hello', 'hi there')
+    assert firestore.docs['users/u1/metadata/openai_thread']['msg_count'] == 5
+    assert firestore.docs['chat_sessions/s1']['message_count'] == 10
@@ -0,0 +1,87 @@
+"""
+Conversation summary refreshes: one in flight per user, and each refresh only
+reads the messages after the last one already folded in.
+"""
+
+import pytest
+
+from bench.fakes import FakeFirebaseService, install_fake_firebase_config
+from services import conversation_summary
+
+
+class QueuedTasks:
+    """Persistence executor stand-in that keeps tasks until run()"""
+
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.tasks.append((fn, args, kwargs))
+        return True
+
+    def run(self):
+        tasks, self.tasks = self.tasks, []
+        for fn, args, kwargs in tasks:
+            fn(*args, **kwargs)
+
+
+@pytest.fixture
+def summary_app(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'fake')
+    monkeypatch.setenv('OPENAI_ASSISTANT_ID', 'asst_fake')
+    install_fake_firebase_config()
+    import app
+
+    firebase = FakeFirebaseService()
+    firebase.seed_users(1, history=60)
+    folded = []
+
+    def summarize(previous, messages):
+        folded.append(messages)
+        return f"summary of {len(messages)}"
+
+    monkeypatch.setattr(conversation_summary, 'CONVERSATION_SUMMARY', True)
+    monkeypatch.setattr(conversation_summary, '_refreshing', {})
+    monkeypatch.setattr(app, 'firebase_service', firebase)
+    monkeypatch.setattr(app, 'persistence_executor', QueuedTasks())
+    monkeypatch.setattr(app.llm_service, 'summarize_conversation', summarize)
+    return app, firebase, folded
+
+
+def test_stale_reads_do_not_queue_a_second_refresh(summary_app):
+    app, firebase, folded = summary_app
+    firebase.threads['user-0'] = {'thread_id': 't1', 'msg_count': 30, 'summary_msg_count': 0}
+
+    # Two turns that both read the thread before the refresh saved
+    app._schedule_summary_refresh('user-0', firebase.get_thread_data('user-0'))
+    app._schedule_summary_refresh('user-0', firebase.get_thread_data('user-0'))
+    assert len(app.persistence_executor.tasks) == 1
+
+    app.persistence_executor.run()
+    assert len(folded) == 1
+    assert firebase.threads['user-0']['summary_msg_count'] == 30
+
+    app._schedule_summary_refresh('user-0', firebase.get_thread_data('user-0'))
+    assert app.persistence_executor.tasks == []
+
+
+def test_refresh_after_thread_reset_skips_summarized_messages(summary_app):
+    app, firebase, folded = summary_app
+    firebase.threads['user-0'] = {'thread_id': 't1', 'msg_count': 30, 'summary_msg_count': 0}
+    app._schedule_summary_refresh('user-0', firebase.get_thread_data('user-0'))
+    app.persistence_executor.run()
+    through_at = firebase.threads['user-0']['summary_through_at']
+    assert through_at == folded[0][-1]['timestamp']
+
+    # New thread: the count restarts at 0 while history keeps every message
+    for n in range(15):
+        firebase.commit_turn('user-0', 'session-0', f"new {n}", f"reply {n}", new_thread_id='t2' if n == 0 else None)
+    thread = firebase.get_thread_data('user-0')
+    assert (thread['summary_msg_count'], thread['summary_through_at']) == (0, through_at)
+
+    app._schedule_summary_refresh('user-0', thread)
+    app.persistence_executor.run()
+
+    assert len(folded) == 2
+    assert all(m['timestamp'] > through_at for m in folded[1])
+    assert folded[1][0]['message'] == 'Seed message 40'
@@ -0,0 +1,24 @@
+"""
+http_pool_stats: every pooled client is reported, not only the last one built.
+"""
+
+import gc
+
+from services import http_clients
+
+
+def test_pool_stats_cover_every_client(monkeypatch):
+    monkeypatch.setattr(http_clients, '_pools', {})
+    first = http_clients.openai_http_client()
+    second = http_clients.openai_http_client()
+
+    stats = http_clients.http_pool_stats()
+    assert stats['openai']['clients'] == 2
+    assert stats['openai']['max_connections'] == http_clients.OPENAI_POOL_MAX_CONNECTIONS
+
+    # Discarded clients stop being reported
+    first.close()
+    del first
+    gc.collect()
+    assert http_clients.http_pool_stats()['openai']['clients'] == 1
+    second.close()
@@ -0,0 +1,84 @@
+"""
+One chat turn through LLMService / AsyncLLMService against the local fake
+OpenAI server (bench/fake_openai.py), on the default Assistants backend.
+"""
+
+import asyncio
+
+import pytest
+
+from bench.fake_openai import start_server
+
+REPLY = "Thanks for sharing that with me."
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    server, state, base_url = start_server(run_latency=0.05, reply=REPLY)
+    monkeypatch.setenv('OPENAI_BASE_URL', base_url)
+    monkeypatch.setenv('OPENAI_API_KEY', 'fake')
+    monkeypatch.setenv('OPENAI_ASSISTANT_ID', 'asst_fake')
+    monkeypatch.setenv('LLM_BACKEND', 'assistants')
+    yield state
+    server.shutdown()
+
+
+@pytest.mark.parametrize('run_mode', ['stream', 'poll'])
+def test_turn_on_new_thread(fake_openai, monkeypatch, run_mode):
+    monkeypatch.setenv('OPENAI_RUN_MODE', run_mode)
+    from services.llm_service import LLMService
+
+    reply, thread_id = LLMService().get_ai_response("Hi", system_prompt="Be kind")
+
+    assert reply == REPLY
+    roles = [m['role'] for m in fake_openai.threads[thread_id]]
+    assert roles == ['user', 'user', 'assistant']
+
+
+def test_turn_on_existing_thread(fake_openai):
+    from services.llm_service import LLMService
+
+    service = LLMService()
+    thread_id = service.create_thread()
+    service.add_message(thread_id, "Context update")
+    reply, used_thread_id = service.get_ai_response("Hi", thread_id=thread_id)
+
+    assert (reply, used_thread_id) == (REPLY, thread_id)
+    assert len(fake_openai.threads[thread_id]) == 3
+
+
+@pytest.mark.parametrize('run_mode', ['stream', 'poll'])
+def test_async_turn(fake_openai, monkeypatch, run_mode):
+    monkeypatch.setenv('OPENAI_RUN_MODE', run_mode)
+    from services.llm_service import AsyncLLMService
+
+    reply, thread_id = asyncio.run(AsyncLLMService(assistant_id='asst_fake').get_ai_response("Hi", system_prompt="Be kind"))
+
+    assert reply == REPLY
+    assert len(fake_openai.threads[thread_id]) == 3
+
+
+def test_run_timeout_is_not_retried(fake_openai, monkeypatch):
+    monkeypatch.setenv('OPENAI_RUN_MODE', 'poll')
+    monkeypatch.setenv('OPENAI_RUN_TIMEOUT', '0.3')
+    fake_openai.run_latency = 30
+    from services.llm_service import LLMService, LLMServiceError
+
+    with pytest.raises(LLMServiceError) as raised:
+        LLMService().get_ai_response("Hi")
+
+    assert raised.value.failure_class == 'run_timeout'
+    assert len(fake_openai.runs) == 1
+
+
+def test_async_run_timeout_is_not_retried(fake_openai, monkeypatch):
+    monkeypatch.setenv('OPENAI_RUN_MODE', 'poll')
+    monkeypatch.setenv('OPENAI_RUN_TIMEOUT', '0.3')
+    fake_openai.run_latency = 30
+    from services.llm_service import AsyncLLMService, LLMServiceError
+
+    with pytest.raises(LLMServiceError) as raised:
+        asyncio.run(AsyncLLMService().get_ai_response("Hi"))
+
+    assert raised.value.failure_class == 'run_timeout'
+    assert len(fake_openai.runs) == 1
@@ -0,0 +1,70 @@
+"""
+Profile cache invalidation: per-worker entries, dropped by
+invalidate_user_cache and refreshed by the reads the GET endpoints make.
+"""
+
+import pytest
+
+from bench.fakes import FakeFirestore
+from services import firebase_service
+from services.firebase_service import FirebaseService
+from services.profile_cache import ProfileCache
+
+
+@pytest.fixture
+def firestore(monkeypatch):
+    db = FakeFirestore()
+    db.put('users/u1', {'name': 'Ana'})
+    db.put('users/u1/preferences/p1', {'supportType': 'Coach'})
+    cache = ProfileCache(ttl_seconds=60, on_evict=firebase_service._on_profile_evict)
+    monkeypatch.setattr(firebase_service, 'get_db', lambda: db)
+    monkeypatch.setattr(firebase_service, 'profile_cache', cache)
+    monkeypatch.setattr(firebase_service, '_profile_update_times', {})
+    monkeypatch.setattr(firebase_service, '_preferences_doc_ids', {})
+    return db
+
+
+def test_cached_profile_is_served_until_invalidated(firestore):
+    assert FirebaseService.get_user('u1') == {'name': 'Ana'}
+    assert FirebaseService.get_user_preferences('u1') == {'supportType': 'Coach'}
+
+    # Changed through another worker: this one still has its entries
+    firestore.put('users/u1', {'name': 'Bea'})
+    firestore.put('users/u1/preferences/p1', {'supportType': 'Friend'})
+    assert FirebaseService.get_user('u1') == {'name': 'Ana'}
+
+    FirebaseService.invalidate_user_cache('u1')
+    assert FirebaseService.get_user('u1') == {'name': 'Bea'}
+    assert FirebaseService.get_user_preferences('u1') == {'supportType': 'Friend'}
+    assert firebase_service.profile_cache.stats()['invalidations'] == 2
+
+
+def test_read_profile_bypasses_and_refreshes_the_cache(firestore):
+    FirebaseService.get_user('u1')
+    FirebaseService.get_user_preferences('u1')
+    prompt_version = FirebaseService.profile_version('u1')
+
+    # Re-reading an unchanged document keeps the entry and the prompt version
+    data, version = FirebaseService.read_profile('user', 'u1')
+    assert data == {'name': 'Ana'}
+    assert FirebaseService.profile_version('u1') == prompt_version
+
+    firestore.put('users/u1', {'name': 'Bea'})
+    data, new_version = FirebaseService.read_profile('user', 'u1')
+    assert data == {'name': 'Bea'} and new_version != version
+    # The chat path of this worker now sees the change too
+    assert FirebaseService.get_user('u1') == {'name': 'Bea'}
+    assert FirebaseService.profile_version('u1') != prompt_version
+
+
+def test_missing_documents(firestore):
+    assert FirebaseService.read_profile('user', 'nobody') == (None, None)
+    assert FirebaseService.read_profile('preferences', 'nobody') == (None, None)
+    # "No preferences" is cached as well
+    firestore.put('users/nobody/preferences/p2', {'supportType': 'Coach'})
+    assert FirebaseService.get_user_preferences('nobody') is None
+
+
+def test_default_ttl_is_short(monkeypatch):
+    monkeypatch.delenv('PROFILE_CACHE_TTL_SECONDS', raising=False)
+    assert ProfileCache().ttl_seconds == 60
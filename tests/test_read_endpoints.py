@@ -0,0 +1,143 @@
+"""
+GET endpoints against FakeFirestore through the Flask test client:
+conditional requests (ETag / If-None-Match) and message pagination.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from bench.fakes import FakeFirestore, install_fake_firebase_config
+
+HEADERS = {'X-API-Key': '321'}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'fake')
+    monkeypatch.setenv('OPENAI_ASSISTANT_ID', 'asst_fake')
+    install_fake_firebase_config()
+    import app
+    from services import firebase_service
+    from services.profile_cache import ProfileCache
+    from services.response_cache import ResponseCache
+
+    db = FakeFirestore()
+    db.put('users/u1', {'name': 'Ana', 'age': 30, 'email': 'ana@example.com'})
+    db.put('users/u1/preferences/p1', {'supportType': 'Coach'})
+    monkeypatch.setattr(firebase_service, 'get_db', lambda: db)
+    monkeypatch.setattr(firebase_service, 'profile_cache',
+                        ProfileCache(ttl_seconds=60, on_evict=firebase_service._on_profile_evict))
+    monkeypatch.setattr(firebase_service, '_profile_update_times', {})
+    monkeypatch.setattr(firebase_service, '_preferences_doc_ids', {})
+    monkeypatch.setattr(firebase_service, 'SESSION_MESSAGES_LAYOUT', 'history')
+    monkeypatch.setattr(app, 'response_cache', ResponseCache())
+    client = app.app.test_client()
+    client.db = db
+    return client
+
+
+@pytest.mark.parametrize('path, doc, change, field', [
+    ('/api/user/u1', 'users/u1', {'name': 'Bea'}, 'name'),
+    ('/api/preferences/u1', 'users/u1/preferences/p1', {'supportType': 'Friend'}, 'support_type'),
+])
+def test_etag_cycle(client, path, doc, change, field):
+    first = client.get(path, headers=HEADERS)
+    assert first.status_code == 200 and first.headers['ETag']
+    etag = first.headers['ETag']
+
+    unchanged = client.get(path, headers={**HEADERS, 'If-None-Match': etag})
+    assert unchanged.status_code == 304 and unchanged.headers['ETag'] == etag
+
+    # Changed behind this worker's profile cache (e.g. through another worker)
+    client.db.put(doc, change)
+    changed = client.get(path, headers={**HEADERS, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['data'][field] in change.values()
+
+    again = client.get(path, headers={**HEADERS, 'If-None-Match': changed.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_missing_profile_is_404_without_etag(client):
+    response = client.get('/api/user/nobody', headers=HEADERS)
+    assert response.status_code == 404 and 'ETag' not in response.headers
+
+
+START = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def _seed_messages(db, count, session_id='s1', start=0):
+    for n in range(start, start + count):
+        db.put(f"messages/u1/history/m{n}", {
+            'message': f"message {n}", 'type': 'user' if n % 2 == 0 else 'ai',
+            'timestamp': START + timedelta(seconds=n), 'chat_session_id': session_id
+        })
+
+
+def _page(client, **params):
+    response = client.get('/api/messages/s1', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def _texts(page):
+    return [m['message'] for m in page['messages']]
+
+
+def test_messages_page_backwards(client):
+    _seed_messages(client.db, 5)
+    _seed_messages(client.db, 3, session_id='s2', start=10)
+
+    latest = _page(client, limit=2)
+    assert _texts(latest) == ['message 3', 'message 4']
+    assert latest['has_more'] is True and latest['count'] == 2
+
+    older = _page(client, limit=2, before=latest['cursors']['before'])
+    assert _texts(older) == ['message 1', 'message 2'] and older['has_more'] is True
+
+    last = _page(client, limit=2, before=older['cursors']['before'])
+    assert _texts(last) == ['message 0'] and last['has_more'] is False
+
+    # Past the oldest message: an empty page that keeps the cursor
+    empty = _page(client, limit=2, before=last['cursors']['before'])
+    assert empty['messages'] == [] and empty['has_more'] is False
+    assert empty['cursors']['before'] == last['cursors']['before']
+
+
+def test_messages_page_forwards(client):
+    _seed_messages(client.db, 4)
+
+    first = _page(client, limit=3, after=str(START - timedelta(seconds=1)))
+    assert _texts(first) == ['message 0', 'message 1', 'message 2'] and first['has_more'] is True
+
+    # Exactly one page left: the last page says so
+    rest = _page(client, limit=3, after=first['cursors']['after'])
+    assert _texts(rest) == ['message 3'] and rest['has_more'] is False
+
+    # Polling with nothing new, then after a new message
+    assert _page(client, limit=3, since=rest['cursors']['after'])['messages'] == []
+    _seed_messages(client.db, 1, start=4)
+    assert _texts(_page(client, limit=3, since=rest['cursors']['after'])) == ['message 4']
+
+
+def test_messages_page_boundary(client):
+    _seed_messages(client.db, 4)
+    # A page that ends exactly at the oldest message has nothing more
+    page = _page(client, limit=4)
+    assert page['count'] == 4 and page['has_more'] is False
+    assert _page(client, limit=2, before=page['cursors']['before'])['messages'] == []
+
+
+@pytest.mark.parametrize('params', [
+    {'before': 'yesterday'},
+    {'after': '2024-13-01T00:00:00'},
+    {'limit': 'ten'},
+    {'before': '2024-05-01T12:00:00', 'after': '2024-05-01T12:00:00'},
+])
+def test_messages_invalid_cursor_is_400(client, params):
+    _seed_messages(client.db, 2)
+    response = client.get('/api/messages/s1', query_string=params)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
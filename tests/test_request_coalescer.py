@@ -0,0 +1,142 @@
+"""
+ChatCoalescer: waiter timeouts, serialize ordering, per-session merging and
+the messages a merged turn hands to its handler.
+"""
+
+import threading
+import time
+
+from services.request_coalescer import ChatCoalescer, merge_messages
+
+
+def _start(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.start()
+    return thread
+
+
+def test_waiter_timeout_starts_with_the_turn():
+    coalescer = ChatCoalescer(mode='merge', wait_timeout=0.5)
+    results = {}
+    lane_held = threading.Event()
+
+    def hold_lane():
+        with coalescer.exclusive('u1'):
+            lane_held.set()
+            time.sleep(0.3)
+
+    def slow_turn(messages, state):
+        time.sleep(0.4)
+        return merge_messages(messages)
+
+    def send(name, message):
+        try:
+            results[name] = coalescer.submit('u1', message, slow_turn)
+        except Exception as e:
+            results[name] = e
+
+    holder = _start(hold_lane)
+    lane_held.wait()
+    leader = _start(send, 'leader', 'a')
+    time.sleep(0.05)
+    waiter = _start(send, 'waiter', 'b')
+    for thread in (holder, leader, waiter):
+        thread.join()
+
+    # The waiter joined ~0.65s before the merged turn finished, within 0.5s of its start
+    assert results == {'leader': 'a\n\nb', 'waiter': 'a\n\nb'}
+
+
+def test_serialize_runs_in_arrival_order():
+    coalescer = ChatCoalescer(mode='serialize', wait_timeout=5)
+    order = []
+    lane_held = threading.Event()
+    release = threading.Event()
+
+    def hold_lane():
+        with coalescer.exclusive('u1'):
+            lane_held.set()
+            release.wait()
+
+    holder = _start(hold_lane)
+    lane_held.wait()
+    senders = []
+    for i in range(8):
+        senders.append(_start(coalescer.submit, 'u1', str(i), lambda messages, state: order.extend(messages)))
+        time.sleep(0.02)
+    release.set()
+    for thread in [holder] + senders:
+        thread.join()
+
+    assert order == [str(i) for i in range(8)]
+
+
+def test_merge_keeps_sessions_apart():
+    coalescer = ChatCoalescer(mode='merge', wait_timeout=5)
+    turns = []
+    results = {}
+    lane_held = threading.Event()
+    release = threading.Event()
+
+    def hold_lane():
+        with coalescer.exclusive('u1'):
+            lane_held.set()
+            release.wait()
+
+    def turn(session):
+        def handler(messages, state):
+            turns.append((session, messages))
+            return session
+        return handler
+
+    def send(name, message, session):
+        results[name] = coalescer.submit('u1', message, turn(session), merge_key=session)
+
+    holder = _start(hold_lane)
+    lane_held.wait()
+    senders = [_start(send, 'a1', 'hello', 's1')]
+    time.sleep(0.05)
+    senders.append(_start(send, 'a2', 'again', 's1'))
+    time.sleep(0.05)
+    senders.append(_start(send, 'b1', 'other', 's2'))
+    time.sleep(0.05)
+    release.set()
+    for thread in [holder] + senders:
+        thread.join()
+
+    assert turns == [('s1', ['hello', 'again']), ('s2', ['other'])]
+    assert results == {'a1': 's1', 'a2': 's1', 'b1': 's2'}
+
+
+def test_merge_keeps_repeated_messages():
+    coalescer = ChatCoalescer(mode='merge', wait_timeout=5)
+    turns = []
+    results = {}
+    lane_held = threading.Event()
+    release = threading.Event()
+
+    def hold_lane():
+        with coalescer.exclusive('u1'):
+            lane_held.set()
+            release.wait()
+
+    def handler(messages, state):
+        turns.append(messages)
+        return merge_messages(messages)
+
+    def send(name, message):
+        results[name] = coalescer.submit('u1', message, handler, merge_key='s1')
+
+    holder = _start(hold_lane)
+    lane_held.wait()
+    senders = []
+    for name, message in (('first', 'ok'), ('second', 'sure'), ('third', 'ok')):
+        senders.append(_start(send, name, message))
+        time.sleep(0.05)
+    release.set()
+    for thread in [holder] + senders:
+        thread.join()
+
+    # One turn, every message in arrival order, one shared reply
+    assert turns == [['ok', 'sure', 'ok']]
+    assert set(results.values()) == {'ok\n\nsure\n\nok'}
@@ -0,0 +1,103 @@
+"""
+SessionCache on the Redis backend, against the in-process FakeRedis.
+"""
+
+import time
+from datetime import datetime
+
+import pytest
+
+from bench.fakes import FakeRedis
+from services.session_backends import RedisSessionBackend
+from services.session_cache import SessionCache
+
+
+def _cache(client, max_history=50, ttl_seconds=30):
+    return SessionCache(RedisSessionBackend(client, max_history, ttl_seconds))
+
+
+def _message(text, kind='user'):
+    return {'type': kind, 'message': text, 'timestamp': datetime(2024, 5, 1, 12, 0, len(text))}
+
+
+class DownRedis:
+    """Client for a Redis that cannot be reached"""
+
+    def __getattr__(self, name):
+        def unreachable(*args, **kwargs):
+            raise ConnectionError("Error 111 connecting to localhost:6379. Connection refused.")
+        return unreachable
+
+
+def test_get_and_update_round_trip():
+    cache = _cache(FakeRedis())
+    history = [_message('hi'), _message('hello there', 'ai')]
+
+    assert cache.get_history('u1') is None
+    cache.update_history('u1', history)
+
+    assert cache.get_history('u1') == history
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_empty_history_is_a_hit():
+    cache = _cache(FakeRedis())
+    cache.update_history('u1', [])
+    assert cache.get_history('u1') == []
+
+
+def test_append_trims_to_max_history():
+    cache = _cache(FakeRedis(), max_history=3)
+    cache.update_history('u1', [_message('a'), _message('bb')])
+    for text in ('ccc', 'dddd'):
+        cache.append_message('u1', _message(text))
+
+    assert [m['message'] for m in cache.get_history('u1')] == ['bb', 'ccc', 'dddd']
+
+
+def test_append_without_session_is_ignored():
+    cache = _cache(FakeRedis())
+    cache.append_message('u1', _message('hi'))
+    assert cache.get_history('u1') is None
+
+
+def test_sessions_expire_after_ttl():
+    cache = _cache(FakeRedis(), ttl_seconds=0.3)
+    cache.update_history('u1', [_message('hi')])
+    time.sleep(0.2)
+    # Reads slide the expiry
+    assert cache.get_history('u1') is not None
+    time.sleep(0.2)
+    assert cache.get_history('u1') is not None
+    time.sleep(0.4)
+    assert cache.get_history('u1') is None
+
+
+def test_workers_share_sessions():
+    client = FakeRedis()
+    worker_a, worker_b = _cache(client), _cache(client)
+    worker_a.update_history('u1', [_message('hi')])
+    worker_b.append_message('u1', _message('hello', 'ai'))
+
+    assert [m['message'] for m in worker_a.get_history('u1')] == ['hi', 'hello']
+
+
+def test_redis_down_falls_back_to_misses():
+    cache = _cache(DownRedis())
+
+    cache.update_history('u1', [_message('hi')])
+    cache.append_message('u1', _message('hello', 'ai'))
+    assert cache.get_history('u1') is None
+
+    stats = cache.stats()
+    assert (stats['misses'], stats['errors']) == (1, 3)
+    assert stats['backend'] == 'RedisSessionBackend'
+    assert cache.blocking is True
+
+
+@pytest.mark.parametrize('backend', ['local', 'redis'])
+def test_create_backend_selects_backend(monkeypatch, backend):
+    pytest.importorskip('redis')
+    monkeypatch.setenv('SESSION_CACHE_BACKEND', backend)
+    cache = SessionCache()
+    assert cache.stats()['backend'] == {'local': 'LocalSessionBackend', 'redis': 'RedisSessionBackend'}[backend]
@@ -0,0 +1,30 @@
+"""
+SESSION_MESSAGES_LAYOUT is rejected at import when it is not a known layout.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_with_layout(layout):
+    env = dict(os.environ, SESSION_MESSAGES_LAYOUT=layout)
+    return subprocess.run(
+        [sys.executable, '-c', 'import services.firebase_service'],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+
+
+@pytest.mark.parametrize('layout', ['history', 'dual', 'Session'])
+def test_known_layouts_import(layout):
+    assert _import_with_layout(layout).returncode == 0
+
+
+def test_unknown_layout_raises():
+    result = _import_with_layout('sesion')
+    assert result.returncode != 0
+    assert 'ValueError: SESSION_MESSAGES_LAYOUT must be one of history, dual, session' in result.stderr
@@ -0,0 +1,49 @@
+"""
+Sharded session counters: throttled rollups are written back at the end of
+the interval (trailing rollup), not dropped.
+"""
+
+import pytest
+
+from services import firebase_service
+from services.firebase_service import FirebaseService
+
+
+@pytest.fixture
+def rollups(monkeypatch):
+    written = []
+    monkeypatch.setattr(firebase_service, 'SESSION_COUNTER_SHARDS', 4)
+    monkeypatch.setattr(firebase_service, 'SESSION_ROLLUP_INTERVAL', 30)
+    monkeypatch.setattr(firebase_service, '_last_rollup', {})
+    monkeypatch.setattr(firebase_service, '_pending_rollups', {})
+    monkeypatch.setattr(firebase_service, '_ensure_rollup_flusher', lambda: None)
+    monkeypatch.setattr(FirebaseService, 'roll_up_session', staticmethod(written.append))
+    return written
+
+
+def test_first_call_rolls_up_immediately(rollups):
+    FirebaseService.update_session_metadata('s1')
+    assert rollups == ['s1']
+
+
+def test_throttled_calls_leave_one_trailing_rollup(rollups):
+    for _ in range(3):
+        FirebaseService.update_session_metadata('s1')
+    assert rollups == ['s1']
+    assert list(firebase_service._pending_rollups) == ['s1']
+
+    # Not due yet: nothing is written
+    firebase_service.flush_session_rollups()
+    assert rollups == ['s1']
+
+    firebase_service.flush_session_rollups(force=True)
+    assert rollups == ['s1', 's1']
+    assert firebase_service._pending_rollups == {}
+
+
+def test_due_trailing_rollup_is_flushed(rollups):
+    FirebaseService.update_session_metadata('s1')
+    FirebaseService.update_session_metadata('s1')
+    firebase_service._pending_rollups['s1'] = 0  # interval over
+    firebase_service.flush_session_rollups()
+    assert rollups == ['s1', 's1']
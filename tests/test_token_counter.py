@@ -0,0 +1,48 @@
+"""
+Token counting never downloads the encoding: without the pre-fetched file in
+TIKTOKEN_CACHE_DIR it falls back to the estimate.
+"""
+
+import pytest
+
+from services import token_counter
+
+
+@pytest.fixture
+def fresh_counter(monkeypatch, tmp_path):
+    monkeypatch.setattr(token_counter, 'TIKTOKEN_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(token_counter, '_encoding', None)
+    monkeypatch.setattr(token_counter, '_encoding_loaded', False)
+    token_counter.count_tokens.cache_clear()
+    yield tmp_path
+    token_counter.count_tokens.cache_clear()
+
+
+def test_estimate_without_fetched_encoding(fresh_counter, monkeypatch):
+    tiktoken = pytest.importorskip('tiktoken')
+
+    def no_download(name):
+        raise AssertionError("tiktoken must not be asked for an encoding that is not cached")
+
+    monkeypatch.setattr(tiktoken, 'get_encoding', no_download)
+
+    assert token_counter.count_tokens('x' * 10) == 3
+    assert token_counter.injection_stats()['exact'] is False
+
+
+@pytest.mark.parametrize('name', sorted(token_counter.ENCODING_URLS))
+def test_cache_path_is_the_file_tiktoken_reads(fresh_counter, monkeypatch, name):
+    tiktoken_load = pytest.importorskip('tiktoken.load')
+    from tiktoken_ext import openai_public
+    read = []
+
+    def record_read(blobpath, expected_hash=None):
+        read.append(blobpath)
+        raise LookupError
+
+    monkeypatch.setattr(tiktoken_load, 'read_file_cached', record_read)
+    with pytest.raises(LookupError):
+        getattr(openai_public, name)()
+
+    assert token_counter.ENCODING_URLS[name] == read[0]
+    assert token_counter.encoding_cache_path(name).startswith(str(fresh_counter))